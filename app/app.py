@@ -1,9 +1,125 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
-from app.routers import auth, todo, users
+from fastapi import Depends, FastAPI
+from starlette.concurrency import run_in_threadpool
 
-app = FastAPI()
+from app.compression import CompressionMiddleware
+from app.concurrency import AIMDLimit, ConcurrencyLimitMiddleware
+from app.cpf import verify_cpfs
+from app.outbox import dispatch
+from app.profiling import ProfileStore, ProfilingMiddleware
+from app.ratelimit import RateLimit, RateLimiter
+from app.reminders import remind
+from app.replicas import ReadYourWritesMiddleware
+from app.revocation import listen_for_revocations, refresh_revocations
+from app.routers import admin, auth, batch, health, profiles, todo, users
+from app.settings import get_settings
+from app.slowlog import SlowQueryRouteMiddleware
+from app.warmup import warm_up
+from app.workers import archive, purge, rebalance, run_periodically
 
-app.include_router(users.router)
-app.include_router(auth.router)
-app.include_router(todo.router)
+settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.rate_limiter = RateLimiter.from_settings(settings) if settings.RATE_LIMIT_ENABLED else None
+    await run_in_threadpool(warm_up, app)
+    app.state.ready = True
+
+    tasks = [asyncio.create_task(listen_for_revocations())]
+    if settings.REVOCATION_REFRESH_SECONDS > 0:
+        tasks.append(
+            asyncio.create_task(
+                run_periodically('revocations', settings.REVOCATION_REFRESH_SECONDS, refresh_revocations)
+            )
+        )
+    if settings.POSITION_REBALANCE_INTERVAL_SECONDS > 0:
+        tasks.append(
+            asyncio.create_task(
+                run_periodically('rebalance', settings.POSITION_REBALANCE_INTERVAL_SECONDS, rebalance)
+            )
+        )
+    if settings.ARCHIVE_INTERVAL_SECONDS > 0:
+        tasks.append(
+            asyncio.create_task(run_periodically('archive', settings.ARCHIVE_INTERVAL_SECONDS, archive))
+        )
+    if settings.OUTBOX_ENABLED and settings.OUTBOX_SINK_URL:
+        tasks.append(
+            asyncio.create_task(run_periodically('outbox', settings.OUTBOX_INTERVAL_SECONDS, dispatch))
+        )
+    if settings.CPF_VERIFICATION_DEFERRED:
+        tasks.append(
+            asyncio.create_task(
+                run_periodically('cpf', settings.CPF_VERIFICATION_INTERVAL_SECONDS, verify_cpfs)
+            )
+        )
+    if settings.REMINDER_SINK_URL:
+        tasks.append(
+            asyncio.create_task(
+                run_periodically('reminders', settings.REMINDER_INTERVAL_SECONDS, remind)
+            )
+        )
+    if settings.PURGE_INTERVAL_SECONDS > 0:
+        tasks.append(
+            asyncio.create_task(run_periodically('purge', settings.PURGE_INTERVAL_SECONDS, purge))
+        )
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
+app = FastAPI(lifespan=lifespan)
+
+if settings.DATABASE_REPLICA_URLS:
+    app.add_middleware(ReadYourWritesMiddleware, window=settings.READ_YOUR_WRITES_SECONDS)
+
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        level=settings.COMPRESSION_LEVEL,
+        cache_size=settings.COMPRESSION_CACHE_SIZE,
+    )
+
+if settings.SLOW_QUERY_THRESHOLD_MS > 0:
+    app.add_middleware(SlowQueryRouteMiddleware)
+
+if settings.PROFILING_ENABLED:
+    app.state.profiles = ProfileStore(settings.PROFILING_STORE_SIZE)
+    app.state.profile_secret = settings.SECRET_KEY
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=app.state.profiles,
+        secret=settings.SECRET_KEY,
+        sample_rate=settings.PROFILING_SAMPLE_RATE,
+        interval=settings.PROFILING_INTERVAL_SECONDS,
+    )
+    app.include_router(profiles.router)
+
+# Added last, so it runs first: shed requests don't go through the other middleware.
+if settings.CONCURRENCY_LIMIT_ENABLED:
+    app.state.concurrency_limit = AIMDLimit(
+        initial=settings.CONCURRENCY_LIMIT_INITIAL,
+        minimum=settings.CONCURRENCY_LIMIT_MIN,
+        maximum=settings.CONCURRENCY_LIMIT_MAX,
+        latency_target=settings.CONCURRENCY_LATENCY_TARGET_MS / 1000,
+    )
+    app.add_middleware(
+        ConcurrencyLimitMiddleware,
+        limit=app.state.concurrency_limit,
+        retry_after=settings.CONCURRENCY_RETRY_AFTER_SECONDS,
+    )
+
+app.include_router(health.router)
+app.include_router(admin.router)
+app.include_router(users.router, dependencies=[Depends(RateLimit('users'))])
+app.include_router(auth.router, dependencies=[Depends(RateLimit('auth'))])
+app.include_router(todo.router, dependencies=[Depends(RateLimit('todo'))])
+app.include_router(batch.router)
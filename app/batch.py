@@ -0,0 +1,116 @@
+import json
+from contextvars import ContextVar
+from dataclasses import dataclass
+from http import HTTPStatus
+
+from sqlalchemy.orm import Session
+from starlette.exceptions import HTTPException
+from starlette.types import ASGIApp, Message, Scope
+
+from app.logging_config import logger
+from app.models import User
+from app.schemas import BatchOperation
+
+# Scope keys a sub-request inherits from the batch request, so it runs against the same app,
+# client (for the rate limits) and exception handlers.
+INHERITED_SCOPE_KEYS = (
+    'type',
+    'asgi',
+    'http_version',
+    'scheme',
+    'server',
+    'client',
+    'root_path',
+    'app',
+    'state',
+    'starlette.exception_handlers',
+)
+
+# Set by the batch itself, an operation can't pick another user or send another body format.
+SKIPPED_HEADERS = {'authorization', 'content-type', 'content-length'}
+
+
+@dataclass
+class Batch:
+    session: Session
+    user: User
+
+
+# The batch being run, if any: its sub-requests reuse its session and authenticated user.
+current_batch: ContextVar[Batch | None] = ContextVar('current_batch', default=None)
+
+
+@dataclass
+class SubResponse:
+    status: int
+    headers: dict[str, str]
+    body: object
+
+
+def _decode(headers: dict[str, str], body: bytes):
+    if not body:
+        return None
+    if headers.get('content-type', '').startswith('application/json'):
+        return json.loads(body)
+
+    return body.decode(errors='replace')
+
+
+async def call(app: ASGIApp, parent: Scope, operation: BatchOperation) -> SubResponse:
+    """
+    Runs one operation of the `parent` batch request through `app` in-process, as a request of its own.
+
+    `app` is the router, so the sub-request skips the middleware the batch request already went
+    through. It carries the batch `Authorization` header. Errors raised outside of a route, like
+    a 404 or a 405, become its response.
+    """
+    path, _, query_string = operation.path.partition('?')
+    content = json.dumps(operation.body).encode() if operation.body is not None else b''
+    raw_headers = [
+        (name.lower().encode(), value.encode())
+        for name, value in operation.headers.items()
+        if name.lower() not in SKIPPED_HEADERS
+    ]
+    raw_headers.extend((name, value) for name, value in parent['headers'] if name == b'authorization')
+    raw_headers.append((b'content-type', b'application/json'))
+    raw_headers.append((b'content-length', str(len(content)).encode()))
+
+    scope = {key: parent[key] for key in INHERITED_SCOPE_KEYS if key in parent}
+    scope.update(
+        method=operation.method,
+        path=path,
+        raw_path=path.encode(),
+        query_string=query_string.encode(),
+        headers=raw_headers,
+    )
+
+    received = False
+    start: Message = {}
+    chunks: list[bytes] = []
+
+    async def receive() -> Message:
+        nonlocal received
+        if received:
+            return {'type': 'http.disconnect'}
+        received = True
+        return {'type': 'http.request', 'body': content, 'more_body': False}
+
+    async def send(message: Message):
+        nonlocal start
+        if message['type'] == 'http.response.start':
+            start = message
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+
+    try:
+        await app(scope, receive, send)
+    except HTTPException as error:
+        return SubResponse(error.status_code, dict(error.headers or {}), {'detail': error.detail})
+    except Exception:
+        logger.exception('Batch operation %s %s failed', operation.method, path)
+        return SubResponse(
+            HTTPStatus.INTERNAL_SERVER_ERROR, {}, {'detail': HTTPStatus.INTERNAL_SERVER_ERROR.phrase}
+        )
+
+    response_headers = {name.decode(): value.decode() for name, value in start.get('headers', [])}
+    return SubResponse(start['status'], response_headers, _decode(response_headers, b''.join(chunks)))
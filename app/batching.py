@@ -0,0 +1,102 @@
+import threading
+from concurrent.futures import Future
+from functools import cache, partial
+from typing import Callable
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.database import get_engine
+from app.logging_config import logger
+from app.models import Todo
+from app.ordering import position_between
+from app.outbox import record_event, todo_payload
+from app.queries import LAST_POSITION
+from app.settings import get_settings
+
+
+class TodoBatcher:
+    """
+    Coalesces concurrent todo creations into one multi-row INSERT and one commit.
+
+    The first caller of a batch waits `window` seconds (or until `max_size` callers joined),
+    then inserts the whole batch and commits; every caller returns its own row only after
+    that commit, so a created todo is exactly as durable as with one transaction per request.
+    A failing INSERT fails every caller of the batch.
+    """
+
+    def __init__(
+        self, session_factory: Callable[[], Session], window: float = 0.002, max_size: int = 100
+    ):
+        self.session_factory = session_factory
+        self.window = window
+        self.max_size = max_size
+        self._pending: list[tuple[dict, Future]] = []
+        self._full = threading.Event()
+        self._lock = threading.Lock()
+
+    def create(self, values: dict) -> Todo:
+        """
+        Creates a todo from the `Todo` column values, except `position`: it is appended to the list.
+        """
+        future = Future()
+
+        with self._lock:
+            self._pending.append((values, future))
+            leader = len(self._pending) == 1
+            if len(self._pending) >= self.max_size:
+                self._full.set()
+
+        if leader:
+            self._full.wait(self.window)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._full.clear()
+            self._flush(batch)
+
+        return future.result()
+
+    def _flush(self, batch: list[tuple[dict, Future]]):
+        rows = [dict(values) for values, _ in batch]
+
+        try:
+            with self.session_factory() as session:
+                positions = {
+                    user_id: session.scalar(LAST_POSITION, {'user_id': user_id})
+                    for user_id in {row['user_id'] for row in rows}
+                }
+                for row in rows:
+                    row['position'] = position_between(positions[row['user_id']], None)
+                    positions[row['user_id']] = row['position']
+
+                todos = session.scalars(
+                    insert(Todo).returning(Todo, sort_by_parameter_order=True), rows
+                ).all()
+                for todo in todos:
+                    record_event(session, 'todo.created', todo.id, todo_payload(todo))
+                session.commit()
+        except Exception as error:
+            logger.warning('Batch of %d todos failed: %s', len(batch), error)
+            for _, future in batch:
+                future.set_exception(error)
+            return
+
+        logger.info('Inserted a batch of %d todos', len(batch))
+        for (_, future), todo in zip(batch, todos):
+            future.set_result(todo)
+
+
+@cache
+def get_todo_batcher() -> TodoBatcher | None:
+    """
+    Returns the process-wide batcher, or None when TODO_BATCH_WINDOW_SECONDS disables batching.
+    """
+    settings = get_settings()
+    if settings.TODO_BATCH_WINDOW_SECONDS <= 0:
+        return None
+
+    return TodoBatcher(
+        partial(Session, get_engine(), expire_on_commit=False),
+        settings.TODO_BATCH_WINDOW_SECONDS,
+        settings.TODO_BATCH_MAX_SIZE,
+    )
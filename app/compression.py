@@ -0,0 +1,195 @@
+import gzip
+import hashlib
+from collections import OrderedDict
+from http import HTTPStatus
+from typing import Callable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+
+def available_compressors() -> dict[str, Callable[[bytes, int], bytes]]:
+    """
+    Returns the supported encodings in order of preference.
+
+    Brotli and zstd are only offered when their optional packages are installed.
+    """
+    compressors = {}
+
+    if brotli is not None:  # pragma: no cover
+        compressors['br'] = lambda body, level: brotli.compress(body, quality=min(level, 11))
+
+    if zstandard is not None:  # pragma: no cover
+        compressors['zstd'] = lambda body, level: zstandard.ZstdCompressor(level=level).compress(body)
+
+    compressors['gzip'] = lambda body, level: gzip.compress(body, compresslevel=level, mtime=0)
+
+    return compressors
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == '*':
+        return True
+
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return etag.removeprefix('W/') in tags
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses bigger than `minimum_size` with the best encoding the client accepts.
+
+    Successful GET responses get a weak ETag derived from their body, which answers
+    `If-None-Match` with a 304 and keys a small LRU cache of compressed bodies,
+    so a page that did not change is not compressed again on every hit.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        level: int = 6,
+        cache_size: int = 256,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.cache_size = cache_size
+        self.cache: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self.compressors = available_compressors()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = self.negotiate(request_headers.get('accept-encoding', ''))
+        if_none_match = request_headers.get('if-none-match')
+        cacheable = scope['method'] == 'GET'
+
+        start: Message | None = None
+        streaming = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start, streaming
+
+            if message['type'] == 'http.response.start':
+                start = message
+                return
+
+            if streaming or message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            if message.get('more_body', False):
+                # Streaming responses are passed through untouched.
+                streaming = True
+                await send(start)
+                await send(message)
+                return
+
+            await self.send_response(
+                send, start, message.get('body', b''), encoding, if_none_match, cacheable
+            )
+
+        await self.app(scope, receive, send_wrapper)
+
+    def negotiate(self, accept_encoding: str) -> str | None:
+        accepted = set()
+
+        for part in accept_encoding.split(','):
+            name, *params = part.split(';')
+            quality = 1.0
+
+            for param in params:
+                key, _, value = param.strip().partition('=')
+                if key == 'q':
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+
+            if quality > 0:
+                accepted.add(name.strip().lower())
+
+        for name in self.compressors:
+            if name in accepted:
+                return name
+
+        return None
+
+    def compress(self, body: bytes, encoding: str, etag: str | None) -> bytes:
+        if etag is None:
+            return self.compressors[encoding](body, self.level)
+
+        key = (etag, encoding)
+        if (compressed := self.cache.get(key)) is not None:
+            self.cache.move_to_end(key)
+            return compressed
+
+        compressed = self.compressors[encoding](body, self.level)
+
+        self.cache[key] = compressed
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return compressed
+
+    async def send_response(  # noqa: PLR0913, PLR0917
+        self,
+        send: Send,
+        start: Message,
+        body: bytes,
+        encoding: str | None,
+        if_none_match: str | None,
+        cacheable: bool,
+    ):
+        headers = MutableHeaders(raw=start['headers'])
+        status = start['status']
+        etag = headers.get('etag')
+
+        if cacheable and status == HTTPStatus.OK and etag is None:
+            etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            headers['ETag'] = etag
+
+        if cacheable and etag and if_none_match and etag_matches(if_none_match, etag):
+            del headers['content-length']
+            del headers['content-type']
+            await send({
+                'type': 'http.response.start',
+                'status': HTTPStatus.NOT_MODIFIED,
+                'headers': headers.raw,
+            })
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        content_type = headers.get('content-type', '')
+        if (
+            encoding
+            and len(body) >= self.minimum_size
+            and 'content-encoding' not in headers
+            and content_type.startswith(COMPRESSIBLE_TYPES)
+        ):
+            compressed = self.compress(body, encoding, etag if status == HTTPStatus.OK else None)
+
+            if len(compressed) < len(body):
+                body = compressed
+                headers['Content-Encoding'] = encoding
+                headers['Content-Length'] = str(len(body))
+                headers.add_vary_header('Accept-Encoding')
+
+        await send(start)
+        await send({'type': 'http.response.body', 'body': body})
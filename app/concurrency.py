@@ -0,0 +1,155 @@
+import math
+import time
+from enum import IntEnum
+from http import HTTPStatus
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.logging_config import logger
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+# Probes must see the real state of the process, not a shed request.
+UNLIMITED_PATHS = ('/health/',)
+
+
+class Priority(IntEnum):
+    low = 0
+    normal = 1
+    critical = 2
+
+
+# Share of the concurrency limit each priority may fill: the last slots are kept for
+# the critical requests, so they are still admitted when the others are shed.
+PRIORITY_SHARES = {Priority.low: 0.5, Priority.normal: 0.8, Priority.critical: 1.0}
+
+BACKOFF = 0.9
+
+
+def request_priority(scope: Scope) -> Priority:
+    """
+    Ranks a request: logins and writes first, anonymous user listings last.
+
+    A `/batch` request bundles many operations in one long request: it is not let into
+    the slots kept for the critical requests.
+    """
+    path = scope['path']
+    if path.rstrip('/') == '/batch':
+        return Priority.normal
+
+    if path.startswith('/auth/') or scope['method'] not in SAFE_METHODS:
+        return Priority.critical
+
+    authenticated = any(name == b'authorization' for name, _ in scope['headers'])
+    if path.rstrip('/') == '/users' and not authenticated:
+        return Priority.low
+
+    return Priority.normal
+
+
+class AIMDLimit:
+    """
+    A concurrency limit adjusted to the observed latency, by additive increase and
+    multiplicative decrease.
+
+    Every request completed under `latency_target` while the limit was in use raises it by
+    1 / limit, about one more slot per round of requests. A slower one, or a server error,
+    multiplies it by BACKOFF, at most once per `latency_target`: the requests in flight
+    at that time all see the same congestion and lower the limit only once.
+    """
+
+    def __init__(
+        self, initial: int, minimum: int, maximum: int, latency_target: float, clock=time.monotonic
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.clock = clock
+        self.inflight = 0
+        self._decreased_at = -math.inf
+
+    def acquire(self, priority: Priority) -> bool:
+        if self.inflight >= max(1, int(self.limit * PRIORITY_SHARES[priority])):
+            return False
+
+        self.inflight += 1
+        return True
+
+    def release(self, latency: float | None, failed: bool = False):
+        """
+        Frees the slot of a request. Without `latency`, as when the client went away before
+        the response, the limit is left as is: the request tells nothing about the congestion.
+        """
+        saturated = self.inflight >= self.limit / 2
+        self.inflight -= 1
+
+        if latency is None:
+            return
+
+        if failed or latency > self.latency_target:
+            now = self.clock()
+            if now - self._decreased_at >= self.latency_target:
+                self._decreased_at = now
+                self.limit = max(self.minimum, self.limit * BACKOFF)
+                logger.warning(
+                    'Concurrency limit lowered to %d after a %.0f ms request', self.limit, latency * 1000
+                )
+        elif saturated:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Sheds the requests over the adaptive concurrency limit with a 503 and a `Retry-After`.
+
+    Rejecting them right away keeps them from queuing for the threadpool and the database
+    pool, where they would slow down the requests already admitted. Runs in the event loop,
+    so the limit needs no lock.
+    """
+
+    def __init__(self, app: ASGIApp, limit: AIMDLimit, retry_after: int = 1):
+        self.app = app
+        self.limit = limit
+        self.retry_after = retry_after
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or scope['path'].startswith(UNLIMITED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        priority = request_priority(scope)
+        if not self.limit.acquire(priority):
+            logger.debug(
+                'Shedding %s %s with priority %s', scope['method'], scope['path'], priority.name
+            )
+            response = JSONResponse(
+                {'detail': 'Service overloaded'},
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(self.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        status = None
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status = status or HTTPStatus.INTERNAL_SERVER_ERROR
+            raise
+        finally:
+            # No response started and no error: the request was cancelled by a disconnect.
+            if status is None:
+                self.limit.release(None)
+            else:
+                self.limit.release(
+                    time.perf_counter() - started, failed=status >= HTTPStatus.INTERNAL_SERVER_ERROR
+                )
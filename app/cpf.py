@@ -0,0 +1,296 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import cache
+from http import HTTPStatus
+from typing import Protocol
+from urllib.parse import urlparse
+
+from sqlalchemy import Row, delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.database import get_engine
+from app.logging_config import logger
+from app.models import CpfStatus, CpfVerificationJob, User
+from app.settings import get_settings
+
+CPF_LENGTH = 11
+MAX_RETRY_DELAY = timedelta(hours=1)
+MAX_RETRY_EXPONENT = 12
+
+
+def check_digits(digits: str) -> str:
+    """
+    Returns the two check digits of the first nine digits of a CPF.
+    """
+    numbers = [int(digit) for digit in digits]
+    for length in (9, 10):
+        remainder = sum(digit * weight for digit, weight in zip(numbers, range(length + 1, 1, -1))) % 11
+        numbers.append(0 if remainder < 2 else 11 - remainder)  # noqa: PLR2004
+
+    return f'{numbers[-2]}{numbers[-1]}'
+
+
+class CpfValidator(Protocol):
+    def validate(self, cpf: str) -> bool: ...
+
+
+class ChecksumCpfValidator:
+    """
+    Checks the CPF check digits locally, without calling any service, for development and tests.
+
+    CPFs made of a single repeated digit pass the checksum but are rejected, like the real ones.
+    """
+
+    @staticmethod
+    def validate(cpf: str) -> bool:
+        return (
+            len(cpf) == CPF_LENGTH
+            and cpf.isdigit()
+            and len(set(cpf)) > 1
+            and check_digits(cpf[:9]) == cpf[9:]
+        )
+
+
+class HttpCpfValidator:
+    """
+    Asks the invertexto validation API; any non 2xx response raises.
+
+    Reusing the session keeps the connection to the API alive between calls.
+    """
+
+    def __init__(self, url: str, token: str, timeout: float = 5):
+        import requests  # noqa: PLC0415
+
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self.client = requests.Session()
+
+    def validate(self, cpf: str) -> bool:
+        params = {'token': self.token, 'value': cpf, 'type': 'cpf'}
+        response = self.client.get(self.url, params=params, timeout=self.timeout)
+
+        if response.status_code != HTTPStatus.OK:
+            response.raise_for_status()  # pragma: no cover
+
+        return response.json().get('valid', False)
+
+
+def validator_from_url(url: str) -> CpfValidator:
+    """
+    Builds the validator for a `checksum:` or `http(s)://host/path` URL.
+
+    Raises:
+        ValueError: If the URL scheme has no validator.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == 'checksum':
+        return ChecksumCpfValidator()
+    if parsed.scheme in {'http', 'https'}:
+        return HttpCpfValidator(url, get_settings().API_TOKEN)
+
+    raise ValueError(f'Unsupported CPF validator: {url}')
+
+
+@cache
+def get_cpf_validator() -> CpfValidator:
+    return validator_from_url(get_settings().CPF_VALIDATOR_URL)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service for `reset_after` seconds once `threshold` calls in a row failed.
+
+    Then a single trial call is let through: its success closes the breaker again, its failure
+    opens it for another `reset_after` seconds.
+    """
+
+    def __init__(self, threshold: int, reset_after: float, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.clock = clock
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """
+        Whether calls are still paused; once `reset_after` has passed, a trial call is allowed.
+        """
+        with self._lock:
+            return self._opened_at is not None and self.clock() - self._opened_at < self.reset_after
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or self.clock() - self._opened_at < self.reset_after:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial = False
+            if self._failures >= self.threshold:
+                self._opened_at = self.clock()
+
+
+@cache
+def get_cpf_breaker() -> CircuitBreaker:
+    settings = get_settings()
+    return CircuitBreaker(settings.CPF_BREAKER_THRESHOLD, settings.CPF_BREAKER_RESET_SECONDS)
+
+
+def claim_jobs(session: Session, batch_size: int, lease: timedelta) -> list[Row]:
+    """
+    Takes the `batch_size` oldest due jobs and hides them from other workers for `lease`.
+
+    The claim is committed right away, so no lock is held while the validator is called. If the
+    worker dies, the jobs become due again when the lease runs out.
+
+    Returns:
+        list[Row]: The `id`, `user_id`, `cpf` and `attempts` of each claimed job.
+    """
+    due = (
+        select(CpfVerificationJob.id)
+        .where(CpfVerificationJob.run_at <= func.now())
+        .order_by(CpfVerificationJob.run_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    claimed = (
+        update(CpfVerificationJob)
+        .where(CpfVerificationJob.id.in_(due))
+        .values(run_at=func.now() + lease)
+        .returning(CpfVerificationJob.id, CpfVerificationJob.user_id, CpfVerificationJob.attempts)
+        .cte('claimed')
+    )
+    jobs = session.execute(
+        select(claimed.c.id, claimed.c.user_id, User.cpf, claimed.c.attempts).join_from(
+            claimed, User, User.id == claimed.c.user_id
+        )
+    ).all()
+    session.commit()
+
+    return jobs
+
+
+def check_cpf(validator: CpfValidator, breaker: CircuitBreaker, cpf: str) -> bool | Exception | None:
+    """
+    Validates `cpf` through the breaker.
+
+    Returns:
+        bool | Exception | None: The validator answer, its error, or None if the breaker is open.
+    """
+    if not breaker.allow():
+        return None
+
+    try:
+        valid = validator.validate(cpf)
+    except Exception as error:
+        breaker.record_failure()
+        return error
+
+    breaker.record_success()
+    return valid
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return min(timedelta(seconds=2 ** min(attempts, MAX_RETRY_EXPONENT)), MAX_RETRY_DELAY)
+
+
+def finish_jobs(session: Session, jobs: list[Row], results: list) -> dict[str, int]:
+    """
+    Stores the outcome of each claimed job, in one transaction.
+
+    Answered jobs set the user `cpf_status` and are deleted. Failed ones are retried with an
+    exponential backoff; the ones skipped by the open breaker are due again right away.
+
+    Returns:
+        dict[str, int]: How many jobs were verified, rejected, failed and skipped.
+    """
+    counts = {'verified': 0, 'rejected': 0, 'failed': 0, 'skipped': 0}
+
+    for job, result in zip(jobs, results):
+        where = CpfVerificationJob.id == job.id
+        if isinstance(result, bool):
+            status = CpfStatus.verified if result else CpfStatus.rejected
+            session.execute(update(User).where(User.id == job.user_id).values(cpf_status=status))
+            session.execute(delete(CpfVerificationJob).where(where))
+            counts[status.value] += 1
+        elif result is None:
+            session.execute(update(CpfVerificationJob).where(where).values(run_at=func.now()))
+            counts['skipped'] += 1
+        else:
+            logger.warning('Could not verify the CPF of user ID %d: %s', job.user_id, result)
+            session.execute(
+                update(CpfVerificationJob)
+                .where(where)
+                .values(
+                    attempts=job.attempts + 1,
+                    last_error=str(result)[:500],
+                    run_at=func.now() + retry_delay(job.attempts + 1),
+                )
+            )
+            counts['failed'] += 1
+
+    session.commit()
+
+    return counts
+
+
+def verify_cpfs(validator: CpfValidator | None = None, breaker: CircuitBreaker | None = None) -> int:
+    """
+    Runs the due CPF verifications, CPF_VERIFICATION_CONCURRENCY at a time, until none is left.
+
+    Stops early while the circuit breaker is open: the validator is failing, calling it again
+    would only add load, and the jobs stay queued.
+
+    Returns:
+        int: The number of users whose CPF was verified or rejected.
+    """
+    settings = get_settings()
+    validator = validator or get_cpf_validator()
+    breaker = breaker or get_cpf_breaker()
+    lease = timedelta(seconds=settings.CPF_VERIFICATION_LEASE_SECONDS)
+
+    done = 0
+    with (
+        Session(get_engine()) as session,
+        ThreadPoolExecutor(settings.CPF_VERIFICATION_CONCURRENCY, 'cpf-verification') as executor,
+    ):
+        while not breaker.is_open and (
+            jobs := claim_jobs(session, settings.CPF_VERIFICATION_BATCH_SIZE, lease)
+        ):
+            results = list(executor.map(lambda job: check_cpf(validator, breaker, job.cpf), jobs))
+            counts = finish_jobs(session, jobs, results)
+            logger.info('CPF verification batch: %s', counts)
+            done += counts['verified'] + counts['rejected']
+
+    if breaker.is_open:
+        logger.warning('CPF validator circuit breaker is open, verifications are paused')
+
+    return done
+
+
+if __name__ == '__main__':
+    # Runs the verification workers as their own process, apart from the API.
+    while True:
+        try:
+            verify_cpfs()
+        except Exception:
+            logger.exception('CPF verification failed')
+        time.sleep(get_settings().CPF_VERIFICATION_INTERVAL_SECONDS)
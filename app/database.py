@@ -1,11 +1,102 @@
-from sqlalchemy import create_engine
+from contextlib import ExitStack
+from functools import cache
+
+from fastapi import Request
+from sqlalchemy import Engine, create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
-from app.settings import Settings
+from app.batch import current_batch
+from app.logging_config import logger
+from app.replicas import ReplicaRouter, reads_own_writes
+from app.settings import get_settings
+from app.slowlog import get_slow_query_log
+
+
+def build_engine(url: str) -> Engine:
+    settings = get_settings()
+    engine = create_engine(
+        url,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        connect_args={'prepare_threshold': settings.DATABASE_PREPARE_THRESHOLD},
+    )
+
+    if slow_query_log := get_slow_query_log():
+        slow_query_log.install(engine)
+
+    return engine
+
 
-engine = create_engine(Settings().DATABASE_URL)
+@cache
+def get_engine() -> Engine:
+    """
+    Returns the primary engine, created on first use so importing the app doesn't load the driver.
+    """
+    return build_engine(get_settings().DATABASE_URL)
+
+
+@cache
+def get_replicas() -> ReplicaRouter:
+    settings = get_settings()
+    return ReplicaRouter(
+        get_engine(),
+        [build_engine(url) for url in settings.DATABASE_REPLICA_URLS],
+        settings.REPLICA_RETRY_SECONDS,
+    )
 
 
 def get_session():  # pragma: no cover
-    with Session(engine) as session:
+    if batch := current_batch.get():
+        yield batch.session
+        return
+
+    with Session(get_engine()) as session:
         yield session
+
+
+def get_read_connection(request: Request):  # pragma: no cover
+    """
+    Connection for read-only routes, served by a read replica when one is configured.
+
+    Routes run Core statements on it and get plain rows back, without the identity map and
+    attribute tracking of a Session. It runs in a READ ONLY transaction, so a write fails.
+    Clients that wrote in the last READ_YOUR_WRITES_SECONDS are kept on the primary, and the
+    operations of a batch read through the batch session, so they see its writes.
+    """
+    if batch := current_batch.get():
+        yield batch.session.connection()
+        return
+
+    use_primary = reads_own_writes(request, get_settings().READ_YOUR_WRITES_SECONDS)
+
+    with get_replicas().connect(use_primary) as connection:
+        yield connection.execution_options(postgresql_readonly=True)
+
+
+def warm_up_pool(engine: Engine, connections: int) -> int:
+    """
+    Opens `connections` pool connections at the same time and returns them to the pool.
+
+    Checking them out together forces the pool to really open that many connections,
+    so the first requests after boot don't pay for the connection setup.
+
+    Returns:
+        int: The number of connections that were opened successfully.
+    """
+    opened = 0
+
+    with ExitStack() as stack:
+        for _ in range(connections):
+            try:
+                connection = stack.enter_context(engine.connect())
+                connection.execute(text('SELECT 1'))
+            except SQLAlchemyError as error:
+                logger.warning('Could not warm up database connection: %s', error)
+                break
+            opened += 1
+
+    logger.info('Database pool warmed up with %d connections', opened)
+
+    return opened
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from http import HTTPStatus
+from typing import Annotated, Callable
+from uuid import uuid4
+
+from fastapi import Depends, HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import and_, delete, event, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.database import get_session
+from app.logging_config import logger
+from app.models import IdempotencyKey
+from app.ratelimit import client_ip
+from app.security import get_token_subject
+from app.settings import get_settings
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+POLL_INTERVAL = 0.05
+
+T_Session = Annotated[Session, Depends(get_session)]
+
+
+class IdempotentReplay(Exception):
+    def __init__(self, record: IdempotencyKey):
+        self.record = record
+
+
+class LeaseLost(Exception):
+    """
+    Raised on the commit of a handler whose key was taken over by a retry after its lease
+    expired: the commit is aborted, so only one of them applies its writes.
+    """
+
+
+@dataclass
+class IdempotencyClaim:
+    session: Session
+    record_id: int
+    owner: str
+    key: str
+    # Set once the handler committed: from then on, the key is never taken over.
+    committed: bool = False
+
+    def attach(self):
+        event.listen(self.session, 'before_commit', self._mark_committed)
+        event.listen(self.session, 'after_commit', self._committed)
+
+    def detach(self):
+        for name, listener in (
+            ('before_commit', self._mark_committed),
+            ('after_commit', self._committed),
+        ):
+            if event.contains(self.session, name, listener):
+                event.remove(self.session, name, listener)
+
+    def _mark_committed(self, session: Session):
+        # In the transaction of the handler: its writes and the marker commit together.
+        marked = session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.id == self.record_id, IdempotencyKey.owner == self.owner)
+            .values(committed_at=func.now()),
+            execution_options={'synchronize_session': False},
+        ).rowcount
+        if not marked:
+            raise LeaseLost(f'Idempotency-Key {self.key} was taken over by a retry')
+
+    def _committed(self, session: Session):
+        self.committed = True
+
+
+def claim_key(session: Session, scope: str, key: str, fingerprint: str, owner: str) -> int | None:
+    """
+    Reserves `key` for this request as `owner`, if no other request holds it.
+
+    The reservation is a lease of IDEMPOTENCY_LEASE_SECONDS. If the request holding it
+    dies before committing, a retry of the same request takes the key over once the lease
+    ends. A key whose handler committed is never taken over, even without a stored response.
+
+    Raises:
+        IdempotentReplay: If the key already has a stored response.
+        HTTPException: 422 if the key was used with a different request, 409 if its request
+            committed but died before storing the response.
+
+    Returns:
+        int | None: The id of the reserved record, or None while another request holds it.
+    """
+    settings = get_settings()
+    statement = insert(IdempotencyKey).values(
+        scope=scope,
+        key=key,
+        fingerprint=fingerprint,
+        owner=owner,
+        expires_at=func.now() + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+        locked_until=func.now() + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS),
+    )
+    record_id = session.scalar(
+        statement.on_conflict_do_update(
+            index_elements=['scope', 'key'],
+            set_={
+                'fingerprint': statement.excluded.fingerprint,
+                'owner': statement.excluded.owner,
+                'expires_at': statement.excluded.expires_at,
+                'locked_until': statement.excluded.locked_until,
+                'committed_at': None,
+                'status_code': None,
+                'response_body': None,
+            },
+            where=or_(
+                IdempotencyKey.expires_at < func.now(),
+                and_(
+                    IdempotencyKey.committed_at.is_(None),
+                    IdempotencyKey.status_code.is_(None),
+                    IdempotencyKey.locked_until < func.now(),
+                    IdempotencyKey.fingerprint == statement.excluded.fingerprint,
+                ),
+            ),
+        ).returning(IdempotencyKey.id)
+    )
+    session.commit()
+
+    if record_id:
+        return record_id
+
+    row = session.execute(
+        select(IdempotencyKey, (IdempotencyKey.locked_until < func.now()).label('lease_expired')).where(
+            IdempotencyKey.scope == scope, IdempotencyKey.key == key
+        )
+    ).first()
+    # Gives the connection back to the pool while the caller waits.
+    session.rollback()
+
+    if row is None:
+        return None
+
+    record, lease_expired = row
+    if record.fingerprint != fingerprint:
+        logger.warning('Idempotency-Key %s reused with a different request', key)
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+            detail='Idempotency-Key was already used with a different request',
+        )
+
+    if record.status_code is not None:
+        raise IdempotentReplay(record)
+
+    if record.committed_at is not None and lease_expired:
+        logger.warning('Idempotency-Key %s was applied but its response was lost', key)
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT,
+            detail='A request with this Idempotency-Key was already applied',
+        )
+
+    return None
+
+
+def store_response(claim: IdempotencyClaim, status_code: int, body: bytes):
+    claim.detach()
+    claim.session.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.id == claim.record_id, IdempotencyKey.owner == claim.owner)
+        .values(status_code=status_code, response_body=body)
+    )
+    claim.session.commit()
+
+
+def release_key(claim: IdempotencyClaim):
+    claim.detach()
+    claim.session.rollback()
+    claim.session.execute(
+        delete(IdempotencyKey).where(
+            IdempotencyKey.id == claim.record_id,
+            IdempotencyKey.owner == claim.owner,
+            IdempotencyKey.committed_at.is_(None),
+        )
+    )
+    claim.session.commit()
+
+
+async def idempotency(request: Request, session: T_Session):
+    """
+    Dependency honoring the `Idempotency-Key` header of a mutating route.
+
+    The first request with a key runs the handler and its successful response is stored
+    for IDEMPOTENCY_TTL_SECONDS. Retries replay that response without running the handler
+    again, and concurrent duplicates wait for the first one to finish, in the event loop
+    and without a database connection.
+
+    Authenticated requests are scoped by user; anonymous ones, like sign-ups, by client IP.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return
+
+    subject = get_token_subject(request.headers.get('Authorization'))
+    settings = get_settings()
+    scope = subject or f'anonymous:{client_ip(request, settings.RATE_LIMIT_TRUST_FORWARDED)}'
+    body = await request.body()
+    fingerprint = hashlib.sha256(
+        b'\n'.join([request.method.encode(), request.url.path.encode(), body])
+    ).hexdigest()
+
+    owner = uuid4().hex
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while not (record_id := await run_in_threadpool(claim_key, session, scope, key, fingerprint, owner)):
+        if time.monotonic() > deadline:
+            logger.warning('Idempotency-Key %s is still in progress', key)
+            raise HTTPException(
+                status_code=HTTPStatus.CONFLICT,
+                detail='A request with this Idempotency-Key is in progress',
+            )
+        await asyncio.sleep(POLL_INTERVAL)
+
+    claim = IdempotencyClaim(session, record_id, owner, key)
+    claim.attach()
+    request.state.idempotency = claim
+
+
+class IdempotentRoute(APIRoute):
+    """
+    Route class that stores and replays the responses of the `idempotency` dependency.
+
+    Only successful responses are stored; on errors the key is released so the client can
+    retry. The key is marked as committed in the transaction of the handler: a handler
+    that fails after committing, or a worker that dies before storing the response, leaves
+    a key that is never run again, and its retries get a 409.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            try:
+                response = await handler(request)
+            except IdempotentReplay as replay:
+                logger.info('Replaying stored response for Idempotency-Key %s', replay.record.key)
+                return Response(
+                    content=replay.record.response_body,
+                    status_code=replay.record.status_code,
+                    media_type='application/json',
+                    headers={REPLAYED_HEADER: 'true'},
+                )
+            except Exception:
+                if claim := getattr(request.state, 'idempotency', None):
+                    if claim.committed:
+                        claim.detach()
+                        logger.warning(
+                            'Idempotency-Key %s kept: the request failed after committing',
+                            claim.key,
+                        )
+                    else:
+                        await run_in_threadpool(release_key, claim)
+                raise
+
+            if claim := getattr(request.state, 'idempotency', None):
+                if response.status_code < HTTPStatus.BAD_REQUEST:
+                    await run_in_threadpool(store_response, claim, response.status_code, response.body)
+                else:
+                    await run_in_threadpool(release_key, claim)
+
+            return response
+
+        return route_handler
@@ -1,11 +1,40 @@
 from datetime import datetime
 from enum import Enum
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    ForeignKey,
+    Index,
+    LargeBinary,
+    Sequence,
+    String,
+    Text,
+    UniqueConstraint,
+    event,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import Mapped, mapped_column, registry, relationship
 
 table_registry = registry()
 
+# Bumped on every insert and update of a todo (and on every tombstone), so clients
+# can ask for everything that changed after the last version they have seen.
+todo_version_seq = Sequence('todo_version_seq', metadata=table_registry.metadata)
+
+# Transaction that wrote a version. Versions become visible at commit, not in order: the
+# changes feed stops before the ones written by transactions that may still be running.
+CURRENT_XACT_ID = 'pg_current_xact_id()::text::bigint'
+
+# `todos` is hash partitioned on `user_id`: every per-user query only touches one partition.
+TODO_PARTITIONS = 16
+
+# Undone todos with a due date whose reminder wasn't sent yet. Queries repeat it as written, so the
+# planner matches the partial index even with the generic plans of prepared statements.
+PENDING_REMINDER = "due_at IS NOT NULL AND reminded_at IS NULL AND state IN ('draft', 'todo', 'doing')"
+
 
 class TodoState(str, Enum):
     draft = 'draft'
@@ -15,6 +44,12 @@ class TodoState(str, Enum):
     trash = 'trash'
 
 
+class CpfStatus(str, Enum):
+    pending = 'pending'
+    verified = 'verified'
+    rejected = 'rejected'
+
+
 @table_registry.mapped_as_dataclass
 class User:
     __tablename__ = 'users'
@@ -24,25 +59,214 @@ class User:
     password: Mapped[str]
     email: Mapped[str] = mapped_column(unique=True)
     cpf: Mapped[str] = mapped_column(unique=True)
+    # Pending while the CPF waits for the verification worker (CPF_VERIFICATION_DEFERRED).
+    cpf_status: Mapped[CpfStatus] = mapped_column(
+        default=CpfStatus.verified, server_default=CpfStatus.verified.value
+    )
     created_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(
         init=False, server_default=func.now(), onupdate=func.now()
     )
+    deleted_at: Mapped[datetime | None] = mapped_column(init=False, default=None)
     todos: Mapped[list['Todo']] = relationship(
-        init=False, back_populates='user', cascade='all, delete-orphan'
+        init=False, back_populates='user', cascade='all, delete-orphan', passive_deletes=True
     )
 
 
 @table_registry.mapped_as_dataclass
 class Todo:
     __tablename__ = 'todos'
-    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    # Ids still come from a single sequence; the key includes the partition key, as Postgres requires.
+    id: Mapped[int] = mapped_column(init=False, primary_key=True, autoincrement=True)
     title: Mapped[str]
     description: Mapped[str]
     state: Mapped[TodoState]
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'))
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'), primary_key=True, index=True
+    )
+    # Fractional index, see app.ordering; byte order comparison keeps it in sync with Python.
+    position: Mapped[str] = mapped_column(String(collation='C'))
+    # Lowercase labels. text[] like the bound filter values, so the GIN index applies to `&&` and `@>`.
+    tags: Mapped[list[str]] = mapped_column(ARRAY(Text), default_factory=list, server_default='{}')
+    due_at: Mapped[datetime | None] = mapped_column(default=None)
+    # Set once the reminder scheduler has sent the due date reminder; cleared when `due_at` changes.
+    reminded_at: Mapped[datetime | None] = mapped_column(init=False, default=None)
     created_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(
         init=False, server_default=func.now(), onupdate=func.now()
     )
+    version: Mapped[int] = mapped_column(
+        BigInteger,
+        init=False,
+        server_default=todo_version_seq.next_value(),
+        onupdate=todo_version_seq.next_value(),
+    )
+    xact_id: Mapped[int | None] = mapped_column(
+        BigInteger, init=False, server_default=text(CURRENT_XACT_ID), onupdate=text(CURRENT_XACT_ID)
+    )
     user: Mapped[User] = relationship(init=False, back_populates='todos')
+
+    __table_args__ = (
+        Index('ix_todos_user_id_version', 'user_id', 'version'),
+        Index('ix_todos_user_id_position', 'user_id', 'position'),
+        Index('ix_todos_tags', 'tags', postgresql_using='gin'),
+        Index('ix_todos_pending_reminders', 'due_at', postgresql_where=text(PENDING_REMINDER)),
+        Index(
+            'ix_todos_trash_updated_at',
+            'updated_at',
+            postgresql_where=text("state = 'trash'"),
+        ),
+        Index(
+            'ix_todos_done_updated_at',
+            'updated_at',
+            postgresql_where=text("state = 'done'"),
+        ),
+        {'postgresql_partition_by': 'HASH (user_id)'},
+    )
+
+
+for remainder in range(TODO_PARTITIONS):
+    event.listen(
+        Todo.__table__,
+        'after_create',
+        DDL(
+            f'CREATE TABLE todos_p{remainder} PARTITION OF todos '
+            f'FOR VALUES WITH (MODULUS {TODO_PARTITIONS}, REMAINDER {remainder})'
+        ),
+    )
+
+
+# Done and trashed todos moved out of `todos` by the archival job, with the same columns.
+# They are read only, and only listed when asked with `include_archived`.
+@table_registry.mapped_as_dataclass
+class TodoArchive:
+    __tablename__ = 'todos_archive'
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    title: Mapped[str]
+    description: Mapped[str]
+    state: Mapped[TodoState]
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'))
+    position: Mapped[str] = mapped_column(String(collation='C'))
+    created_at: Mapped[datetime]
+    updated_at: Mapped[datetime]
+    version: Mapped[int] = mapped_column(BigInteger)
+    xact_id: Mapped[int | None] = mapped_column(BigInteger)
+    tags: Mapped[list[str]] = mapped_column(ARRAY(Text), server_default='{}')
+    due_at: Mapped[datetime | None]
+    reminded_at: Mapped[datetime | None]
+    archived_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_todos_archive_user_id_position', 'user_id', 'position'),
+        Index(
+            'ix_todos_archive_trash_updated_at',
+            'updated_at',
+            postgresql_where=text("state = 'trash'"),
+        ),
+    )
+
+
+@table_registry.mapped_as_dataclass
+class TodoTombstone:
+    __tablename__ = 'todo_tombstones'
+    todo_id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int]
+    version: Mapped[int] = mapped_column(
+        BigInteger, init=False, server_default=todo_version_seq.next_value()
+    )
+    xact_id: Mapped[int | None] = mapped_column(
+        BigInteger, init=False, server_default=text(CURRENT_XACT_ID)
+    )
+    deleted_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
+
+    __table_args__ = (Index('ix_todo_tombstones_user_id_version', 'user_id', 'version'),)
+
+
+@table_registry.mapped_as_dataclass
+class IdempotencyKey:
+    __tablename__ = 'idempotency_keys'
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    scope: Mapped[str]
+    key: Mapped[str]
+    fingerprint: Mapped[str]
+    expires_at: Mapped[datetime]
+    # Random id of the request holding the key: a request whose key was taken over can't commit.
+    owner: Mapped[str | None] = mapped_column(default=None)
+    # Set in the transaction of the handler: a committed key is never run again.
+    committed_at: Mapped[datetime | None] = mapped_column(default=None)
+    # End of the lease of the request running with the key, taken over by a retry after it.
+    locked_until: Mapped[datetime | None] = mapped_column(default=None)
+    status_code: Mapped[int | None] = mapped_column(default=None)
+    response_body: Mapped[bytes | None] = mapped_column(LargeBinary, default=None)
+    created_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('scope', 'key'),
+        Index('ix_idempotency_keys_expires_at', 'expires_at'),
+    )
+
+
+@table_registry.mapped_as_dataclass
+class RefreshToken:
+    __tablename__ = 'refresh_tokens'
+    jti: Mapped[str] = mapped_column(primary_key=True)
+    # Shared by every token rotated from the same login; access tokens carry it as `sid`.
+    session_id: Mapped[str] = mapped_column(index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), index=True)
+    expires_at: Mapped[datetime]
+    revoked_at: Mapped[datetime | None] = mapped_column(default=None)
+    created_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
+
+
+@table_registry.mapped_as_dataclass
+class RevokedToken:
+    __tablename__ = 'revoked_tokens'
+    # The `jti` of a single access token or the `sid` of a whole login session.
+    token_id: Mapped[str] = mapped_column(primary_key=True)
+    expires_at: Mapped[datetime] = mapped_column(index=True)
+    revoked_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
+
+
+@table_registry.mapped_as_dataclass
+class OutboxEvent:
+    __tablename__ = 'outbox_events'
+    id: Mapped[int] = mapped_column(BigInteger, init=False, primary_key=True)
+    event_type: Mapped[str]
+    aggregate_id: Mapped[int]
+    payload: Mapped[dict] = mapped_column(JSONB)
+    attempts: Mapped[int] = mapped_column(init=False, default=0)
+    # When the event is due; moved ahead by the retry backoff after a failed delivery.
+    next_attempt_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
+    last_error: Mapped[str | None] = mapped_column(init=False, default=None)
+    created_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
+    dispatched_at: Mapped[datetime | None] = mapped_column(init=False, default=None)
+    # Set once OUTBOX_MAX_ATTEMPTS deliveries failed: the event is kept, but no longer sent.
+    dead_lettered_at: Mapped[datetime | None] = mapped_column(init=False, default=None)
+
+    __table_args__ = (
+        Index(
+            'ix_outbox_events_pending',
+            'id',
+            postgresql_where=text('dispatched_at IS NULL AND dead_lettered_at IS NULL'),
+        ),
+    )
+
+
+@table_registry.mapped_as_dataclass
+class CpfVerificationJob:
+    __tablename__ = 'cpf_verification_jobs'
+    id: Mapped[int] = mapped_column(BigInteger, init=False, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'))
+    attempts: Mapped[int] = mapped_column(init=False, default=0)
+    # When the job is due; moved ahead by the claim lease and by the retry backoff.
+    run_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now(), index=True)
+    last_error: Mapped[str | None] = mapped_column(init=False, default=None)
+    created_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
+
+
+@table_registry.mapped_as_dataclass
+class PositionRebalance:
+    # Users whose todo positions got longer than POSITION_MAX_LENGTH, queued by the moves.
+    __tablename__ = 'position_rebalances'
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
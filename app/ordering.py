@@ -0,0 +1,118 @@
+import math
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models import PositionRebalance, Todo
+
+# In ascending byte order, so positions sort the same in Python and in a `C` collation column.
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+FIRST_POSITION = DIGITS[len(DIGITS) // 2]
+
+
+def _midpoint(low: str, high: str | None) -> str:
+    if high is not None:
+        common = 0
+        while (low[common] if common < len(low) else DIGITS[0]) == high[common]:
+            common += 1
+        if common:
+            return high[:common] + _midpoint(low[common:], high[common:])
+
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else len(DIGITS)
+
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit + 1) // 2]
+
+    if high is not None and len(high) > 1:
+        return high[0]
+
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+def _successor(position: str) -> str:
+    # Bumping the first digit that can grow keeps appended positions short.
+    for index, digit in enumerate(position):
+        if digit != DIGITS[-1]:
+            return position[:index] + DIGITS[DIGITS.index(digit) + 1]
+
+    return position + FIRST_POSITION
+
+
+def position_between(before: str | None, after: str | None) -> str:
+    """
+    Returns a position that sorts strictly between `before` and `after`.
+
+    `None` stands for the start or the end of the list. Positions never end with the
+    smallest digit, so there is always room for another one before them.
+
+    Raises:
+        ValueError: If `before` does not sort before `after`.
+    """
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f'{before!r} does not sort before {after!r}')
+
+    if after is None:
+        return _successor(before) if before else FIRST_POSITION
+
+    return _midpoint(before or '', after)
+
+
+def spread_positions(count: int) -> list[str]:
+    """
+    Returns `count` ascending positions of the same short length, evenly spread over the key space.
+    """
+    width = max(1, math.ceil(math.log(count + 1, len(DIGITS)))) + 1
+    space = len(DIGITS) ** width
+
+    positions = []
+    for index in range(1, count + 1):
+        value = index * space // (count + 1)
+        digits = []
+        for _ in range(width):
+            value, digit = divmod(value, len(DIGITS))
+            digits.append(DIGITS[digit])
+        positions.append(''.join(reversed(digits)).rstrip(DIGITS[0]))
+
+    return positions
+
+
+def rebalance_positions(session: Session, user_id: int) -> int:
+    """
+    Rewrites the positions of all the todos of a user, keeping their order.
+
+    The versions are bumped, so the clients sync the new positions, but `updated_at` is
+    kept: the retention of the trash and the archival count from it.
+
+    Returns:
+        int: The number of todos updated.
+    """
+    todos = session.execute(
+        select(Todo.id, Todo.updated_at)
+        .where(Todo.user_id == user_id)
+        .order_by(Todo.position, Todo.id)
+        .with_for_update()
+    ).all()
+
+    if not todos:
+        return 0
+
+    session.execute(
+        update(Todo),
+        [
+            {'id': todo.id, 'user_id': user_id, 'position': position, 'updated_at': todo.updated_at}
+            for todo, position in zip(todos, spread_positions(len(todos)))
+        ],
+    )
+
+    return len(todos)
+
+
+def queue_rebalance(session: Session, user_id: int):
+    """
+    Queues a rebalance of the positions of a user, in the caller's transaction.
+
+    A user already in the queue is left as is, so moves only add a row the first time.
+    """
+    session.execute(insert(PositionRebalance).values(user_id=user_id).on_conflict_do_nothing())
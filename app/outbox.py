@@ -0,0 +1,235 @@
+import json
+import time
+from datetime import timedelta
+from functools import cache
+from pathlib import Path
+from typing import Protocol
+from urllib.parse import urlparse
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.database import get_engine
+from app.logging_config import logger
+from app.models import OutboxEvent, Todo, User
+from app.settings import get_settings
+
+MAX_RETRY_DELAY = timedelta(hours=1)
+MAX_RETRY_EXPONENT = 12
+
+
+def record_event(session: Session, event_type: str, aggregate_id: int, payload: dict):
+    """
+    Adds a domain event to the outbox, in the caller's transaction.
+
+    The event is only stored if the mutation commits, and the request still makes a single
+    commit; delivering it is left to the dispatcher.
+    """
+    if get_settings().OUTBOX_ENABLED:
+        session.add(OutboxEvent(event_type=event_type, aggregate_id=aggregate_id, payload=payload))
+
+
+def todo_payload(todo: Todo) -> dict:
+    return {
+        'id': todo.id,
+        'user_id': todo.user_id,
+        'title': todo.title,
+        'description': todo.description,
+        'state': todo.state.value,
+        'position': todo.position,
+        'tags': todo.tags,
+        'due_at': todo.due_at.isoformat() if todo.due_at else None,
+    }
+
+
+def user_payload(user: User) -> dict:
+    return {'id': user.id, 'username': user.username, 'email': user.email}
+
+
+def event_message(event: OutboxEvent) -> dict:
+    return {
+        'id': event.id,
+        'type': event.event_type,
+        'aggregate_id': event.aggregate_id,
+        'payload': event.payload,
+        'created_at': event.created_at.isoformat(),
+    }
+
+
+class Sink(Protocol):
+    def send(self, messages: list[dict]): ...
+
+
+class FileSink:
+    """
+    Appends the events to a file, one JSON document per line.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+    def send(self, messages: list[dict]):
+        with self.path.open('a', encoding='utf-8') as file:
+            file.writelines(json.dumps(message) + '\n' for message in messages)
+
+
+class HttpSink:
+    """
+    POSTs each batch of events as a JSON array; any non 2xx response fails the batch.
+    """
+
+    def __init__(self, url: str, timeout: float = 5):
+        import requests  # noqa: PLC0415
+
+        self.url = url
+        self.timeout = timeout
+        self.client = requests.Session()
+
+    def send(self, messages: list[dict]):
+        response = self.client.post(self.url, json=messages, timeout=self.timeout)
+        response.raise_for_status()
+
+
+def sink_from_url(url: str) -> Sink:
+    """
+    Builds the sink for a `file:///path/events.jsonl` or `http(s)://host/path` URL.
+
+    Raises:
+        ValueError: If the URL scheme has no sink.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == 'file':
+        return FileSink(parsed.path)
+    if parsed.scheme in {'http', 'https'}:
+        return HttpSink(url)
+
+    raise ValueError(f'Unsupported outbox sink: {url}')
+
+
+@cache
+def get_outbox_sink() -> Sink:
+    return sink_from_url(get_settings().OUTBOX_SINK_URL)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return min(timedelta(seconds=2 ** min(attempts, MAX_RETRY_EXPONENT)), MAX_RETRY_DELAY)
+
+
+def fail_events(session: Session, events: list[OutboxEvent], error: Exception, max_attempts: int):
+    """
+    Schedules another delivery of `events` with an exponential backoff, or moves the ones
+    that reached `max_attempts` to the dead letters.
+    """
+    for event in events:
+        attempts = event.attempts + 1
+        values = {'attempts': attempts, 'last_error': str(error)[:500]}
+        if attempts >= max_attempts:
+            logger.error('Outbox event %d dead-lettered: %s', event.id, error)
+            values['dead_lettered_at'] = func.now()
+        else:
+            values['next_attempt_at'] = func.now() + retry_delay(attempts)
+        session.execute(
+            update(OutboxEvent).where(OutboxEvent.id == event.id).values(**values),
+            execution_options={'synchronize_session': False},
+        )
+
+
+def dispatch_batch(session: Session, sink: Sink, batch_size: int) -> int:
+    """
+    Delivers the oldest due events to `sink` and marks them as dispatched.
+
+    The batch is claimed with FOR UPDATE SKIP LOCKED, so several dispatchers can run at
+    the same time without sending the same event twice. Delivery is at least once: if the
+    commit fails after `sink.send`, the batch is sent again.
+
+    When the batch fails its events are sent one by one, so an event the sink keeps
+    refusing does not hold back the others. Each failed event is retried with an
+    exponential backoff, and set aside as dead-lettered after OUTBOX_MAX_ATTEMPTS failures.
+
+    Raises:
+        Exception: The sink error, when none of the events could be delivered.
+
+    Returns:
+        int: The number of dispatched events.
+    """
+    max_attempts = get_settings().OUTBOX_MAX_ATTEMPTS
+    events = session.scalars(
+        select(OutboxEvent)
+        .where(
+            OutboxEvent.dispatched_at.is_(None),
+            OutboxEvent.dead_lettered_at.is_(None),
+            OutboxEvent.next_attempt_at <= func.now(),
+        )
+        .order_by(OutboxEvent.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not events:
+        session.rollback()
+        return 0
+
+    try:
+        sink.send([event_message(event) for event in events])
+        delivered = events
+    except Exception as error:
+        logger.warning('Could not deliver %d outbox events: %s', len(events), error)
+        if len(events) == 1:
+            fail_events(session, events, error, max_attempts)
+            session.commit()
+            raise
+
+        delivered = []
+        for event in events:
+            try:
+                sink.send([event_message(event)])
+            except Exception as event_error:
+                fail_events(session, [event], event_error, max_attempts)
+                error = event_error
+            else:
+                delivered.append(event)
+
+        if not delivered:
+            session.commit()
+            raise error from None
+
+    event_ids = [event.id for event in delivered]
+    session.execute(
+        update(OutboxEvent).where(OutboxEvent.id.in_(event_ids)).values(dispatched_at=func.now()),
+        execution_options={'synchronize_session': False},
+    )
+    session.commit()
+
+    return len(event_ids)
+
+
+def dispatch(sink: Sink | None = None) -> int:
+    """
+    Delivers pending events in batches until the outbox is drained.
+
+    Returns:
+        int: The number of dispatched events.
+    """
+    settings = get_settings()
+    sink = sink or get_outbox_sink()
+
+    dispatched = 0
+    with Session(get_engine()) as session:
+        while count := dispatch_batch(session, sink, settings.OUTBOX_BATCH_SIZE):
+            dispatched += count
+            if count < settings.OUTBOX_BATCH_SIZE:
+                break
+
+    if dispatched:
+        logger.info('Dispatched %d outbox events', dispatched)
+
+    return dispatched
+
+
+if __name__ == '__main__':
+    # Runs the dispatcher as its own process, so delivery scales apart from the API.
+    while True:
+        try:
+            dispatch()
+        except Exception:
+            logger.exception('Outbox dispatch failed')
+        time.sleep(get_settings().OUTBOX_INTERVAL_SECONDS)
@@ -0,0 +1,173 @@
+import hashlib
+import hmac
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from http import HTTPStatus
+from types import FrameType
+
+from fastapi import HTTPException, Request
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+# Samples whose innermost frame is in one of these modules are threads waiting for work, not doing it.
+IDLE_MODULES = {'threading', 'selectors', 'queue'}
+
+
+def sign_profile_request(secret: str, expires: int) -> str:
+    """
+    Builds the value of the `X-Profile` header, valid until the `expires` unix timestamp.
+    """
+    digest = hmac.new(secret.encode(), f'profile:{expires}'.encode(), hashlib.sha256).hexdigest()
+    return f'{expires}.{digest}'
+
+
+def verify_profile_request(secret: str, value: str | None) -> bool:
+    expires = (value or '').partition('.')[0]
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+
+    return hmac.compare_digest(sign_profile_request(secret, int(expires)), value)
+
+
+def collapse(frame: FrameType | None, thread_name: str) -> str:
+    """
+    Renders a stack as `thread;module:function;...`, from the outermost frame to the innermost one.
+    """
+    stack = []
+    while frame is not None:
+        stack.append(f'{frame.f_globals.get("__name__")}:{frame.f_code.co_qualname}')
+        frame = frame.f_back
+    stack.append(thread_name.replace(' ', '_'))
+    return ';'.join(reversed(stack))
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every busy thread at a fixed interval, from a background thread.
+
+    The request may run on the event loop and on threadpool workers, so all threads are sampled and
+    each stack is rooted at its thread name; requests served concurrently show up in the profile too.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> str:
+        """
+        Stops sampling and returns the profile in the collapsed stacks format.
+        """
+        self._stopped.set()
+        self._thread.join()
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stopped.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or frame.f_globals.get('__name__') in IDLE_MODULES:
+                    continue
+
+                self.samples[collapse(frame, names.get(ident, str(ident)))] += 1
+
+            self._stopped.wait(self.interval)
+
+
+class ProfileStore:
+    """
+    Keeps the last `size` profiles, keyed by profile id.
+    """
+
+    def __init__(self, size: int = 100):
+        self.size = size
+        self._profiles: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile_id: str, profile: str):
+        with self._lock:
+            self._profiles[profile_id] = profile
+            self._profiles.move_to_end(profile_id)
+            while len(self._profiles) > self.size:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> str | None:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests with a valid signed `X-Profile` header, plus a random `sample_rate` share.
+
+    The profile is stored under an id generated for it, sent back in the `X-Profile-Id` header:
+    a client-supplied id could overwrite or guess the profile of another request.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: ProfileStore,
+        secret: str,
+        sample_rate: float = 0.0,
+        interval: float = 0.005,
+    ):
+        self.app = app
+        self.store = store
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.interval = interval
+
+    def should_profile(self, headers: Headers) -> bool:
+        if verify_profile_request(self.secret, headers.get(PROFILE_HEADER)):
+            return True
+
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if not self.should_profile(headers):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_with_profile_id(message: Message):
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message).append(PROFILE_ID_HEADER, profile_id)
+            await send(message)
+
+        profiler = SamplingProfiler(self.interval)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            self.store.add(profile_id, profiler.stop())
+
+
+def require_profile_signature(request: Request):
+    secret = request.app.state.profile_secret
+    if not verify_profile_request(secret, request.headers.get(PROFILE_HEADER)):
+        raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail='Invalid profile signature')
+
+
+if __name__ == '__main__':
+    from app.settings import get_settings  # noqa: PLC0415
+
+    minutes = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print(sign_profile_request(get_settings().SECRET_KEY, int(time.time()) + minutes * 60))
@@ -0,0 +1,172 @@
+# Statements of the hot paths, built once at import time instead of on every request.
+# Values go through bind parameters, so each execution reuses the same construct and its
+# cached compiled SQL, and psycopg can prepare it server-side (DATABASE_PREPARE_THRESHOLD).
+
+from functools import cache
+from typing import Literal
+
+from sqlalchemy import Select, Text, bindparam, func, select, text, union_all, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import aliased
+
+from app.models import Todo, TodoArchive, TodoState, User
+
+USER_BY_EMAIL = select(User).where(User.email == bindparam('email'), User.deleted_at.is_(None))
+
+USER_BY_USERNAME = select(User).where(User.username == bindparam('username'), User.deleted_at.is_(None))
+
+USER_BY_ID = select(User).where(User.id == bindparam('user_id'), User.deleted_at.is_(None))
+
+# Every transaction with a lower id has finished: its changes are all visible.
+OLDEST_RUNNING_XACT = select(text('pg_snapshot_xmin(pg_current_snapshot())::text::bigint'))
+
+# Trashed todos only wait to be purged: they can no longer be read, changed or moved.
+TODO_BY_ID = select(Todo).where(
+    Todo.user_id == bindparam('user_id'),
+    Todo.id == bindparam('todo_id'),
+    Todo.state != TodoState.trash,
+)
+
+LAST_POSITION = (
+    select(Todo.position)
+    .where(Todo.user_id == bindparam('user_id'))
+    .order_by(Todo.position.desc())
+    .limit(1)
+)
+
+# The closest positions around `position` among the other todos, for moves given one neighbor.
+NEXT_POSITION = (
+    select(Todo.position)
+    .where(
+        Todo.user_id == bindparam('user_id'),
+        Todo.position > bindparam('position'),
+        Todo.id != bindparam('todo_id'),
+        Todo.state != TodoState.trash,
+    )
+    .order_by(Todo.position)
+    .limit(1)
+)
+
+PREVIOUS_POSITION = (
+    select(Todo.position)
+    .where(
+        Todo.user_id == bindparam('user_id'),
+        Todo.position < bindparam('position'),
+        Todo.id != bindparam('todo_id'),
+        Todo.state != TodoState.trash,
+    )
+    .order_by(Todo.position.desc())
+    .limit(1)
+)
+
+# Bind names of an UPDATE can't clash with column names, hence the `b_` prefix.
+TRASH_TODO = (
+    update(Todo)
+    .where(
+        Todo.user_id == bindparam('b_user_id'),
+        Todo.id == bindparam('b_todo_id'),
+        Todo.state != TodoState.trash,
+    )
+    .values(state=TodoState.trash)
+)
+
+
+TagMatch = Literal['any', 'all']
+
+
+def _filter_todos(  # noqa: PLR0913, PLR0917
+    query: Select,
+    model,
+    title: bool,
+    description: bool,
+    state: bool,
+    tags: TagMatch | None,
+    due_before: bool,
+) -> Select:
+    query = query.where(model.user_id == bindparam('user_id'))
+
+    if title:
+        query = query.where(model.title.contains(bindparam('title')))
+
+    if description:
+        query = query.where(model.description.contains(bindparam('description')))
+
+    # The trash is only listed when asked for, its todos are deleted as far as users know.
+    if state:
+        query = query.where(model.state == bindparam('state'))
+    else:
+        query = query.where(model.state != TodoState.trash)
+
+    # Both operators are answered by the GIN index on `tags`, never by scanning the labels.
+    if tags == 'any':
+        query = query.where(model.tags.overlap(bindparam('tags', type_=ARRAY(Text))))
+    elif tags == 'all':
+        query = query.where(model.tags.contains(bindparam('tags', type_=ARRAY(Text))))
+
+    if due_before:
+        query = query.where(model.due_at < bindparam('due_before'))
+
+    return query
+
+
+@cache
+def list_todos_query(  # noqa: PLR0913, PLR0917
+    title: bool,
+    description: bool,
+    state: bool,
+    columns: tuple[str, ...] | None = None,
+    archived: bool = False,
+    tags: TagMatch | None = None,
+    due_before: bool = False,
+) -> Select:
+    """
+    Returns the `list_todos` statement for one combination of filters and projected columns.
+
+    Todos are sorted by `position`, read in order from the `(user_id, position)` index.
+    With `archived` the archived todos are merged in with a UNION ALL; each side is filtered
+    on its own, so both tables are read from their `(user_id, position)` index.
+
+    `tags` keeps the todos having `any` or `all` of the `tags` bind parameter. Trashed
+    todos are left out unless `state` filters on them.
+
+    Expects the `user_id`, `offset` and `limit` bind parameters, plus `title`,
+    `description`, `state`, `tags` and `due_before` for the filters that are enabled.
+    """
+    filters = (title, description, state, tags, due_before)
+    todo = Todo
+    if archived:
+        names = [column.name for column in Todo.__table__.columns]
+        todos = union_all(
+            *(
+                _filter_todos(select(*(getattr(model, name) for name in names)), model, *filters)
+                for model in (Todo, TodoArchive)
+            )
+        )
+        todo = aliased(Todo, todos.subquery('todos'))
+
+    query = select(*(getattr(todo, name) for name in columns)) if columns else select(todo)
+
+    if not archived:
+        query = _filter_todos(query, Todo, *filters)
+
+    query = query.order_by(todo.position, todo.id)
+
+    return query.offset(bindparam('offset')).limit(bindparam('limit'))
+
+
+@cache
+def tag_facets_query(
+    title: bool, description: bool, state: bool, tags: TagMatch | None = None, due_before: bool = False
+) -> Select:
+    """
+    Returns the statement counting the todos of each tag, for one combination of filters.
+
+    One aggregate over the user's todos, each expanded to its tags with `unnest`; the most
+    used tags come first. Expects the same bind parameters as `list_todos_query`, without
+    `offset` and `limit`.
+    """
+    tag = func.unnest(Todo.tags).column_valued('tag')
+    query = select(tag, func.count().label('count')).select_from(Todo)
+    query = _filter_todos(query, Todo, title, description, state, tags, due_before)
+
+    return query.group_by(tag).order_by(func.count().desc(), tag)
@@ -0,0 +1,227 @@
+import math
+import threading
+import time
+from dataclasses import dataclass
+from http import HTTPStatus
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from app.logging_config import logger
+from app.security import get_token_subject
+from app.settings import Settings
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'timestamp')
+local tokens = tonumber(bucket[1]) or capacity
+local timestamp = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - timestamp) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'timestamp', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+
+@dataclass(frozen=True)
+class Rate:
+    capacity: int
+    per_second: float
+
+    @classmethod
+    def parse(cls, value: str) -> 'Rate':
+        """
+        Parses a rate such as `10/minute` into a bucket of 10 tokens refilled over a minute.
+        """
+        count, period = value.split('/')
+        return cls(capacity=int(count), per_second=int(count) / PERIODS[period.strip()])
+
+
+def refill(tokens: float, elapsed: float, rate: Rate, cost: int = 1) -> tuple[float, float]:
+    """
+    Refills a token bucket for `elapsed` seconds and tries to take `cost` tokens out of it.
+
+    Returns:
+        tuple[float, float]: The tokens left and how long to wait before retrying (0 if allowed).
+    """
+    tokens = min(rate.capacity, tokens + max(0.0, elapsed) * rate.per_second)
+
+    if tokens >= cost:
+        return tokens - cost, 0.0
+
+    return tokens, (cost - tokens) / rate.per_second
+
+
+def client_ip(request: Request, trust_forwarded: bool = False) -> str:
+    """
+    Returns the address of the client, from the `X-Real-IP` set by nginx when `trust_forwarded`.
+    """
+    if trust_forwarded and (real_ip := request.headers.get('X-Real-IP')):
+        return real_ip
+
+    return request.client.host if request.client else 'unknown'
+
+
+class MemoryBackend:
+    """
+    Token buckets kept in the process memory, limits are enforced per replica.
+
+    Like the Redis keys, a bucket expires once it had the time to refill completely, as it is
+    then the same as a new one. The expired buckets are swept every `sweep_interval` seconds,
+    so clients sending random keys, such as usernames to `/auth/token`, can't grow the memory
+    beyond the buckets of the last refill period.
+    """
+
+    def __init__(self, clock=time.monotonic, sweep_interval: float = 60.0):
+        self._clock = clock
+        self._sweep_interval = sweep_interval
+        self._next_sweep = clock() + sweep_interval
+        self._buckets: dict[str, tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def consume(self, key: str, rate: Rate, cost: int = 1) -> float:
+        with self._lock:
+            now = self._clock()
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+            tokens, timestamp, _ = self._buckets.get(key, (rate.capacity, now, now))
+            tokens, wait = refill(tokens, now - timestamp, rate, cost)
+            self._buckets[key] = (tokens, now, now + rate.capacity / rate.per_second)
+
+        return wait
+
+    def _sweep(self, now: float):
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+        self._next_sweep = now + self._sweep_interval
+
+
+class RedisBackend:
+    """
+    Token buckets stored in Redis (or any server speaking its protocol), shared by every replica.
+
+    The bucket is updated atomically by a Lua script that uses the server clock,
+    so replicas with skewed clocks still agree on the refill.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    @classmethod
+    def from_url(cls, url: str) -> 'RedisBackend':
+        import redis  # noqa: PLC0415
+
+        return cls(redis.Redis.from_url(url))
+
+    def consume(self, key: str, rate: Rate, cost: int = 1) -> float:
+        wait = self._client.eval(TOKEN_BUCKET_SCRIPT, 1, key, rate.capacity, rate.per_second, cost)
+        return float(wait)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        backend,
+        per_ip: dict[str, str],
+        per_user: dict[str, str],
+        trust_forwarded: bool = False,
+    ):
+        self.backend = backend
+        self.per_ip = {scope: Rate.parse(value) for scope, value in per_ip.items()}
+        self.per_user = {scope: Rate.parse(value) for scope, value in per_user.items()}
+        self.trust_forwarded = trust_forwarded
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> 'RateLimiter':
+        if settings.RATE_LIMIT_REDIS_URL:
+            backend = RedisBackend.from_url(settings.RATE_LIMIT_REDIS_URL)
+        else:
+            backend = MemoryBackend()
+
+        return cls(
+            backend,
+            settings.RATE_LIMITS_PER_IP,
+            settings.RATE_LIMITS_PER_USER,
+            settings.RATE_LIMIT_TRUST_FORWARDED,
+        )
+
+    def client_ip(self, request: Request) -> str:
+        return client_ip(request, self.trust_forwarded)
+
+    def check(self, scope: str, ip: str, user: str | None) -> float:
+        """
+        Takes one token from the IP bucket and, when known, from the user bucket of `scope`.
+
+        A request denied by its IP bucket doesn't touch the user bucket: otherwise a single
+        client could keep any user locked out of the login.
+
+        Returns:
+            float: How long the client has to wait before retrying, 0 if the request is allowed.
+        """
+        wait = 0.0
+
+        if rate := self.per_ip.get(scope):
+            wait = self.backend.consume(f'ratelimit:{scope}:ip:{ip}', rate)
+            if wait > 0:
+                return wait
+
+        if user and (rate := self.per_user.get(scope)):
+            wait = max(wait, self.backend.consume(f'ratelimit:{scope}:user:{user}', rate))
+
+        return wait
+
+
+async def _request_user(request: Request, scope: str) -> str | None:
+    if scope == 'auth':
+        form = await request.form()
+        return form.get('username')
+
+    return get_token_subject(request.headers.get('Authorization'))
+
+
+class RateLimit:
+    """
+    Router dependency that enforces the `scope` limits of the application rate limiter.
+
+    Raises:
+        HTTPException: 429 with a `Retry-After` header when a bucket is empty.
+    """
+
+    def __init__(self, scope: str):
+        self.scope = scope
+
+    async def __call__(self, request: Request):
+        limiter: RateLimiter | None = getattr(request.app.state, 'rate_limiter', None)
+        if limiter is None:
+            return
+
+        ip = limiter.client_ip(request)
+        user = await _request_user(request, self.scope)
+
+        if isinstance(limiter.backend, MemoryBackend):
+            wait = limiter.check(self.scope, ip, user)
+        else:
+            wait = await run_in_threadpool(limiter.check, self.scope, ip, user)
+
+        if wait > 0:
+            logger.warning('Rate limit exceeded on %s for ip=%s user=%s', self.scope, ip, user)
+            raise HTTPException(
+                status_code=HTTPStatus.TOO_MANY_REQUESTS,
+                detail='Too many requests',
+                headers={'Retry-After': str(math.ceil(wait))},
+            )
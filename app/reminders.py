@@ -0,0 +1,116 @@
+import time
+from datetime import timedelta
+from functools import cache
+
+from sqlalchemy import Interval, Row, bindparam, func, select, text, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.database import get_engine
+from app.logging_config import logger
+from app.models import PENDING_REMINDER, Todo
+from app.outbox import Sink, sink_from_url
+from app.settings import get_settings
+
+# Key of the advisory lock taken by the scheduler: among the replicas, only its holder scans.
+REMINDER_LOCK_ID = 0x746F646F5F647565
+
+PENDING = (text(PENDING_REMINDER), Todo.due_at <= func.now() + bindparam('lead', type_=Interval))
+
+# A range scan on the `ix_todos_pending_reminders` partial index of each partition.
+DUE_REMINDERS = (
+    select(Todo.user_id, Todo.id).where(*PENDING).order_by(Todo.due_at).limit(bindparam('batch_size'))
+)
+
+
+def reminder_message(todo: Row) -> dict:
+    return {
+        'type': 'todo.due',
+        'todo_id': todo.id,
+        'user_id': todo.user_id,
+        'title': todo.title,
+        'due_at': todo.due_at.isoformat(),
+    }
+
+
+@cache
+def get_reminder_sink() -> Sink:
+    return sink_from_url(get_settings().REMINDER_SINK_URL)
+
+
+def send_reminders(session: Session, sink: Sink, lead: timedelta, batch_size: int) -> int | None:
+    """
+    Sends the reminders of the todos due within `lead`, oldest due date first, and marks them as sent.
+
+    The pending todos are found with `DUE_REMINDERS`, without reading the other todos. A
+    transaction level advisory lock makes the other replicas skip the tick instead of
+    scanning too. Delivery is at least once: if `sink.send` fails, nothing is marked and
+    the reminders are sent again on the next tick.
+
+    Returns:
+        int | None: The number of reminders sent, or None if another process holds the lock.
+    """
+    if not session.scalar(select(func.pg_try_advisory_xact_lock(REMINDER_LOCK_ID))):
+        session.rollback()
+        return None
+
+    # `updated_at`, `version` and `xact_id` are kept: a reminder is no change for the sync or archival.
+    todos = session.execute(
+        update(Todo)
+        .where(*PENDING, tuple_(Todo.user_id, Todo.id).in_(DUE_REMINDERS))
+        .values(
+            reminded_at=func.now(),
+            updated_at=Todo.updated_at,
+            version=Todo.version,
+            xact_id=Todo.xact_id,
+        )
+        .returning(Todo.id, Todo.user_id, Todo.title, Todo.due_at),
+        {'lead': lead, 'batch_size': batch_size},
+        execution_options={'synchronize_session': False},
+    ).all()
+    if not todos:
+        session.rollback()
+        return 0
+
+    try:
+        sink.send([reminder_message(todo) for todo in sorted(todos, key=lambda todo: todo.due_at)])
+    except Exception:
+        session.rollback()
+        raise
+
+    session.commit()
+
+    return len(todos)
+
+
+def remind(sink: Sink | None = None) -> int:
+    """
+    Sends the due reminders in batches, until none is left or another process holds the lock.
+
+    Returns:
+        int: The number of reminders sent.
+    """
+    settings = get_settings()
+    sink = sink or get_reminder_sink()
+    lead = timedelta(seconds=settings.REMINDER_LEAD_SECONDS)
+
+    sent = 0
+    with Session(get_engine()) as session:
+        while count := send_reminders(session, sink, lead, settings.REMINDER_BATCH_SIZE):
+            sent += count
+            if count < settings.REMINDER_BATCH_SIZE:
+                break
+
+    if sent:
+        logger.info('Sent %d todo reminders', sent)
+
+    return sent
+
+
+if __name__ == '__main__':
+    # Runs the scheduler as its own process; the advisory lock keeps a single active scanner.
+    while True:
+        try:
+            remind()
+        except Exception:
+            logger.exception('Sending todo reminders failed')
+        time.sleep(get_settings().REMINDER_INTERVAL_SECONDS)
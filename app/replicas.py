@@ -0,0 +1,118 @@
+import itertools
+import threading
+import time
+from http import HTTPStatus
+
+from sqlalchemy import Connection, Engine
+from sqlalchemy.exc import OperationalError
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.logging_config import logger
+
+LAST_WRITE_COOKIE = 'last_write'
+LAST_WRITE_HEADER = 'X-Last-Write'
+# Tolerated lead of a stamp over this clock, set by another API replica whose clock is ahead.
+MAX_CLOCK_SKEW = 1.0
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+class ReplicaRouter:
+    """
+    Hands out connections to the read replicas in round-robin order.
+
+    A replica that fails to connect is skipped for `retry_after` seconds; when
+    no replica is healthy the reads go to the primary.
+    """
+
+    def __init__(self, primary: Engine, replicas: list[Engine], retry_after: float = 30):
+        self.primary = primary
+        self.replicas = replicas
+        self.retry_after = retry_after
+        self._next = itertools.count()
+        self._unhealthy_until: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def candidates(self) -> list[Engine]:
+        if not self.replicas:
+            return []
+
+        now = time.monotonic()
+        with self._lock:
+            start = next(self._next)
+
+        ordered = [
+            self.replicas[(start + offset) % len(self.replicas)] for offset in range(len(self.replicas))
+        ]
+        return [engine for engine in ordered if self._unhealthy_until.get(id(engine), 0) <= now]
+
+    def mark_unhealthy(self, engine: Engine):
+        logger.warning(
+            'Read replica %s is unavailable, skipping it for %ss', engine.url, self.retry_after
+        )
+        self._unhealthy_until[id(engine)] = time.monotonic() + self.retry_after
+
+    def connect(self, use_primary: bool = False) -> Connection:
+        """
+        Opens a connection on a healthy replica, or on the primary as a fallback.
+        """
+        if not use_primary:
+            for engine in self.candidates():
+                try:
+                    return engine.connect()
+                except OperationalError:
+                    self.mark_unhealthy(engine)
+
+        return self.primary.connect()
+
+
+def last_write(connection: HTTPConnection) -> float | None:
+    value = connection.headers.get(LAST_WRITE_HEADER) or connection.cookies.get(LAST_WRITE_COOKIE)
+
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def reads_own_writes(connection: HTTPConnection, window: float) -> bool:
+    """
+    Tells whether the client wrote in the last `window` seconds, and so must read from the primary.
+
+    The stamp comes from the client: one further in the future than MAX_CLOCK_SKEW is
+    ignored, so a forged value can't pin the reads of a client to the primary.
+    """
+    written_at = last_write(connection)
+    return written_at is not None and -MAX_CLOCK_SKEW <= time.time() - written_at < window
+
+
+class ReadYourWritesMiddleware:
+    """
+    Stamps every successful write with the commit time, as a cookie and a header.
+
+    Reads carrying a recent stamp are served by the primary, so a client that
+    just changed something never reads a stale replica.
+    """
+
+    def __init__(self, app: ASGIApp, window: float):
+        self.app = app
+        self.window = window
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or scope['method'] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message['type'] == 'http.response.start' and message['status'] < HTTPStatus.BAD_REQUEST:
+                stamp = f'{time.time():.3f}'
+                headers = MutableHeaders(scope=message)
+                headers.append(LAST_WRITE_HEADER, stamp)
+                headers.append(
+                    'Set-Cookie',
+                    f'{LAST_WRITE_COOKIE}={stamp}; Max-Age={int(self.window)}; Path=/; SameSite=Lax',
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import math
+import threading
+from datetime import timedelta
+from functools import cache
+
+from sqlalchemy import ColumnElement, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.database import get_engine
+from app.logging_config import logger
+from app.models import RefreshToken, RevokedToken
+from app.settings import get_settings
+
+REVOCATION_CHANNEL = 'token_revoked'
+
+
+class BloomFilter:
+    """
+    Set membership in a fixed-size bit array, with false positives but no false negatives.
+
+    Sized for `capacity` items at the given `error_rate`; past that the false positive rate grows.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8]), int.from_bytes(digest[8:]) | 1
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item)
+        )
+
+
+class RevocationCache:
+    """
+    Per-process Bloom filter of the revoked token ids.
+
+    Tokens missing from the filter are valid without a query; only the hits, revoked ids and the
+    rare false positives, are confirmed against `revoked_tokens`. The filter is rebuilt from the
+    table by `refresh` and kept current between rebuilds by `add`, fed from LISTEN/NOTIFY.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._filter = BloomFilter(capacity, error_rate)
+        self._lock = threading.Lock()
+
+    def add(self, token_id: str):
+        with self._lock:
+            self._filter.add(token_id)
+
+    def refresh(self, session: Session) -> int:
+        """
+        Rebuilds the filter from the revocations that have not expired yet, dropping the expired ones.
+
+        Returns:
+            int: The number of revoked ids in the new filter.
+        """
+        token_ids = session.scalars(
+            select(RevokedToken.token_id).where(RevokedToken.expires_at > func.now())
+        ).all()
+
+        bloom = BloomFilter(max(self.capacity, 2 * len(token_ids)), self.error_rate)
+        for token_id in token_ids:
+            bloom.add(token_id)
+
+        with self._lock:
+            self._filter = bloom
+
+        return len(token_ids)
+
+    def is_revoked(self, session: Session, *token_ids: str | None) -> bool:
+        candidates = [token_id for token_id in token_ids if token_id and token_id in self._filter]
+        if not candidates:
+            return False
+
+        return (
+            session.scalar(
+                select(func.count())
+                .select_from(RevokedToken)
+                .where(RevokedToken.token_id.in_(candidates), RevokedToken.expires_at > func.now())
+            )
+            > 0
+        )
+
+
+@cache
+def get_revocations() -> RevocationCache:
+    settings = get_settings()
+    return RevocationCache(settings.REVOCATION_FILTER_CAPACITY, settings.REVOCATION_FILTER_ERROR_RATE)
+
+
+def revoke(session: Session, token_ids: list[str]):
+    """
+    Revokes the given token or session ids, in the caller's transaction.
+
+    The revocation only has to outlive the access tokens already issued, which keeps the set small.
+    Other processes are told through NOTIFY, which Postgres delivers when the transaction commits.
+    """
+    if not token_ids:
+        return
+
+    expires_at = func.now() + timedelta(minutes=get_settings().ACCESS_TOKEN_EXPIRE_MINUTES)
+    session.execute(
+        insert(RevokedToken)
+        .values([{'token_id': token_id, 'expires_at': expires_at} for token_id in token_ids])
+        .on_conflict_do_nothing()
+    )
+    for token_id in token_ids:
+        session.execute(select(func.pg_notify(REVOCATION_CHANNEL, token_id)))
+        get_revocations().add(token_id)
+
+
+def revoke_sessions(session: Session, *where: ColumnElement[bool]) -> list[str]:
+    """
+    Revokes the refresh tokens matching `where` and the access tokens of their sessions.
+
+    Returns:
+        list[str]: The revoked session ids.
+    """
+    session_ids = session.scalars(
+        update(RefreshToken)
+        .where(RefreshToken.revoked_at.is_(None), *where)
+        .values(revoked_at=func.now())
+        .returning(RefreshToken.session_id),
+        execution_options={'synchronize_session': False},
+    ).all()
+
+    session_ids = sorted(set(session_ids))
+    revoke(session, session_ids)
+
+    return session_ids
+
+
+def refresh_revocations():
+    with Session(get_engine()) as session:
+        count = get_revocations().refresh(session)
+
+    logger.info('Revocation filter rebuilt with %d revoked ids', count)
+
+
+async def listen_for_revocations(retry_interval: float = 5):
+    """
+    Adds the ids published on the revocation channel to the filter, until cancelled.
+
+    The filter is rebuilt every time the listener (re)connects, so no revocation is missed while
+    it was disconnected.
+    """
+    import psycopg  # noqa: PLC0415
+
+    url = get_engine().url.set(drivername='postgresql')
+    conninfo = url.render_as_string(hide_password=False)
+
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as connection:
+                await connection.execute(f'LISTEN {REVOCATION_CHANNEL}')
+                await run_in_threadpool(refresh_revocations)
+                logger.info('Listening for token revocations')
+
+                async for notify in connection.notifies():
+                    get_revocations().add(notify.payload)
+        except Exception as error:
+            logger.warning('Token revocation listener disconnected: %s', error)
+            await asyncio.sleep(retry_interval)
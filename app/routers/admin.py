@@ -0,0 +1,33 @@
+from http import HTTPStatus
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.schemas import SlowQueryList
+from app.security import require_admin_token
+from app.slowlog import SlowQueryLog, get_slow_query_log
+
+router = APIRouter(prefix='/admin', tags=['Admin'], dependencies=[Depends(require_admin_token)])
+
+SlowLog = Annotated[SlowQueryLog | None, Depends(get_slow_query_log)]
+
+
+@router.get('/slow-queries', response_model=SlowQueryList)
+def list_slow_queries(slow_query_log: SlowLog):
+    """
+    Lists the last statements slower than SLOW_QUERY_THRESHOLD_MS, the most recent first.
+
+    Each one comes with the route that ran it, its redacted bind parameters and, for sampled
+    SELECTs, the `EXPLAIN (ANALYZE, BUFFERS)` output once it has been captured. The request must
+    carry the `X-Admin-Token` header.
+
+    Raises:
+        HTTPException: If the admin token is invalid or the slow query log is disabled.
+
+    Returns:
+        SlowQueryList: The slow queries kept in the ring buffer.
+    """
+    if slow_query_log is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Slow query log is disabled')
+
+    return {'queries': slow_query_log.queries()}
@@ -3,42 +3,52 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy import select
+from jwt import decode
+from jwt.exceptions import PyJWTError
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from app.database import get_session
 from app.logging_config import logger
-from app.models import User
-from app.schemas import Token
+from app.models import RefreshToken, User
+from app.queries import USER_BY_ID, USER_BY_USERNAME
+from app.revocation import revoke, revoke_sessions
+from app.schemas import Message, RefreshTokenSchema, Token
 from app.security import (
-    create_access_token,
+    ensure_cpf_not_rejected,
+    get_current_user,
+    issue_tokens,
+    oauth2_scheme,
     verify_password,
 )
+from app.settings import get_settings
 
 router = APIRouter(prefix='/auth', tags=['Auth'])
 
 T_Session = Annotated[Session, Depends(get_session)]
 T_OAuth2Form = Annotated[OAuth2PasswordRequestForm, Depends()]
+T_CurrentUser = Annotated[User, Depends(get_current_user)]
+T_Token = Annotated[str, Depends(oauth2_scheme)]
 
 
 @router.post('/token', response_model=Token)
 def login_for_access_token(session: T_Session, form_data: T_OAuth2Form):
     """
-    Authenticates a user and issues an access token.
+    Authenticates a user and issues an access token and a refresh token.
 
     Args:
         form_data (T_OAuth2Form): The form data containing the user's
         username and password.
 
     Raises:
-        HTTPException: If the username or password is incorrect.
+        HTTPException: If the username or password is incorrect, or the CPF of the user was rejected.
 
     Returns:
-        Token: A dictionary containing the access token and its type.
+        Token: A dictionary containing the access token, the refresh token and the token type.
     """
     logger.info('Attempting to authenticate user with username: %s', form_data.username)
 
-    user = session.scalar(select(User).where(User.username == form_data.username))
+    user = session.scalar(USER_BY_USERNAME, {'username': form_data.username})
 
     if not user or not verify_password(form_data.password, user.password):
         logger.warning('Authentication failed for username: %s', form_data.username)
@@ -47,7 +57,82 @@ def login_for_access_token(session: T_Session, form_data: T_OAuth2Form):
             detail='Incorrect username or password',
         )
 
-    access_token = create_access_token(data={'sub': user.email})
+    ensure_cpf_not_rejected(user)
+    tokens = issue_tokens(session, user)
+    session.commit()
     logger.info('Authentication successful for username: %s - Access token issued', form_data.username)
 
-    return {'access_token': access_token, 'token_type': 'Bearer'}
+    return tokens
+
+
+@router.post('/refresh', response_model=Token)
+def refresh_access_token(session: T_Session, body: RefreshTokenSchema):
+    """
+    Exchanges a refresh token for a new access token and a new refresh token.
+
+    Each refresh token can be used once. Presenting one that was already used means it
+    leaked, so the whole session is revoked.
+
+    Args:
+        body (RefreshTokenSchema): The refresh token issued at login or at the last refresh.
+
+    Raises:
+        HTTPException: If the refresh token is invalid, expired or revoked.
+
+    Returns:
+        Token: A dictionary containing the new tokens and the token type.
+    """
+    invalid_token_exception = HTTPException(
+        status_code=HTTPStatus.UNAUTHORIZED, detail='Invalid refresh token'
+    )
+
+    settings = get_settings()
+    try:
+        payload = decode(body.refresh_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except PyJWTError:
+        raise invalid_token_exception
+
+    stored = session.scalar(
+        select(RefreshToken).where(RefreshToken.jti == payload.get('jti')).with_for_update()
+    )
+    if payload.get('type') != 'refresh' or stored is None:
+        raise invalid_token_exception
+
+    if stored.revoked_at is not None:
+        logger.warning('Refresh token reused, revoking session %s', stored.session_id)
+        revoke_sessions(session, RefreshToken.session_id == stored.session_id)
+        session.commit()
+        raise invalid_token_exception
+
+    user = session.scalar(USER_BY_ID, {'user_id': stored.user_id})
+    if user is None:
+        raise invalid_token_exception
+
+    ensure_cpf_not_rejected(user)
+    stored.revoked_at = func.now()
+    tokens = issue_tokens(session, user, stored.session_id)
+    session.commit()
+    logger.info('Tokens refreshed for user ID: %d', user.id)
+
+    return tokens
+
+
+@router.post('/logout', response_model=Message)
+def logout(session: T_Session, current_user: T_CurrentUser, token: T_Token):
+    """
+    Revokes the session of the access token, together with its refresh token.
+
+    Returns:
+        Message: A message confirming the logout.
+    """
+    settings = get_settings()
+    payload = decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+    if session_id := payload.get('sid'):
+        revoke_sessions(session, RefreshToken.session_id == session_id)
+    elif jti := payload.get('jti'):
+        revoke(session, [jti])
+    session.commit()
+    logger.info('User ID %d logged out', current_user.id)
+
+    return {'message': 'Logged out'}
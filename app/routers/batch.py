@@ -0,0 +1,51 @@
+from dataclasses import asdict
+from http import HTTPStatus
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.batch import Batch, call, current_batch
+from app.database import get_session
+from app.logging_config import logger
+from app.models import User
+from app.schemas import BatchRequest, BatchResponse
+from app.security import get_current_user
+
+router = APIRouter(tags=['Batch'])
+
+T_Session = Annotated[Session, Depends(get_session)]
+T_CurrentUser = Annotated[User, Depends(get_current_user)]
+
+
+@router.post('/batch', response_model=BatchResponse)
+async def run_batch(batch: BatchRequest, request: Request, session: T_Session, user: T_CurrentUser):
+    """
+    Runs several API requests in one, e.g. the reads a page needs when it loads.
+
+    The token is checked once and every operation runs as the same user, on the same database
+    session, in the given order, so an operation sees what the previous ones wrote. Each one
+    goes through its route as usual (validation, rate limits, idempotency) and gets its own
+    status; a failed operation is rolled back and doesn't stop the following ones.
+
+    Args:
+        batch (BatchRequest): The operations, each with its method, path, JSON body and headers.
+
+    Returns:
+        BatchResponse: The status, headers and body of each operation, in the same order.
+    """
+    logger.info('Running a batch of %d operations for user ID: %d', len(batch.operations), user.id)
+
+    results = []
+    token = current_batch.set(Batch(session, user))
+    try:
+        for operation in batch.operations:
+            result = await call(request.app.router, request.scope, operation)
+            if result.status >= HTTPStatus.BAD_REQUEST:
+                await run_in_threadpool(session.rollback)
+            results.append(asdict(result))
+    finally:
+        current_batch.reset(token)
+
+    return {'results': results}
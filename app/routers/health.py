@@ -0,0 +1,51 @@
+from http import HTTPStatus
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.database import get_session
+from app.logging_config import logger
+from app.schemas import Message
+
+router = APIRouter(prefix='/health', tags=['Health'])
+
+T_Session = Annotated[Session, Depends(get_session)]
+
+
+@router.get('/live', response_model=Message)
+async def liveness():
+    """
+    Reports that the process is up and serving requests.
+
+    It is async on purpose, so it still answers when the threadpool is busy.
+
+    Returns:
+        Message: A message indicating the application is alive.
+    """
+    return {'message': 'alive'}
+
+
+@router.get('/ready', response_model=Message)
+def readiness(request: Request, session: T_Session):
+    """
+    Reports whether the application has finished warming up and can reach the database.
+
+    Raises:
+        HTTPException: If the warm-up is still running or the database is unavailable.
+
+    Returns:
+        Message: A message indicating the application is ready.
+    """
+    if not getattr(request.app.state, 'ready', False):
+        raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE, detail='Warming up')
+
+    try:
+        session.execute(text('SELECT 1'))
+    except SQLAlchemyError as error:
+        logger.warning('Readiness check failed: %s', error)
+        raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE, detail='Database unavailable')
+
+    return {'message': 'ready'}
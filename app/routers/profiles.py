@@ -0,0 +1,34 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from app.profiling import require_profile_signature
+
+router = APIRouter(
+    prefix='/profiles', tags=['Profiling'], dependencies=[Depends(require_profile_signature)]
+)
+
+
+@router.get('/{profile_id}', response_class=PlainTextResponse)
+def read_profile(request: Request, profile_id: str):
+    """
+    Returns the profile of a request in the collapsed stacks format.
+
+    The output can be opened in speedscope or rendered with flamegraph.pl. The request must carry
+    a valid signed `X-Profile` header.
+
+    Args:
+        profile_id (str): The id sent back in the `X-Profile-Id` header of the profiled request.
+
+    Raises:
+        HTTPException: If the signature is invalid or there is no profile with this id.
+
+    Returns:
+        str: One line per stack, with the frames separated by `;` and the sample count at the end.
+    """
+    profile = request.app.state.profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Profile not found')
+
+    return profile
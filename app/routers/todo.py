@@ -1,35 +1,65 @@
+from datetime import datetime
 from http import HTTPStatus
+from itertools import takewhile
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import Connection, select
 from sqlalchemy.orm import Session
 
-from app.database import get_session
+from app.batching import TodoBatcher, get_todo_batcher
+from app.database import get_read_connection, get_session
+from app.idempotency import IdempotentRoute, idempotency
 from app.logging_config import logger
-from app.models import Todo, User
+from app.models import Todo, TodoState, TodoTombstone, User
+from app.ordering import position_between, queue_rebalance, rebalance_positions
+from app.outbox import record_event, todo_payload
+from app.queries import (
+    LAST_POSITION,
+    NEXT_POSITION,
+    OLDEST_RUNNING_XACT,
+    PREVIOUS_POSITION,
+    TODO_BY_ID,
+    TRASH_TODO,
+    TagMatch,
+    list_todos_query,
+    tag_facets_query,
+)
 from app.schemas import (
     Message,
+    TagFacets,
+    TodoChanges,
     TodoList,
+    TodoMove,
     TodoPublic,
     TodoSchema,
     TodoUpdate,
+    parse_fields,
+    parse_tags,
+    projection_model,
 )
 from app.security import get_current_user
+from app.settings import get_settings
 
-router = APIRouter(prefix='/todos', tags=['To-dos'])
+router = APIRouter(prefix='/todos', tags=['To-dos'], route_class=IdempotentRoute)
 
+ReadConnection = Annotated[Connection, Depends(get_read_connection)]
 Session = Annotated[Session, Depends(get_session)]
 CurrentUser = Annotated[User, Depends(get_current_user)]
+Idempotent = Depends(idempotency)
+Batcher = Annotated[TodoBatcher | None, Depends(get_todo_batcher)]
 
 
-@router.post('/', response_model=TodoPublic)
-def create_todo(todo: TodoSchema, user: CurrentUser, session: Session):
+@router.post('/', response_model=TodoPublic, dependencies=[Idempotent])
+def create_todo(todo: TodoSchema, user: CurrentUser, session: Session, batcher: Batcher):
     """
     Creates a new todo item in the database.
 
     Allowed values to state: [draft, todo, doing, done, trash]
 
+    The new todo is placed at the end of the user's list. When TODO_BATCH_WINDOW_SECONDS is set,
+    concurrent creations are inserted and committed together by the batcher.
+
     Args:
         todo (TodoSchema): The schema containing the details of the todo item to be created.
 
@@ -38,14 +68,26 @@ def create_todo(todo: TodoSchema, user: CurrentUser, session: Session):
     """
     logger.info('Creating todo item for user ID: %d', user.id)
 
+    if batcher:
+        db_todo = batcher.create({**todo.model_dump(), 'user_id': user.id})
+        logger.info('Todo item created with ID: %d', db_todo.id)
+        return db_todo
+
+    last_position = session.scalar(LAST_POSITION, {'user_id': user.id})
+
     db_todo = Todo(
         title=todo.title,
         description=todo.description,
         state=todo.state,
         user_id=user.id,
+        position=position_between(last_position, None),
+        tags=todo.tags,
+        due_at=todo.due_at,
     )
 
     session.add(db_todo)
+    session.flush()
+    record_event(session, 'todo.created', db_todo.id, todo_payload(db_todo))
     session.commit()
     session.refresh(db_todo)
 
@@ -56,16 +98,28 @@ def create_todo(todo: TodoSchema, user: CurrentUser, session: Session):
 
 @router.get('/', response_model=TodoList)
 def list_todos(  # noqa
-    session: Session,
+    connection: ReadConnection,
     user: CurrentUser,
     title: str | None = None,
     description: str | None = None,
     state: str | None = None,
     offset: int | None = None,
     limit: int | None = None,
+    fields: str | None = None,
+    include_archived: bool = False,
+    tags: str | None = None,
+    tags_match: TagMatch = 'any',
+    due_before: datetime | None = None,
 ):
     """
-    Lists todos for the authenticated user with optional filtering.
+    Lists todos for the authenticated user with optional filtering, in their manual order.
+
+    When `fields` is given only those columns are selected and returned,
+    e.g. `fields=id,title,state` skips loading and sending the description.
+    Archived todos are only read, from their own table, with `include_archived`.
+    Trashed todos are only listed with `state=trash`.
+    `tags=work,home` keeps the todos having any of these tags, or all of them with
+    `tags_match=all`; both are looked up in the GIN index on `tags`.
 
     Args:
         title (str, optional): A substring to filter todos by title.
@@ -73,41 +127,191 @@ def list_todos(  # noqa
         state (str, optional): The state to filter todos.
         offset (int, optional): The number of items to skip before starting to collect the result set.
         limit (int, optional): The maximum number of items to return.
+        fields (str, optional): Comma separated list of the fields to return.
+        include_archived (bool, optional): Whether to also list the archived todos.
+        tags (str, optional): Comma separated list of tags to filter todos by.
+        tags_match (str, optional): Whether todos need `any` (the default) or `all` of the tags.
+        due_before (datetime, optional): Only the todos due before this date.
 
     Returns:
         TodoList: A dictionary containing the list of todos for the user.
     """
     logger.info(
-        'Listing todos for user ID: %d with filters: title=%s, description=%s, state=%s',
+        'Listing todos for user ID: %d with filters: title=%s, description=%s, state=%s, tags=%s, '
+        'due_before=%s',
         user.id,
         title,
         description,
         state,
+        tags,
+        due_before,
     )
 
-    query = select(Todo).where(Todo.user_id == user.id)
+    columns = parse_fields(fields, TodoPublic) if fields else None
+    tag_list = parse_tags(tags) if tags else []
+
+    query = list_todos_query(
+        bool(title),
+        bool(description),
+        bool(state),
+        columns,
+        include_archived,
+        tags_match if tag_list else None,
+        bool(due_before),
+    )
+    params = {
+        'user_id': user.id,
+        'title': title,
+        'description': description,
+        'state': state,
+        'tags': tag_list,
+        'due_before': due_before,
+        'offset': offset,
+        'limit': limit,
+    }
+
+    if columns:
+        rows = connection.execute(query, params).all()
+        logger.info('Found %d todos for user ID: %d', len(rows), user.id)
+
+        model = projection_model(TodoPublic, columns, 'todos')
+        body = model(todos=[row._asdict() for row in rows])
+        return Response(body.model_dump_json(), media_type='application/json')
+
+    # Plain dicts: pydantic validates them faster than rows, which it probes for missing attributes.
+    todos = [row._asdict() for row in connection.execute(query, params)]
 
-    if title:
-        query = query.filter(Todo.title.contains(title))
+    logger.info('Found %d todos for user ID: %d', len(todos), user.id)
 
-    if description:
-        query = query.filter(Todo.description.contains(description))
+    return {'todos': todos}
 
-    if state:
-        query = query.filter(Todo.state == state)
 
-    todos = session.scalars(query.offset(offset).limit(limit)).all()
+@router.get('/tags', response_model=TagFacets)
+def list_tag_facets(  # noqa: PLR0913, PLR0917
+    connection: ReadConnection,
+    user: CurrentUser,
+    title: str | None = None,
+    description: str | None = None,
+    state: str | None = None,
+    tags: str | None = None,
+    tags_match: TagMatch = 'any',
+    due_before: datetime | None = None,
+):
+    """
+    Counts the authenticated user's todos of each tag, most used tags first.
 
-    logger.info('Found %d todos for user ID: %d', len(todos), user.id)
+    Takes the filters of `list_todos`, so the counts describe the todos it would list.
+    All tags are counted by a single aggregate query.
 
-    return {'todos': todos}
+    Args:
+        title (str, optional): A substring to filter todos by title.
+        description (str,optional): A substring to filter todos by description.
+        state (str, optional): The state to filter todos.
+        tags (str, optional): Comma separated list of tags to filter todos by.
+        tags_match (str, optional): Whether todos need `any` (the default) or `all` of the tags.
+        due_before (datetime, optional): Only the todos due before this date.
 
+    Returns:
+        TagFacets: The tags with their number of todos.
+    """
+    logger.info('Counting todo tags for user ID: %d', user.id)
+
+    tag_list = parse_tags(tags) if tags else []
+    match = tags_match if tag_list else None
+    query = tag_facets_query(bool(title), bool(description), bool(state), match, bool(due_before))
+    params = {
+        'user_id': user.id,
+        'title': title,
+        'description': description,
+        'state': state,
+        'tags': tag_list,
+        'due_before': due_before,
+    }
+
+    return {'tags': [row._asdict() for row in connection.execute(query, params)]}
+
+
+@router.get('/changes', response_model=TodoChanges)
+def list_todo_changes(
+    connection: ReadConnection,
+    user: CurrentUser,
+    since: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+):
+    """
+    Lists the todos changed and deleted after the `since` version, oldest change first.
+    Trashed todos are reported as deleted.
+
+    Both lookups are range scans on `(user_id, version)` indexes, so a sync costs
+    as much as the number of changes, not the size of the list.
 
-@router.delete('/{todo_id}', response_model=Message)
+    Versions are taken when a todo is written but become visible when its transaction
+    commits, so a lower version can show up after a higher one. The page therefore ends
+    before the first change written by a transaction at least as recent as the oldest one
+    still running: a change is only returned, and the cursor only moves past it, once the
+    transactions that may hold lower versions have finished. Changes of a running
+    transaction are returned by a later sync instead of being skipped. This relies on
+    transactions taking their versions when they start writing, as the routes and jobs do.
+
+    Args:
+        since (int, optional): The `version` returned by the previous sync, 0 for a full sync.
+        limit (int, optional): The maximum number of changes to return, from 1 to 1000.
+
+    Returns:
+        TodoChanges: The changed todos, the deleted todo ids, the version to use as the
+        next cursor and whether there are more changes to fetch.
+    """
+    logger.info('Listing todo changes for user ID: %d since version %d', user.id, since)
+
+    # Read first: the transactions older than it have committed before the lookups below.
+    oldest_running = connection.scalar(OLDEST_RUNNING_XACT)
+    todos = connection.execute(
+        select(Todo)
+        .where(Todo.user_id == user.id, Todo.version > since)
+        .order_by(Todo.version)
+        .limit(limit + 1)
+    ).all()
+    tombstones = connection.execute(
+        select(TodoTombstone.todo_id, TodoTombstone.version, TodoTombstone.xact_id)
+        .where(TodoTombstone.user_id == user.id, TodoTombstone.version > since)
+        .order_by(TodoTombstone.version)
+        .limit(limit + 1)
+    ).all()
+
+    # Trashing a todo is a deletion for clients, its purge later adds a tombstone for it too.
+    changes = sorted(
+        [
+            (todo.version, todo.xact_id, None, todo.id)
+            if todo.state == TodoState.trash
+            else (todo.version, todo.xact_id, todo, None)
+            for todo in todos
+        ]
+        + [(tombstone.version, tombstone.xact_id, None, tombstone.todo_id) for tombstone in tombstones],
+        key=lambda change: change[0],
+    )
+    # Rows written before `xact_id` was recorded are long settled.
+    settled = list(takewhile(lambda change: change[1] is None or change[1] < oldest_running, changes))
+    page = settled[:limit]
+
+    logger.info('Found %d todo changes for user ID: %d', len(page), user.id)
+
+    return {
+        'todos': [todo._asdict() for _, _, todo, _ in page if todo],
+        'deleted': [todo_id for _, _, _, todo_id in page if todo_id],
+        'version': page[-1][0] if page else since,
+        'has_more': len(settled) > limit,
+    }
+
+
+@router.delete('/{todo_id}', response_model=Message, dependencies=[Idempotent])
 def delete_todo(todo_id: int, session: Session, user: CurrentUser):
     """
     Deletes a specified todo item for the authenticated user.
 
+    The todo is moved to the trash with a single UPDATE; trashed todos are purged
+    in batches by a background job once the trash retention period is over. A trashed
+    todo is not found anymore, so its retention cannot be extended by changing it.
+
     Args:
         todo_id (int): The unique identifier of the todo item to delete.
 
@@ -119,13 +323,13 @@ def delete_todo(todo_id: int, session: Session, user: CurrentUser):
     """
     logger.info('Deleting todo item with ID: %d for user ID: %d', todo_id, user.id)
 
-    todo = session.scalar(select(Todo).where(Todo.user_id == user.id, Todo.id == todo_id))
+    result = session.execute(TRASH_TODO, {'b_user_id': user.id, 'b_todo_id': todo_id})
 
-    if not todo:
+    if not result.rowcount:
         logger.warning('Todo item with ID: %d not found for user ID: %d', todo_id, user.id)
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Task not found.')
 
-    session.delete(todo)
+    record_event(session, 'todo.deleted', todo_id, {'id': todo_id, 'user_id': user.id})
     session.commit()
 
     logger.info('Todo item with ID: %d deleted for user ID: %d', todo_id, user.id)
@@ -133,7 +337,7 @@ def delete_todo(todo_id: int, session: Session, user: CurrentUser):
     return {'message': 'Task has been deleted successfully.'}
 
 
-@router.patch('/{todo_id}', response_model=TodoPublic)
+@router.patch('/{todo_id}', response_model=TodoPublic, dependencies=[Idempotent])
 def patch_todo(todo_id: int, session: Session, user: CurrentUser, todo: TodoUpdate):
     """
     Updates a specified todo item for the authenticated user.
@@ -149,7 +353,7 @@ def patch_todo(todo_id: int, session: Session, user: CurrentUser, todo: TodoUpda
     """
     logger.info('Updating todo item with ID: %d for user ID: %d', todo_id, user.id)
 
-    db_todo = session.scalar(select(Todo).where(Todo.user_id == user.id, Todo.id == todo_id))
+    db_todo = session.scalar(TODO_BY_ID, {'user_id': user.id, 'todo_id': todo_id})
 
     if not db_todo:
         logger.warning('Todo item with ID: %d not found for user ID: %d', todo_id, user.id)
@@ -158,10 +362,95 @@ def patch_todo(todo_id: int, session: Session, user: CurrentUser, todo: TodoUpda
     for key, value in todo.model_dump(exclude_unset=True).items():
         setattr(db_todo, key, value)
 
+    if 'due_at' in todo.model_fields_set:
+        # A new due date gets its own reminder.
+        db_todo.reminded_at = None
+
     session.add(db_todo)
+    record_event(
+        session,
+        'todo.updated',
+        todo_id,
+        {'id': todo_id, 'user_id': user.id, 'changes': todo.model_dump(mode='json', exclude_unset=True)},
+    )
     session.commit()
     session.refresh(db_todo)
 
     logger.info('Todo item with ID: %d updated for user ID: %d', todo_id, user.id)
 
     return db_todo
+
+
+@router.patch('/{todo_id}/move', response_model=TodoPublic, dependencies=[Idempotent])
+def move_todo(todo_id: int, session: Session, user: CurrentUser, move: TodoMove):
+    """
+    Moves a todo item between two others in the authenticated user's list.
+
+    Only the moved todo is updated: it gets a position between the ones of its new neighbors.
+    Given only one neighbor, the other one is the todo currently next to it.
+
+    Args:
+        todo_id (int): The unique identifier of the todo item to move.
+        move (TodoMove): The todos that should come right before and right after it.
+
+    Raises:
+        HTTPException: If a todo does not exist, or the neighbors are not in order.
+
+    Returns:
+        TodoPublic: The moved todo item with its new position.
+    """
+    logger.info('Moving todo item with ID: %d for user ID: %d', todo_id, user.id)
+
+    if todo_id in {move.before_id, move.after_id}:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail='A todo cannot be its own neighbor.'
+        )
+
+    db_todo, before, after = (
+        session.scalar(TODO_BY_ID, {'user_id': user.id, 'todo_id': id_}) if id_ is not None else None
+        for id_ in (todo_id, move.before_id, move.after_id)
+    )
+    if not db_todo or (move.before_id and not before) or (move.after_id and not after):
+        logger.warning('Todo items to move not found for user ID: %d', user.id)
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Task not found.')
+
+    if before and after and before.position == after.position:
+        # Concurrent moves can give two todos the same position, spread them apart first.
+        rebalance_positions(session, user.id)
+        session.expire_all()
+
+    if before:
+        before_position = before.position
+    else:
+        before_position = session.scalar(
+            PREVIOUS_POSITION, {'user_id': user.id, 'todo_id': todo_id, 'position': after.position}
+        )
+
+    if after:
+        after_position = after.position
+    else:
+        after_position = session.scalar(
+            NEXT_POSITION, {'user_id': user.id, 'todo_id': todo_id, 'position': before.position}
+        )
+
+    try:
+        db_todo.position = position_between(before_position, after_position)
+    except ValueError:
+        logger.warning('Todo item %d must come before todo item %d', move.before_id, move.after_id)
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail='The todo before must come before the todo after.'
+        )
+
+    # Moves make positions longer; past the limit, the rebalance job spreads them out again.
+    if len(db_todo.position) > get_settings().POSITION_MAX_LENGTH:
+        queue_rebalance(session, user.id)
+
+    record_event(
+        session, 'todo.moved', todo_id, {'id': todo_id, 'user_id': user.id, 'position': db_todo.position}
+    )
+    session.commit()
+    session.refresh(db_todo)
+
+    logger.info('Todo item with ID: %d moved for user ID: %d', todo_id, user.id)
+
+    return db_todo
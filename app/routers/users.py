@@ -1,23 +1,39 @@
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import Connection, func, select
 from sqlalchemy.orm import Session
 
-from app.database import get_session
+from app.cpf import ChecksumCpfValidator, get_cpf_validator
+from app.database import get_read_connection, get_session
+from app.idempotency import IdempotentRoute, idempotency
 from app.logging_config import logger
-from app.models import User
-from app.schemas import Message, UserList, UserPublic, UserSchema, UserUpdate
-from app.security import get_current_user, get_password_hash, validate_cpf
-
-router = APIRouter(prefix='/users', tags=['Users'])
+from app.models import CpfStatus, CpfVerificationJob, RefreshToken, User
+from app.outbox import record_event, user_payload
+from app.queries import USER_BY_ID
+from app.revocation import revoke_sessions
+from app.schemas import (
+    Message,
+    UserList,
+    UserPublic,
+    UserSchema,
+    UserUpdate,
+    parse_fields,
+    projection_model,
+)
+from app.security import get_current_user, get_password_hash
+from app.settings import get_settings
+
+router = APIRouter(prefix='/users', tags=['Users'], route_class=IdempotentRoute)
 
 T_Session = Annotated[Session, Depends(get_session)]
+T_ReadConnection = Annotated[Connection, Depends(get_read_connection)]
 T_CurrentUser = Annotated[User, Depends(get_current_user)]
+T_Idempotent = Depends(idempotency)
 
 
-@router.post('/', status_code=HTTPStatus.CREATED, response_model=UserPublic)
+@router.post('/', status_code=HTTPStatus.CREATED, response_model=UserPublic, dependencies=[T_Idempotent])
 def create_user(user: UserSchema, session: T_Session):
     logger.info('Attempting to create a new user with username: %s', user.username)
 
@@ -38,8 +54,11 @@ def create_user(user: UserSchema, session: T_Session):
                 status_code=HTTPStatus.BAD_REQUEST,
                 detail='Email already exists',
             )
-    is_valid_cpf = validate_cpf(user.cpf)
-    if not is_valid_cpf:
+
+    # Deferred, the remote check runs in the background: only the check digits are checked here.
+    deferred = get_settings().CPF_VERIFICATION_DEFERRED
+    validator = ChecksumCpfValidator() if deferred else get_cpf_validator()
+    if not validator.validate(user.cpf):
         logger.warning('Invalid CPF: %s', user.cpf)
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST,
@@ -47,10 +66,18 @@ def create_user(user: UserSchema, session: T_Session):
         )
 
     db_user = User(
-        username=user.username, email=user.email, password=get_password_hash(user.password), cpf=user.cpf
+        username=user.username,
+        email=user.email,
+        password=get_password_hash(user.password),
+        cpf=user.cpf,
+        cpf_status=CpfStatus.pending if deferred else CpfStatus.verified,
     )
 
     session.add(db_user)
+    session.flush()
+    if deferred:
+        session.add(CpfVerificationJob(user_id=db_user.id))
+    record_event(session, 'user.created', db_user.id, user_payload(db_user))
     session.commit()
     session.refresh(db_user)
 
@@ -59,10 +86,10 @@ def create_user(user: UserSchema, session: T_Session):
 
 
 @router.get('/{user_id}', response_model=UserPublic)
-def read_user(user_id: int, session: T_Session):
+def read_user(user_id: int, connection: T_ReadConnection):
     logger.info('Attempting to retrieve user with ID: %d', user_id)
 
-    if db_user := session.scalar(select(User).where(User.id == user_id)):
+    if db_user := connection.execute(USER_BY_ID, {'user_id': user_id}).first():
         logger.info('User found with ID: %d', user_id)
         return db_user
     else:
@@ -71,14 +98,24 @@ def read_user(user_id: int, session: T_Session):
 
 
 @router.get('/', response_model=UserList)
-def read_users(session: T_Session, skip: int = 0, limit: int = 100):
+def read_users(connection: T_ReadConnection, skip: int = 0, limit: int = 100, fields: str | None = None):
     logger.info('Retrieving users with skip=%d and limit=%d', skip, limit)
 
-    users = session.scalars(select(User).offset(skip).limit(limit)).all()
+    columns = parse_fields(fields, UserPublic) if fields else None
+
+    query = select(*(getattr(User, name) for name in columns)) if columns else select(User)
+    query = query.where(User.deleted_at.is_(None)).offset(skip).limit(limit)
+
+    if columns:
+        model = projection_model(UserPublic, columns, 'users')
+        body = model(users=[row._asdict() for row in connection.execute(query)])
+        return Response(body.model_dump_json(), media_type='application/json')
+
+    users = [row._asdict() for row in connection.execute(query)]
     return {'users': users}
 
 
-@router.put('/{user_id}', response_model=UserPublic)
+@router.put('/{user_id}', response_model=UserPublic, dependencies=[T_Idempotent])
 def update_user(
     user_id: int,
     user: UserUpdate,
@@ -106,6 +143,8 @@ def update_user(
     current_user.username = user.username
     current_user.password = get_password_hash(user.password)
     current_user.email = user.email
+    revoke_sessions(session, RefreshToken.user_id == current_user.id)
+    record_event(session, 'user.updated', current_user.id, user_payload(current_user))
     session.commit()
     session.refresh(current_user)
 
@@ -113,7 +152,7 @@ def update_user(
     return current_user
 
 
-@router.delete('/{user_id}', response_model=Message)
+@router.delete('/{user_id}', response_model=Message, dependencies=[T_Idempotent])
 def delete_user(
     user_id: int,
     session: T_Session,
@@ -125,7 +164,9 @@ def delete_user(
         logger.warning('Forbidden delete attempt by user ID: %d', current_user.id)
         raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail='Not enough permissions')
 
-    session.delete(current_user)
+    current_user.deleted_at = func.now()
+    revoke_sessions(session, RefreshToken.user_id == current_user.id)
+    record_event(session, 'user.deleted', current_user.id, {'id': current_user.id})
     session.commit()
 
     logger.info('User deleted with ID: %d', user_id)
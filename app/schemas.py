@@ -1,15 +1,27 @@
 import re
 from datetime import datetime
+from functools import cache
 from http import HTTPStatus
-from typing import Annotated, Optional
+from typing import Annotated, Any, Literal, Optional
 
 from fastapi import HTTPException
-from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    EmailStr,
+    Field,
+    StringConstraints,
+    create_model,
+    field_validator,
+    model_validator,
+)
 
 from app.logging_config import logger
-from app.models import TodoState
+from app.models import CpfStatus, TodoState
 
 MIN_LEN_PASSWORD = 8
+MAX_BATCH_OPERATIONS = 20
+MAX_TAGS = 10
 
 
 class Message(BaseModel):
@@ -62,6 +74,7 @@ class UserPublic(BaseModel):
     id: int
     username: str
     email: EmailStr
+    cpf_status: CpfStatus
     model_config = ConfigDict(from_attributes=True)
     created_at: datetime
     updated_at: datetime
@@ -73,9 +86,27 @@ class UserList(BaseModel):
 
 class Token(BaseModel):
     access_token: str
+    refresh_token: str
     token_type: str
 
 
+class RefreshTokenSchema(BaseModel):
+    refresh_token: str
+
+
+# Commas separate the tags of the `tags` query parameter, so a tag can't hold one.
+Tag = Annotated[
+    str,
+    StringConstraints(
+        strip_whitespace=True, to_lower=True, min_length=1, max_length=30, pattern=r'^[^,]+$'
+    ),
+]
+
+
+def unique_tags(tags: list[str] | None) -> list[str] | None:
+    return list(dict.fromkeys(tags)) if tags is not None else None
+
+
 class TodoSchema(BaseModel):
     title: Annotated[str, Field(description='Title', example='Finish report', max_length=50)]
     description: Annotated[
@@ -87,10 +118,17 @@ class TodoSchema(BaseModel):
         ),
     ]
     state: Annotated[TodoState, Field(description='State', example='draft', max_length=10)]
+    tags: Annotated[list[Tag], Field(description='Tags', example=['work'], max_length=MAX_TAGS)] = []
+    due_at: Annotated[datetime | None, Field(description='Due date', example='2026-10-23T18:00:00')] = (
+        None
+    )
+
+    _unique_tags = field_validator('tags')(unique_tags)
 
 
 class TodoPublic(TodoSchema):
     id: int
+    position: str
     created_at: datetime
     updated_at: datetime
 
@@ -99,7 +137,132 @@ class TodoList(BaseModel):
     todos: list[TodoPublic]
 
 
+class TodoChanges(BaseModel):
+    todos: list[TodoPublic]
+    deleted: list[int]
+    version: int
+    has_more: bool
+
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
+
+class TagFacets(BaseModel):
+    tags: list[TagCount]
+
+
+class SlowQueryPublic(BaseModel):
+    statement: str
+    parameters: dict | list | None
+    duration_ms: float
+    route: str | None
+    recorded_at: datetime
+    plan: str | None
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SlowQueryList(BaseModel):
+    queries: list[SlowQueryPublic]
+
+
 class TodoUpdate(BaseModel):
     title: str | None = None
     description: str | None = None
     state: TodoState | None = None
+    tags: Annotated[list[Tag] | None, Field(max_length=MAX_TAGS)] = None
+    due_at: datetime | None = None
+
+    _unique_tags = field_validator('tags')(unique_tags)
+
+
+class TodoMove(BaseModel):
+    before_id: Annotated[
+        int | None, Field(description='The todo that should come right before the moved one')
+    ] = None
+    after_id: Annotated[
+        int | None, Field(description='The todo that should come right after the moved one')
+    ] = None
+
+    @model_validator(mode='after')
+    def check_neighbors(self):
+        if self.before_id is None and self.after_id is None:
+            raise ValueError('Either before_id or after_id is required')
+        return self
+
+
+class BatchOperation(BaseModel):
+    method: Literal['GET', 'POST', 'PUT', 'PATCH', 'DELETE']
+    path: Annotated[str, Field(description='Path and query string', example='/todos/?state=todo')]
+    body: Annotated[Any, Field(description='JSON body of the request')] = None
+    headers: Annotated[
+        dict[str, str],
+        Field(
+            description='Extra headers, e.g. Idempotency-Key. Operations skip the compression '
+            'middleware, so they get no ETag and conditional headers like If-None-Match are ignored'
+        ),
+    ] = {}
+
+    @field_validator('path')
+    @classmethod
+    def check_path(cls, value: str):
+        if not value.startswith('/'):
+            raise ValueError('The path must start with /')
+        if value.partition('?')[0].rstrip('/') == '/batch':
+            raise ValueError('Batches cannot be nested')
+        return value
+
+
+class BatchRequest(BaseModel):
+    operations: Annotated[list[BatchOperation], Field(min_length=1, max_length=MAX_BATCH_OPERATIONS)]
+
+
+class BatchResult(BaseModel):
+    status: int
+    headers: dict[str, str]
+    body: Any
+
+
+class BatchResponse(BaseModel):
+    results: list[BatchResult]
+
+
+def parse_fields(fields: str, model: type[BaseModel]) -> tuple[str, ...]:
+    """
+    Parses a `fields=id,title` query parameter against the fields of `model`.
+
+    The result follows the model field order, so equivalent requests share a projection.
+
+    Raises:
+        HTTPException: If a requested field does not exist in the model.
+    """
+    requested = {name.strip() for name in fields.split(',') if name.strip()}
+
+    if unknown := requested - model.model_fields.keys():
+        logger.warning('Invalid fields requested: %s', unknown)
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=f'Invalid fields: {", ".join(sorted(unknown))}',
+        )
+
+    return tuple(name for name in model.model_fields if name in requested)
+
+
+def parse_tags(tags: str) -> list[str]:
+    """
+    Parses a `tags=work,home` query parameter the way tags are stored: trimmed and lowercase.
+    """
+    return list(dict.fromkeys(tag.strip().lower() for tag in tags.split(',') if tag.strip()))
+
+
+@cache
+def projection_model(model: type[BaseModel], fields: tuple[str, ...], key: str) -> type[BaseModel]:
+    """
+    Builds (once per field set) a list response model holding only `fields` of `model`.
+    """
+    item = create_model(
+        f'{model.__name__}Projection',
+        **{name: (model.model_fields[name].annotation, ...) for name in fields},
+    )
+    return create_model(f'{model.__name__}ProjectionList', **{key: (list[item], ...)})
@@ -1,53 +1,128 @@
+import hmac
 from datetime import datetime, timedelta
+from functools import cache
 from http import HTTPStatus
+from uuid import uuid4
 
-import requests
-from fastapi import Depends, HTTPException
+from fastapi import Depends, Header, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jwt import decode, encode
 from jwt.exceptions import ExpiredSignatureError, PyJWTError
 from pwdlib import PasswordHash
-from sqlalchemy import select
 from sqlalchemy.orm import Session
 from zoneinfo import ZoneInfo
 
+from app.batch import current_batch
 from app.database import get_session
-from app.models import User
-from app.settings import Settings
+from app.models import CpfStatus, RefreshToken, User
+from app.queries import USER_BY_EMAIL
+from app.revocation import get_revocations
+from app.settings import get_settings
 
-pwd_context = PasswordHash.recommended()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
-settings = Settings()
+
+
+@cache
+def get_password_hasher() -> PasswordHash:
+    return PasswordHash.recommended()
 
 
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
+    return get_password_hasher().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_password_hasher().verify(plain_password, hashed_password)
+
+
+@cache
+def warm_up_password_hasher():
+    """
+    Runs a dummy argon2 hash and verify so the hasher is initialized before the first login.
+
+    It only has to run once per process, so the result is cached.
+    """
+    verify_password('warm-up', get_password_hash('warm-up'))
 
 
 def create_access_token(data: dict):
+    settings = get_settings()
     to_encode = data.copy()
 
     expire = datetime.now(tz=ZoneInfo('UTC')) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    to_encode['exp'] = expire
+    to_encode.update(exp=expire, jti=uuid4().hex, type='access')
 
     return encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
 
+def issue_tokens(session: Session, user: User, session_id: str | None = None) -> dict:
+    """
+    Issues an access token and a stored refresh token for a login session.
+
+    A rotated refresh token keeps the `session_id` of the login, and the access tokens carry it
+    as `sid`, so a whole session is revoked with a single id.
+    """
+    settings = get_settings()
+    jti = uuid4().hex
+    session_id = session_id or jti
+    expire = datetime.now(tz=ZoneInfo('UTC')) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+
+    session.add(RefreshToken(jti=jti, session_id=session_id, user_id=user.id, expires_at=expire))
+
+    refresh_token = encode(
+        {'sub': user.email, 'sid': session_id, 'jti': jti, 'type': 'refresh', 'exp': expire},
+        settings.SECRET_KEY,
+        algorithm=settings.ALGORITHM,
+    )
+    access_token = create_access_token(data={'sub': user.email, 'sid': session_id})
+
+    return {'access_token': access_token, 'refresh_token': refresh_token, 'token_type': 'Bearer'}
+
+
+def get_token_subject(authorization: str | None) -> str | None:
+    """
+    Returns the `sub` of a valid `Bearer` token without touching the database.
+    """
+    if not authorization or not authorization.startswith('Bearer '):
+        return None
+
+    settings = get_settings()
+    try:
+        payload = decode(authorization[7:], settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except PyJWTError:
+        return None
+
+    return payload.get('sub')
+
+
+def ensure_cpf_not_rejected(user: User):
+    """
+    Refuses the users whose CPF the deferred verification rejected, as a synchronous
+    verification would have refused their sign-up. Pending ones are let in meanwhile.
+
+    Raises:
+        HTTPException: 403 if the CPF of the user was rejected.
+    """
+    if user.cpf_status == CpfStatus.rejected:
+        raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail='Invalid CPF')
+
+
 def get_current_user(
     session: Session = Depends(get_session),
     token: str = Depends(oauth2_scheme),
 ):
+    # The operations of a batch run as the user the batch request was authenticated as.
+    if batch := current_batch.get():
+        return batch.user
+
     credentials_exception = HTTPException(
         status_code=HTTPStatus.UNAUTHORIZED,
         detail='Could not validate credentials',
         headers={'WWW-Authenticate': 'Bearer'},
     )
 
+    settings = get_settings()
     try:
         payload = decode(
             token,
@@ -55,7 +130,7 @@ def get_current_user(
             algorithms=[settings.ALGORITHM],
         )
         username: str = payload.get('sub')
-        if not username:
+        if not username or payload.get('type', 'access') != 'access':
             raise credentials_exception
 
     except ExpiredSignatureError:
@@ -64,20 +139,17 @@ def get_current_user(
     except PyJWTError:
         raise credentials_exception
 
-    if user := session.scalar(select(User).where(User.email == username)):
+    if get_revocations().is_revoked(session, payload.get('jti'), payload.get('sid')):
+        raise credentials_exception
+
+    if user := session.scalar(USER_BY_EMAIL, {'email': username}):
+        ensure_cpf_not_rejected(user)
         return user
     else:
         raise credentials_exception
 
 
-def validate_cpf(cpf: str) -> bool:
-    url = 'https://api.invertexto.com/v1/validator'
-    params = {'token': settings.API_TOKEN, 'value': cpf, 'type': 'cpf'}
-
-    response = requests.get(url, params=params)
-
-    if response.status_code != HTTPStatus.OK:
-        response.raise_for_status()  # pragma: no cover
-
-    result = response.json()
-    return result.get('valid', False)
+def require_admin_token(x_admin_token: str | None = Header(default=None)):
+    admin_token = get_settings().ADMIN_TOKEN
+    if not admin_token or not x_admin_token or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail='Invalid admin token')
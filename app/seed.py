@@ -0,0 +1,266 @@
+"""
+Seeds the database with generated users and todos, for performance tests.
+
+Rows are streamed with COPY in large chunks instead of going through the ORM, the todos over
+several connections at once, and every user gets the same password, hashed once. Ten million
+todos load in a few minutes.
+
+Usage:
+    python -m app.seed [--users 100000] [--todos 10000000] [--distribution zipf] [--skew 1.1]
+        [--states draft=5,todo=30,doing=10,done=45,trash=10] [--password password] [--jobs 4]
+        [--defer-foreign-key] [--seed 42]
+"""
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+
+from sqlalchemy import Engine, text
+
+from app.cpf import check_digits
+from app.database import get_engine
+from app.logging_config import logger
+from app.models import TodoState
+from app.security import get_password_hash
+
+DEFAULT_STATES = 'draft=5,todo=30,doing=10,done=45,trash=10'
+CHUNK_ROWS = 10_000
+
+VERBS = ['Buy', 'Call', 'Email', 'Fix', 'Plan', 'Review', 'Write', 'Clean', 'Book', 'Pay', 'Read']
+OBJECTS = [
+    'groceries',
+    'the dentist',
+    'the report',
+    'the car',
+    'the trip',
+    'the pull request',
+    'the invoice',
+    'the kitchen',
+    'a gift',
+    'the slides',
+    'the rent',
+    'the newsletter',
+]
+DETAILS = ['before noon', 'this week', 'with Ana', 'for the team', 'if possible', 'again', 'today', '']
+
+
+def parse_states(value: str) -> dict[TodoState, float]:
+    """
+    Parses `state=weight` pairs, e.g. `todo=30,done=70`.
+
+    Raises:
+        ValueError: If a state does not exist or a weight is not a positive number.
+    """
+    weights = {}
+    for pair in value.split(','):
+        state, _, weight = pair.partition('=')
+        weights[TodoState(state.strip())] = float(weight)
+
+    if not weights or any(weight < 0 for weight in weights.values()) or sum(weights.values()) <= 0:
+        raise ValueError(f'Invalid state weights: {value}')
+
+    return weights
+
+
+def positive_int(value: str) -> int:
+    """
+    Parses a command line count that must be at least 1.
+
+    Raises:
+        ValueError: If `value` is not a positive integer.
+    """
+    number = int(value)
+    if number < 1:
+        raise ValueError(f'Not a positive integer: {value}')
+
+    return number
+
+
+def todos_per_user(users: int, todos: int, distribution: str, skew: float = 1.1) -> list[int]:
+    """
+    Splits `todos` among `users`, evenly or following a Zipf law: a few users own most todos.
+    """
+    if distribution == 'uniform':
+        weights = [1.0] * users
+    elif distribution == 'zipf':
+        weights = [1 / rank**skew for rank in range(1, users + 1)]
+    else:
+        raise ValueError(f'Unknown distribution: {distribution}')
+
+    total = sum(weights)
+    counts = [int(todos * weight / total) for weight in weights]
+    for index in range(todos - sum(counts)):
+        counts[index % users] += 1
+
+    return counts
+
+
+def cpf(number: int) -> str:
+    """
+    Returns the valid CPF whose first nine digits are `number`.
+    """
+    digits = f'{number:09d}'
+    return digits + check_digits(digits)
+
+
+def _copy(engine: Engine, statement: str, chunks):
+    with engine.begin() as connection:
+        with connection.connection.driver_connection.cursor() as cursor, cursor.copy(statement) as copy:
+            for chunk in chunks:
+                copy.write(chunk)
+
+
+def seed_users(engine: Engine, users: int, password_hash: str) -> range:
+    """
+    Inserts `users` users with COPY, all with the same password hash.
+
+    They get the ids after the current highest one, so seeding can be repeated on the same database.
+
+    Returns:
+        range: The ids of the new users.
+    """
+    with engine.connect() as connection:
+        first_id = connection.scalar(text('SELECT coalesce(max(id), 0) + 1 FROM users'))
+    user_ids = range(first_id, first_id + users)
+    if not user_ids:
+        return user_ids
+
+    def chunks():
+        for start in range(0, users, CHUNK_ROWS):
+            yield ''.join(
+                f'{id_}\tseed{id_}\tseed{id_}@example.com\t{password_hash}\t{cpf(id_)}\n'
+                for id_ in user_ids[start : start + CHUNK_ROWS]
+            )
+
+    _copy(engine, 'COPY users (id, username, email, password, cpf) FROM STDIN', chunks())
+
+    with engine.begin() as connection:
+        connection.execute(text("SELECT setval('users_id_seq', :last_id)"), {'last_id': user_ids[-1]})
+
+    return user_ids
+
+
+@contextmanager
+def foreign_key_deferred(engine: Engine):
+    """
+    Drops the `todos.user_id` foreign key while the block runs and adds it back afterwards.
+
+    Checking it once for the whole table is about twice as fast as a trigger call per copied row.
+    """
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE todos DROP CONSTRAINT todos_user_id_fkey'))
+    try:
+        yield
+    finally:
+        with engine.begin() as connection:
+            connection.execute(
+                text(
+                    'ALTER TABLE todos ADD CONSTRAINT todos_user_id_fkey '
+                    'FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE'
+                )
+            )
+
+
+def seed_todos(
+    engine: Engine, counts: dict[int, int], states: dict[TodoState, float], jobs: int = 4, seed=None
+) -> int:
+    """
+    Inserts `counts[user_id]` todos for each user with COPY, over `jobs` connections at once.
+
+    Todos are appended to the end of each user's list, with states drawn from the `states` weights
+    and creation dates spread over the last year. Each job commits on its own.
+
+    Returns:
+        int: The number of todos inserted.
+    """
+    now = datetime.now().replace(microsecond=0)
+    # Drawing from precomputed values keeps the generation cheap next to the COPY itself.
+    timestamps = [str(now - timedelta(seconds=second)) for second in range(0, 365 * 86400, 317)]
+    texts = [
+        f'{verb} {thing}\t{verb} {thing} {detail}'.rstrip()
+        for verb in VERBS
+        for thing in OBJECTS
+        for detail in DETAILS
+    ]
+    state_names = [state.value for state in states]
+    state_weights = list(states.values())
+    user_ids = list(counts)
+
+    def chunks(job: int):
+        rng = random.Random(f'{seed}-{job}') if seed is not None else random.Random()
+        rows = 0
+        lines = []
+        for user_id in user_ids[job::jobs]:
+            count = counts[user_id]
+            lines.extend(
+                f'{text_}\t{state}\t{user_id}\t{index:08x}V\t{created_at}\t{created_at}\n'
+                for index, (text_, state, created_at) in enumerate(
+                    zip(
+                        rng.choices(texts, k=count),
+                        rng.choices(state_names, state_weights, k=count),
+                        rng.choices(timestamps, k=count),
+                    ),
+                    1,
+                )
+            )
+            rows += count
+            if rows >= CHUNK_ROWS:
+                yield ''.join(lines)
+                lines.clear()
+                rows = 0
+        yield ''.join(lines)
+
+    statement = (
+        'COPY todos (title, description, state, user_id, position, created_at, updated_at) FROM STDIN'
+    )
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for future in [executor.submit(_copy, engine, statement, chunks(job)) for job in range(jobs)]:
+            future.result()
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.execute(text('ANALYZE users, todos'))
+
+    return sum(counts.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--users', type=positive_int, default=100_000)
+    parser.add_argument('--todos', type=positive_int, default=10_000_000)
+    parser.add_argument('--distribution', choices=['uniform', 'zipf'], default='zipf')
+    parser.add_argument('--skew', type=float, default=1.1, help='Exponent of the Zipf distribution.')
+    parser.add_argument('--states', type=parse_states, default=DEFAULT_STATES)
+    parser.add_argument('--password', default='password', help='The password of every user.')
+    parser.add_argument(
+        '--jobs', type=positive_int, default=4, help='Connections copying todos at once.'
+    )
+    parser.add_argument(
+        '--defer-foreign-key',
+        action='store_true',
+        help='Drop the todos foreign key during the load and check it once at the end.',
+    )
+    parser.add_argument('--seed', type=int, default=None, help='Makes the generated data repeatable.')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    engine = get_engine()
+    user_ids = seed_users(engine, args.users, get_password_hash(args.password))
+    counts = todos_per_user(args.users, args.todos, args.distribution, args.skew)
+    with foreign_key_deferred(engine) if args.defer_foreign_key else nullcontext():
+        todos = seed_todos(engine, dict(zip(user_ids, counts)), args.states, args.jobs, args.seed)
+    elapsed = time.perf_counter() - started
+
+    logger.info(
+        'Seeded %d users and %d todos in %.0fs (%.0f todos/s)',
+        len(user_ids),
+        todos,
+        elapsed,
+        todos / elapsed,
+    )
+
+
+if __name__ == '__main__':
+    main()
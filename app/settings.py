@@ -1,3 +1,5 @@
+from functools import cache
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,3 +10,84 @@ class Settings(BaseSettings):
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     API_TOKEN: str
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_PREPARE_THRESHOLD: int | None = 5
+    WARMUP_POOL_CONNECTIONS: int = 5
+    PURGE_INTERVAL_SECONDS: int = 60
+    PURGE_BATCH_SIZE: int = 1000
+    TRASH_RETENTION_DAYS: int = 30
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_REDIS_URL: str | None = None
+    RATE_LIMIT_TRUST_FORWARDED: bool = False
+    RATE_LIMITS_PER_IP: dict[str, str] = {
+        'auth': '30/minute',
+        'users': '300/minute',
+        'todo': '600/minute',
+    }
+    RATE_LIMITS_PER_USER: dict[str, str] = {
+        'auth': '5/minute',
+        'users': '120/minute',
+        'todo': '300/minute',
+    }
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_LEVEL: int = 6
+    COMPRESSION_CACHE_SIZE: int = 256
+    DATABASE_REPLICA_URLS: list[str] = []
+    REPLICA_RETRY_SECONDS: int = 30
+    READ_YOUR_WRITES_SECONDS: int = 5
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_WAIT_SECONDS: float = 5
+    IDEMPOTENCY_LEASE_SECONDS: float = 60
+    PROFILING_ENABLED: bool = False
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_INTERVAL_SECONDS: float = 0.005
+    PROFILING_STORE_SIZE: int = 100
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    REVOCATION_FILTER_CAPACITY: int = 100_000
+    REVOCATION_FILTER_ERROR_RATE: float = 0.001
+    REVOCATION_REFRESH_SECONDS: int = 300
+    POSITION_REBALANCE_INTERVAL_SECONDS: int = 3600
+    POSITION_MAX_LENGTH: int = 24
+    TODO_BATCH_WINDOW_SECONDS: float = 0
+    TODO_BATCH_MAX_SIZE: int = 100
+    OUTBOX_ENABLED: bool = False
+    OUTBOX_SINK_URL: str | None = None
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_INTERVAL_SECONDS: float = 1
+    OUTBOX_MAX_ATTEMPTS: int = 10
+    OUTBOX_RETENTION_DAYS: int = 7
+    ARCHIVE_INTERVAL_SECONDS: int = 3600
+    ARCHIVE_AFTER_DAYS: int = 90
+    ARCHIVE_BATCH_SIZE: int = 1000
+    ADMIN_TOKEN: str | None = None
+    SLOW_QUERY_THRESHOLD_MS: float = 0
+    SLOW_QUERY_LOG_SIZE: int = 100
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 1.0
+    CPF_VALIDATOR_URL: str = 'https://api.invertexto.com/v1/validator'
+    CPF_VERIFICATION_DEFERRED: bool = False
+    CPF_VERIFICATION_INTERVAL_SECONDS: float = 1
+    CPF_VERIFICATION_BATCH_SIZE: int = 50
+    CPF_VERIFICATION_CONCURRENCY: int = 4
+    CPF_VERIFICATION_LEASE_SECONDS: int = 60
+    CPF_BREAKER_THRESHOLD: int = 5
+    CPF_BREAKER_RESET_SECONDS: float = 30
+    REMINDER_SINK_URL: str | None = None
+    REMINDER_INTERVAL_SECONDS: float = 30
+    REMINDER_LEAD_SECONDS: int = 900
+    REMINDER_BATCH_SIZE: int = 500
+    CONCURRENCY_LIMIT_ENABLED: bool = False
+    CONCURRENCY_LIMIT_INITIAL: int = 20
+    CONCURRENCY_LIMIT_MIN: int = 2
+    CONCURRENCY_LIMIT_MAX: int = 200
+    CONCURRENCY_LATENCY_TARGET_MS: float = 500
+    CONCURRENCY_RETRY_AFTER_SECONDS: int = 1
+
+
+@cache
+def get_settings() -> Settings:
+    """
+    Returns the application settings, read from the environment and `.env` once per process.
+    """
+    return Settings()
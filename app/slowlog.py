@@ -0,0 +1,193 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import cache
+
+from sqlalchemy import Engine, event
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.logging_config import logger
+from app.settings import get_settings
+
+# The `METHOD /path` of the request being served, set by `SlowQueryRouteMiddleware`.
+current_route: ContextVar[str | None] = ContextVar('current_route', default=None)
+
+# Set on the connections that run the EXPLAIN, so their statements are not logged in turn.
+SKIP_OPTION = 'skip_slow_query_log'
+
+# A quoted literal of a plan, like the bound values in `Filter: (email = 'paulo@gmail.com'::text)`.
+PLAN_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+
+def redact(value):
+    """
+    Hides the bind values that could carry personal data or secrets.
+
+    Numbers, booleans and `None` are kept, as ids, limits and offsets are what explains a plan;
+    strings and bytes only keep their length.
+    """
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (str, bytes)):
+        return f'<redacted {type(value).__name__} of length {len(value)}>'
+
+    return f'<redacted {type(value).__name__}>'
+
+
+def redact_plan(plan: str) -> str:
+    """
+    Hides the quoted literals of a plan: EXPLAIN ANALYZE runs with the real bind values, and
+    prints the string ones in the conditions. Numbers are kept, as in `redact`.
+    """
+    return PLAN_LITERAL.sub("'<redacted>'", plan)
+
+
+@dataclass
+class SlowQuery:
+    statement: str
+    parameters: dict | list | None
+    duration_ms: float
+    route: str | None
+    recorded_at: datetime = field(default_factory=datetime.now)
+    plan: str | None = None
+
+
+class SlowQueryLog:
+    """
+    Keeps the last `size` statements that ran for longer than `threshold_ms`, in a ring buffer.
+
+    Installed on an engine, it times every statement with the cursor execution events. The plan
+    of a slow SELECT is captured with `EXPLAIN (ANALYZE, BUFFERS)` on another connection, in a
+    read-only transaction, by a background thread, so the request that was slow isn't made slower.
+    Only `explain_sample_rate` of the slow SELECTs are explained, at most `max_pending` at a time,
+    and their plans go through `redact_plan` like the parameters go through `redact`.
+    """
+
+    def __init__(
+        self, size: int, threshold_ms: float, explain_sample_rate: float = 1.0, max_pending: int = 4
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.max_pending = max_pending
+        self._queries: deque[SlowQuery] = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+
+    def install(self, engine: Engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute, named=True)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute, named=True)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def queries(self) -> list[SlowQuery]:
+        """
+        Returns the recorded slow queries, the most recent first.
+        """
+        with self._lock:
+            return list(reversed(self._queries))
+
+    @staticmethod
+    def _before_cursor_execute(conn, **kw):
+        conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+    @staticmethod
+    def _handle_error(context):
+        # A failed statement gets no `after_cursor_execute`: drop its start time, or the next
+        # statements of the connection would be timed from it.
+        if context.execution_context is not None and context.connection is not None:
+            started_at = context.connection.info.get('query_started_at')
+            if started_at:
+                started_at.pop()
+
+    def _after_cursor_execute(self, conn, statement, parameters, executemany, **kw):
+        duration_ms = (time.perf_counter() - conn.info['query_started_at'].pop()) * 1000
+        if duration_ms < self.threshold_ms or conn.get_execution_options().get(SKIP_OPTION):
+            return
+
+        query = SlowQuery(statement, redact(parameters), duration_ms, current_route.get())
+        with self._lock:
+            self._queries.append(query)
+
+        logger.warning(
+            'Slow query (%.1f ms) on %s: %s %s',
+            duration_ms,
+            query.route,
+            statement,
+            query.parameters,
+        )
+
+        if not executemany and statement.lstrip()[:6].upper() == 'SELECT':
+            self._explain_later(conn.engine, query, parameters)
+
+    def _explain_later(self, engine: Engine, query: SlowQuery, parameters):
+        if random.random() >= self.explain_sample_rate:
+            return
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return
+            self._pending += 1
+
+        self._executor.submit(self._explain, engine, query, parameters)
+
+    def _explain(self, engine: Engine, query: SlowQuery, parameters):
+        try:
+            with engine.connect() as connection:
+                connection.execution_options(**{SKIP_OPTION: True})
+                connection.exec_driver_sql('SET TRANSACTION READ ONLY')
+                rows = connection.exec_driver_sql(
+                    f'EXPLAIN (ANALYZE, BUFFERS) {query.statement}', parameters
+                ).all()
+                connection.rollback()
+            query.plan = redact_plan('\n'.join(row[0] for row in rows))
+        except Exception as error:
+            logger.warning('Could not explain slow query: %s', error)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+@cache
+def get_slow_query_log() -> SlowQueryLog | None:
+    """
+    Returns the process-wide slow query log, or None when SLOW_QUERY_THRESHOLD_MS disables it.
+    """
+    settings = get_settings()
+    if settings.SLOW_QUERY_THRESHOLD_MS <= 0:
+        return None
+
+    return SlowQueryLog(
+        settings.SLOW_QUERY_LOG_SIZE,
+        settings.SLOW_QUERY_THRESHOLD_MS,
+        settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    )
+
+
+class SlowQueryRouteMiddleware:
+    """
+    Tells the slow query log which request ran each statement.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        token = current_route.set(f'{scope["method"]} {scope["path"]}')
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_route.reset(token)
@@ -0,0 +1,24 @@
+from fastapi import FastAPI
+
+from app.database import get_engine, warm_up_pool
+from app.logging_config import logger
+from app.security import warm_up_password_hasher
+from app.settings import get_settings
+
+
+def warm_up(app: FastAPI):
+    """
+    Pays the one-off startup costs before the application is reported as ready.
+
+    Pre-opens database pool connections, initializes the argon2 hasher and caches the
+    OpenAPI schema, which FastAPI only builds on the first `/openapi.json` or `/docs`.
+    The response models need nothing more: FastAPI builds their validators and
+    serializers when the routes are declared.
+    """
+    logger.info('Warming up application')
+
+    warm_up_pool(get_engine(), get_settings().WARMUP_POOL_CONNECTIONS)
+    warm_up_password_hasher()
+    app.openapi()
+
+    logger.info('Application warm-up finished')
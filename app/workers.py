@@ -0,0 +1,272 @@
+import asyncio
+from datetime import timedelta
+from typing import Callable
+
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.database import get_engine
+from app.logging_config import logger
+from app.models import (
+    IdempotencyKey,
+    OutboxEvent,
+    PositionRebalance,
+    RefreshToken,
+    RevokedToken,
+    Todo,
+    TodoArchive,
+    TodoState,
+    TodoTombstone,
+    User,
+)
+from app.ordering import rebalance_positions
+from app.settings import get_settings
+
+
+def _delete_todos_in_batches(
+    session: Session, model: type[Todo | TodoArchive], where, batch_size: int, tombstones: bool = True
+) -> int:
+    """
+    Runs `DELETE FROM todos WHERE (user_id, id) IN (SELECT user_id, id ... LIMIT n)` until
+    nothing matches, on `todos` or on `todos_archive`.
+
+    Each batch is committed on its own, so locks are short and nothing is loaded into memory.
+    With `tombstones` the deleted ids are recorded, in the same statement, for the delta sync.
+    """
+    deleted = 0
+
+    while True:
+        batch = select(model.user_id, model.id).where(*where).limit(batch_size)
+        batch = batch.with_for_update(skip_locked=True)
+        # `where` is repeated on the DELETE so a `user_id` filter prunes the other partitions.
+        statement = delete(model).where(*where, tuple_(model.user_id, model.id).in_(batch))
+
+        if tombstones:
+            removed = statement.returning(model.id, model.user_id).cte('removed')
+            statement = (
+                insert(TodoTombstone)
+                .from_select(['todo_id', 'user_id'], select(removed.c.id, removed.c.user_id))
+                .returning(TodoTombstone.todo_id)
+            )
+            count = len(session.execute(statement).all())
+        else:
+            count = session.execute(statement, execution_options={'synchronize_session': False}).rowcount
+
+        session.commit()
+
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def purge_trashed_todos(session: Session, batch_size: int, retention: timedelta) -> int:
+    """
+    Deletes, in batches, the todos that have been in the trash for longer than `retention`,
+    archived or not.
+
+    Returns:
+        int: The number of deleted todos.
+    """
+    deleted = sum(
+        _delete_todos_in_batches(
+            session,
+            model,
+            (model.state == TodoState.trash, model.updated_at < func.now() - retention),
+            batch_size,
+        )
+        for model in (Todo, TodoArchive)
+    )
+
+    if deleted:
+        logger.info('Purged %d trashed todos', deleted)
+
+    return deleted
+
+
+def purge_deleted_users(session: Session, batch_size: int) -> int:
+    """
+    Deletes the soft-deleted users, removing their todos in batches first.
+
+    The `ON DELETE CASCADE` on `todos.user_id` only catches rows created in the meantime.
+
+    Returns:
+        int: The number of deleted users.
+    """
+    user_ids = session.scalars(select(User.id).where(User.deleted_at.is_not(None))).all()
+
+    for user_id in user_ids:
+        todos = sum(
+            _delete_todos_in_batches(
+                session, model, (model.user_id == user_id,), batch_size, tombstones=False
+            )
+            for model in (Todo, TodoArchive)
+        )
+
+        session.execute(delete(TodoTombstone).where(TodoTombstone.user_id == user_id))
+        session.execute(delete(User).where(User.id == user_id))
+        session.commit()
+
+        logger.info('Purged user ID: %d and %d todos', user_id, todos)
+
+    return len(user_ids)
+
+
+def archive_todos(session: Session, batch_size: int, age: timedelta) -> int:
+    """
+    Moves, in batches, the done and trashed todos not updated for `age` to `todos_archive`.
+
+    Each batch is deleted from `todos` and inserted in the archive by a single statement,
+    committed on its own, so the hot table and its indexes only keep the live todos.
+
+    Returns:
+        int: The number of archived todos.
+    """
+    where = (Todo.state.in_([TodoState.done, TodoState.trash]), Todo.updated_at < func.now() - age)
+    columns = [column.name for column in Todo.__table__.columns]
+    archived = 0
+
+    while True:
+        batch = select(Todo.user_id, Todo.id).where(*where).limit(batch_size)
+        batch = batch.with_for_update(skip_locked=True)
+        moved = (
+            delete(Todo)
+            .where(*where, tuple_(Todo.user_id, Todo.id).in_(batch))
+            .returning(*Todo.__table__.columns)
+            .cte('moved')
+        )
+        statement = (
+            insert(TodoArchive)
+            .from_select(columns, select(*(moved.c[name] for name in columns)))
+            .returning(TodoArchive.id)
+        )
+        count = len(session.execute(statement).all())
+        session.commit()
+
+        archived += count
+        if count < batch_size:
+            break
+
+    if archived:
+        logger.info('Archived %d todos', archived)
+
+    return archived
+
+
+def purge_expired_idempotency_keys(session: Session) -> int:
+    """
+    Deletes the stored idempotent responses whose TTL is over.
+
+    Returns:
+        int: The number of deleted keys.
+    """
+    result = session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.expires_at < func.now()),
+        execution_options={'synchronize_session': False},
+    )
+    session.commit()
+
+    return result.rowcount
+
+
+def purge_expired_tokens(session: Session) -> int:
+    """
+    Deletes the refresh tokens and the revocations that expired.
+
+    Returns:
+        int: The number of deleted rows.
+    """
+    deleted = 0
+    for model in (RefreshToken, RevokedToken):
+        result = session.execute(
+            delete(model).where(model.expires_at < func.now()),
+            execution_options={'synchronize_session': False},
+        )
+        deleted += result.rowcount
+    session.commit()
+
+    return deleted
+
+
+def purge_dispatched_events(session: Session, retention: timedelta) -> int:
+    """
+    Deletes the outbox events dispatched more than `retention` ago.
+
+    Returns:
+        int: The number of deleted events.
+    """
+    result = session.execute(
+        delete(OutboxEvent).where(OutboxEvent.dispatched_at < func.now() - retention),
+        execution_options={'synchronize_session': False},
+    )
+    session.commit()
+
+    return result.rowcount
+
+
+def purge():
+    settings = get_settings()
+    with Session(get_engine()) as session:
+        purge_deleted_users(session, settings.PURGE_BATCH_SIZE)
+        purge_trashed_todos(
+            session, settings.PURGE_BATCH_SIZE, timedelta(days=settings.TRASH_RETENTION_DAYS)
+        )
+        purge_expired_idempotency_keys(session)
+        purge_expired_tokens(session)
+        purge_dispatched_events(session, timedelta(days=settings.OUTBOX_RETENTION_DAYS))
+
+
+def rebalance_queued_positions(session: Session) -> int:
+    """
+    Rebalances the todo positions of the users queued by the moves, one user at a time.
+
+    Moves keep splitting the gap between two positions, which makes them longer; a move
+    giving a position longer than POSITION_MAX_LENGTH queues its user, and rebalancing
+    spreads all the positions of the user evenly again, keeping them short. Each user is
+    taken off the queue in the transaction that rebalances them, with SKIP LOCKED.
+
+    Returns:
+        int: The number of rebalanced users.
+    """
+    queued = select(PositionRebalance.user_id).limit(1).with_for_update(skip_locked=True)
+    rebalanced = 0
+    while user_id := session.scalar(
+        delete(PositionRebalance)
+        .where(PositionRebalance.user_id == queued.scalar_subquery())
+        .returning(PositionRebalance.user_id),
+        execution_options={'synchronize_session': False},
+    ):
+        count = rebalance_positions(session, user_id)
+        session.commit()
+        rebalanced += 1
+        logger.info('Rebalanced the positions of %d todos for user ID: %d', count, user_id)
+
+    session.rollback()
+
+    return rebalanced
+
+
+def archive():
+    settings = get_settings()
+    with Session(get_engine()) as session:
+        archive_todos(session, settings.ARCHIVE_BATCH_SIZE, timedelta(days=settings.ARCHIVE_AFTER_DAYS))
+
+
+def rebalance():
+    with Session(get_engine()) as session:
+        rebalance_queued_positions(session)
+
+
+async def run_periodically(name: str, interval: float, job: Callable[[], object]):
+    """
+    Runs the blocking `job` in the threadpool every `interval` seconds until cancelled.
+    """
+    logger.info('Starting background job %s every %s seconds', name, interval)
+
+    while True:
+        await asyncio.sleep(interval)
+
+        try:
+            await run_in_threadpool(job)
+        except Exception:
+            logger.exception('Background job %s failed', name)
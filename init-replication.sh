@@ -0,0 +1,10 @@
+#!/bin/sh
+# Prepares the primary for the streaming replica of the `replica` compose profile.
+set -e
+
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-EOSQL
+    CREATE ROLE replicator WITH REPLICATION LOGIN PASSWORD 'replicator_password';
+    SELECT pg_create_physical_replication_slot('replica_slot');
+EOSQL
+
+echo "host replication replicator all scram-sha-256" >> "$PGDATA/pg_hba.conf"
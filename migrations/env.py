@@ -1,3 +1,4 @@
+import re
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -16,6 +17,15 @@ if config.config_file_name is not None:
 
 target_metadata = table_registry.metadata
 
+# The hash partitions of `todos` are created by its migration, not declared on the models:
+# without this filter autogenerate would drop them.
+TODO_PARTITION = re.compile(r'todos_p\d+')
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    return not (type_ == 'table' and TODO_PARTITION.fullmatch(name))
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -40,6 +50,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -61,7 +72,9 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,37 @@
+"""add position rebalances
+
+Revision ID: 1d7f3a9b5e62
+Revises: 6a8c0e2f4b17
+Create Date: 2026-10-20 17:03:22.904716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1d7f3a9b5e62'
+down_revision: Union[str, None] = '6a8c0e2f4b17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('position_rebalances',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # From now on the moves queue the users; the positions already longer than the default
+    # POSITION_MAX_LENGTH are queued once.
+    op.execute(
+        'INSERT INTO position_rebalances (user_id) '
+        'SELECT DISTINCT user_id FROM todos WHERE length(position) > 24'
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('position_rebalances')
@@ -0,0 +1,28 @@
+"""add idempotency key owners
+
+Revision ID: 2b6d9f3e8c51
+Revises: 9e3a5c7d1f28
+Create Date: 2026-10-20 14:05:51.772460
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b6d9f3e8c51'
+down_revision: Union[str, None] = '9e3a5c7d1f28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('idempotency_keys', sa.Column('owner', sa.String(), nullable=True))
+    op.add_column('idempotency_keys', sa.Column('committed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('idempotency_keys', 'committed_at')
+    op.drop_column('idempotency_keys', 'owner')
@@ -0,0 +1,44 @@
+"""add cpf verification jobs
+
+Revision ID: 3f9c2b7a5d14
+Revises: 7e1d4b9c2a63
+Create Date: 2026-10-19 16:12:44.201937
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2b7a5d14'
+down_revision: Union[str, None] = '7e1d4b9c2a63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+cpf_status = postgresql.ENUM('pending', 'verified', 'rejected', name='cpfstatus')
+
+
+def upgrade() -> None:
+    cpf_status.create(op.get_bind())
+    # Existing users were validated at signup. A constant default doesn't rewrite the table.
+    op.add_column('users', sa.Column('cpf_status', cpf_status, server_default='verified', nullable=False))
+    op.create_table('cpf_verification_jobs',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('run_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_cpf_verification_jobs_run_at'), 'cpf_verification_jobs', ['run_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_cpf_verification_jobs_run_at'), table_name='cpf_verification_jobs')
+    op.drop_table('cpf_verification_jobs')
+    op.drop_column('users', 'cpf_status')
+    cpf_status.drop(op.get_bind())
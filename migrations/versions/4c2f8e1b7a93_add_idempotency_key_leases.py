@@ -0,0 +1,28 @@
+"""add idempotency key leases
+
+Revision ID: 4c2f8e1b7a93
+Revises: d6b4e1a9c3f5
+Create Date: 2026-10-20 09:12:45.203817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c2f8e1b7a93'
+down_revision: Union[str, None] = 'd6b4e1a9c3f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('idempotency_keys', sa.Column('locked_until', sa.DateTime(), nullable=True))
+    # The reservations left over have no lease yet: let a retry take them over right away.
+    op.execute('UPDATE idempotency_keys SET locked_until = created_at WHERE status_code IS NULL')
+
+
+def downgrade() -> None:
+    op.drop_column('idempotency_keys', 'locked_until')
@@ -0,0 +1,42 @@
+"""soft delete users and cascade todos
+
+Revision ID: 5b1f3c7d9a2e
+Revises: e9a0692cc228
+Create Date: 2026-10-19 10:02:11.412318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1f3c7d9a2e'
+down_revision: Union[str, None] = 'e9a0692cc228'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.drop_constraint('todos_user_id_fkey', 'todos', type_='foreignkey')
+    op.create_foreign_key(
+        'todos_user_id_fkey', 'todos', 'users', ['user_id'], ['id'], ondelete='CASCADE'
+    )
+    op.create_index(op.f('ix_todos_user_id'), 'todos', ['user_id'], unique=False)
+    op.create_index(
+        'ix_todos_trash_updated_at',
+        'todos',
+        ['updated_at'],
+        unique=False,
+        postgresql_where=sa.text("state = 'trash'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_todos_trash_updated_at', table_name='todos')
+    op.drop_index(op.f('ix_todos_user_id'), table_name='todos')
+    op.drop_constraint('todos_user_id_fkey', 'todos', type_='foreignkey')
+    op.create_foreign_key('todos_user_id_fkey', 'todos', 'users', ['user_id'], ['id'])
+    op.drop_column('users', 'deleted_at')
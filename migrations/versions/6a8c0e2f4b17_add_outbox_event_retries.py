@@ -0,0 +1,34 @@
+"""add outbox event retries
+
+Revision ID: 6a8c0e2f4b17
+Revises: 2b6d9f3e8c51
+Create Date: 2026-10-20 16:12:37.418205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a8c0e2f4b17'
+down_revision: Union[str, None] = '2b6d9f3e8c51'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('outbox_events', sa.Column('next_attempt_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+    op.add_column('outbox_events', sa.Column('last_error', sa.String(), nullable=True))
+    op.add_column('outbox_events', sa.Column('dead_lettered_at', sa.DateTime(), nullable=True))
+    op.drop_index('ix_outbox_events_pending', table_name='outbox_events', postgresql_where=sa.text('dispatched_at IS NULL'))
+    op.create_index('ix_outbox_events_pending', 'outbox_events', ['id'], unique=False, postgresql_where=sa.text('dispatched_at IS NULL AND dead_lettered_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_events_pending', table_name='outbox_events', postgresql_where=sa.text('dispatched_at IS NULL AND dead_lettered_at IS NULL'))
+    op.create_index('ix_outbox_events_pending', 'outbox_events', ['id'], unique=False, postgresql_where=sa.text('dispatched_at IS NULL'))
+    op.drop_column('outbox_events', 'dead_lettered_at')
+    op.drop_column('outbox_events', 'last_error')
+    op.drop_column('outbox_events', 'next_attempt_at')
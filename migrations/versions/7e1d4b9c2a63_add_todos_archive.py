@@ -0,0 +1,66 @@
+"""add todos archive
+
+Revision ID: 7e1d4b9c2a63
+Revises: c5e7a9d13b42
+Create Date: 2026-10-19 15:04:12.390518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '7e1d4b9c2a63'
+down_revision: Union[str, None] = 'c5e7a9d13b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('todos_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('state', postgresql.ENUM(name='todostate', create_type=False), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.String(collation='C'), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_todos_archive_user_id_position', 'todos_archive', ['user_id', 'position'], unique=False
+    )
+    op.create_index(
+        'ix_todos_archive_trash_updated_at',
+        'todos_archive',
+        ['updated_at'],
+        unique=False,
+        postgresql_where=sa.text("state = 'trash'"),
+    )
+    # Finds the done todos to archive; `ix_todos_trash_updated_at` already covers the trash.
+    op.create_index(
+        'ix_todos_done_updated_at',
+        'todos',
+        ['updated_at'],
+        unique=False,
+        postgresql_where=sa.text("state = 'done'"),
+    )
+
+
+def downgrade() -> None:
+    # Archived todos are moved back, so downgrading loses nothing.
+    op.execute(
+        'INSERT INTO todos (id, title, description, state, user_id, position, created_at, updated_at, version) '
+        'SELECT id, title, description, state, user_id, position, created_at, updated_at, version '
+        'FROM todos_archive'
+    )
+    op.drop_index('ix_todos_done_updated_at', table_name='todos')
+    op.drop_index('ix_todos_archive_trash_updated_at', table_name='todos_archive')
+    op.drop_index('ix_todos_archive_user_id_position', table_name='todos_archive')
+    op.drop_table('todos_archive')
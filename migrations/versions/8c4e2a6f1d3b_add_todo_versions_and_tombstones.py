@@ -0,0 +1,50 @@
+"""add todo versions and tombstones
+
+Revision ID: 8c4e2a6f1d3b
+Revises: 5b1f3c7d9a2e
+Create Date: 2026-10-19 10:31:47.203511
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2a6f1d3b'
+down_revision: Union[str, None] = '5b1f3c7d9a2e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('todo_version_seq')))
+    op.add_column(
+        'todos',
+        sa.Column(
+            'version',
+            sa.BigInteger(),
+            server_default=sa.text("nextval('todo_version_seq')"),
+            nullable=False,
+        ),
+    )
+    op.create_index('ix_todos_user_id_version', 'todos', ['user_id', 'version'], unique=False)
+    op.create_table('todo_tombstones',
+    sa.Column('todo_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default=sa.text("nextval('todo_version_seq')"), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('todo_id')
+    )
+    op.create_index(
+        'ix_todo_tombstones_user_id_version', 'todo_tombstones', ['user_id', 'version'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_todo_tombstones_user_id_version', table_name='todo_tombstones')
+    op.drop_table('todo_tombstones')
+    op.drop_index('ix_todos_user_id_version', table_name='todos')
+    op.drop_column('todos', 'version')
+    op.execute(sa.schema.DropSequence(sa.Sequence('todo_version_seq')))
@@ -0,0 +1,36 @@
+"""add todo change transaction ids
+
+Revision ID: 9e3a5c7d1f28
+Revises: 4c2f8e1b7a93
+Create Date: 2026-10-20 10:37:18.604129
+
+`pg_current_xact_id()` is volatile: as a column default in ADD COLUMN it would rewrite the
+tables, so the columns are added without one and the default is set afterwards. The
+existing rows keep a NULL `xact_id`, read as an old, finished transaction.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3a5c7d1f28'
+down_revision: Union[str, None] = '4c2f8e1b7a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CURRENT_XACT_ID = 'pg_current_xact_id()::text::bigint'
+
+
+def upgrade() -> None:
+    for table in ('todos', 'todo_tombstones', 'todos_archive'):
+        op.add_column(table, sa.Column('xact_id', sa.BigInteger(), nullable=True))
+    for table in ('todos', 'todo_tombstones'):
+        op.alter_column(table, 'xact_id', server_default=sa.text(CURRENT_XACT_ID))
+
+
+def downgrade() -> None:
+    for table in ('todos', 'todo_tombstones', 'todos_archive'):
+        op.drop_column(table, 'xact_id')
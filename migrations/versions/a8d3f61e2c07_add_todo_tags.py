@@ -0,0 +1,47 @@
+"""add todo tags
+
+Revision ID: a8d3f61e2c07
+Revises: 3f9c2b7a5d14
+Create Date: 2026-10-19 17:03:12.518304
+
+An index on a partitioned table can't be built CONCURRENTLY, so the GIN index on `tags` is
+created on the parent only, then built concurrently on each partition and attached to it;
+writes to `todos` go on while the partitions are indexed.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d3f61e2c07'
+down_revision: Union[str, None] = '3f9c2b7a5d14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS = 16
+
+
+def upgrade() -> None:
+    # A constant default doesn't rewrite the tables.
+    op.add_column('todos', sa.Column('tags', postgresql.ARRAY(sa.Text()), server_default='{}', nullable=False))
+    op.add_column(
+        'todos_archive', sa.Column('tags', postgresql.ARRAY(sa.Text()), server_default='{}', nullable=False)
+    )
+    op.execute('CREATE INDEX ix_todos_tags ON ONLY todos USING gin (tags)')
+    with op.get_context().autocommit_block():
+        for remainder in range(PARTITIONS):
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS todos_p{remainder}_tags_idx '
+                f'ON todos_p{remainder} USING gin (tags)'
+            )
+            op.execute(f'ALTER INDEX ix_todos_tags ATTACH PARTITION todos_p{remainder}_tags_idx')
+
+
+def downgrade() -> None:
+    # Dropping the parent index drops the partition ones attached to it.
+    op.drop_index('ix_todos_tags', table_name='todos', postgresql_using='gin')
+    op.drop_column('todos_archive', 'tags')
+    op.drop_column('todos', 'tags')
@@ -0,0 +1,148 @@
+"""partition todos by user
+
+Revision ID: c5e7a9d13b42
+Revises: 0a6e5d2c7f18
+Create Date: 2026-10-19 14:21:37.804156
+
+Moves `todos` to a table hash partitioned on `user_id`, online:
+
+1. `todos_partitioned` is created with its partitions and indexes, and a trigger on `todos`
+   mirrors every insert, update and delete into it from then on.
+2. The existing rows are copied in batches, each one committed on its own. Rows are read
+   FOR SHARE and inserted with ON CONFLICT DO NOTHING, so a row changed by the application
+   meanwhile is never overwritten with an older copy.
+3. The tables are swapped under a short exclusive lock.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e7a9d13b42'
+down_revision: Union[str, None] = '0a6e5d2c7f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS = 16
+BATCH_SIZE = 10_000
+
+COLUMNS = 'id, title, description, state, user_id, position, created_at, updated_at, version'
+INDEXES = {
+    'ix_{}_user_id': '(user_id)',
+    'ix_{}_user_id_version': '(user_id, version)',
+    'ix_{}_user_id_position': '(user_id, position)',
+    'ix_{}_trash_updated_at': "(updated_at) WHERE state = 'trash'",
+}
+
+
+def create_todos_table(name: str, primary_key: str, partition_by: str = '') -> None:
+    op.execute(
+        f"""
+        CREATE TABLE {name} (
+            id integer NOT NULL DEFAULT nextval('todos_id_seq'),
+            title varchar NOT NULL,
+            description varchar NOT NULL,
+            state todostate NOT NULL,
+            user_id integer NOT NULL,
+            position varchar COLLATE "C" NOT NULL,
+            created_at timestamp NOT NULL DEFAULT now(),
+            updated_at timestamp NOT NULL DEFAULT now(),
+            version bigint NOT NULL DEFAULT nextval('todo_version_seq'),
+            CONSTRAINT {name}_pkey PRIMARY KEY ({primary_key}),
+            CONSTRAINT {name}_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        ) {partition_by}
+        """
+    )
+
+
+def rename_todos_table(name: str, new_name: str) -> None:
+    op.execute(f'ALTER TABLE {name} RENAME TO {new_name}')
+    op.execute(f'ALTER TABLE {new_name} RENAME CONSTRAINT {name}_pkey TO {new_name}_pkey')
+    op.execute(
+        f'ALTER TABLE {new_name} RENAME CONSTRAINT {name}_user_id_fkey TO {new_name}_user_id_fkey'
+    )
+    for index in INDEXES:
+        op.execute(f'ALTER INDEX {index.format(name)} RENAME TO {index.format(new_name)}')
+
+
+def create_todos_indexes(name: str) -> None:
+    for index, definition in INDEXES.items():
+        op.execute(f'CREATE INDEX {index.format(name)} ON {name} {definition}')
+
+
+def upgrade() -> None:
+    create_todos_table('todos_partitioned', 'id, user_id', 'PARTITION BY HASH (user_id)')
+    for remainder in range(PARTITIONS):
+        op.execute(
+            f'CREATE TABLE todos_p{remainder} PARTITION OF todos_partitioned '
+            f'FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})'
+        )
+    create_todos_indexes('todos_partitioned')
+
+    op.execute(
+        f"""
+        CREATE FUNCTION todos_mirror() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM todos_partitioned WHERE id = OLD.id AND user_id = OLD.user_id;
+                RETURN NULL;
+            END IF;
+
+            INSERT INTO todos_partitioned ({COLUMNS})
+            VALUES (
+                NEW.id, NEW.title, NEW.description, NEW.state, NEW.user_id,
+                NEW.position, NEW.created_at, NEW.updated_at, NEW.version
+            )
+            ON CONFLICT (id, user_id) DO UPDATE SET
+                title = EXCLUDED.title,
+                description = EXCLUDED.description,
+                state = EXCLUDED.state,
+                position = EXCLUDED.position,
+                updated_at = EXCLUDED.updated_at,
+                version = EXCLUDED.version;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        'CREATE TRIGGER todos_mirror AFTER INSERT OR UPDATE OR DELETE ON todos '
+        'FOR EACH ROW EXECUTE FUNCTION todos_mirror()'
+    )
+
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        # Rows inserted after this point are copied by the trigger.
+        last_id = connection.scalar(sa.text('SELECT coalesce(max(id), 0) FROM todos'))
+        for start in range(0, last_id, BATCH_SIZE):
+            connection.execute(
+                sa.text(
+                    f"""
+                    INSERT INTO todos_partitioned ({COLUMNS})
+                    SELECT {COLUMNS} FROM todos WHERE id > :start AND id <= :end
+                    FOR SHARE
+                    ON CONFLICT DO NOTHING
+                    """
+                ),
+                {'start': start, 'end': start + BATCH_SIZE},
+            )
+
+    op.execute('LOCK TABLE todos IN ACCESS EXCLUSIVE MODE')
+    op.execute('ALTER SEQUENCE todos_id_seq OWNED BY todos_partitioned.id')
+    op.execute('DROP TABLE todos')
+    op.execute('DROP FUNCTION todos_mirror()')
+    rename_todos_table('todos_partitioned', 'todos')
+
+
+def downgrade() -> None:
+    # Copies the rows back in a single statement, the application should be stopped meanwhile.
+    rename_todos_table('todos', 'todos_partitioned')
+    create_todos_table('todos', 'id')
+    create_todos_indexes('todos')
+
+    op.execute(f'INSERT INTO todos ({COLUMNS}) SELECT {COLUMNS} FROM todos_partitioned')
+    op.execute('ALTER SEQUENCE todos_id_seq OWNED BY todos.id')
+    op.execute('DROP TABLE todos_partitioned')
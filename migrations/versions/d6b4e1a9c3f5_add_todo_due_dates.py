@@ -0,0 +1,44 @@
+"""add todo due dates
+
+Revision ID: d6b4e1a9c3f5
+Revises: a8d3f61e2c07
+Create Date: 2026-10-19 18:21:40.332175
+
+Like `ix_todos_tags`, the partial index of the pending reminders is created on the parent
+only, then built concurrently on each partition and attached to it.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6b4e1a9c3f5'
+down_revision: Union[str, None] = 'a8d3f61e2c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS = 16
+PENDING_REMINDER = "due_at IS NOT NULL AND reminded_at IS NULL AND state IN ('draft', 'todo', 'doing')"
+
+
+def upgrade() -> None:
+    for table in ('todos', 'todos_archive'):
+        op.add_column(table, sa.Column('due_at', sa.DateTime(), nullable=True))
+        op.add_column(table, sa.Column('reminded_at', sa.DateTime(), nullable=True))
+    op.execute(f'CREATE INDEX ix_todos_pending_reminders ON ONLY todos (due_at) WHERE {PENDING_REMINDER}')
+    with op.get_context().autocommit_block():
+        for remainder in range(PARTITIONS):
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS todos_p{remainder}_due_at_idx '
+                f'ON todos_p{remainder} (due_at) WHERE {PENDING_REMINDER}'
+            )
+            op.execute(f'ALTER INDEX ix_todos_pending_reminders ATTACH PARTITION todos_p{remainder}_due_at_idx')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_todos_pending_reminders', table_name='todos')
+    for table in ('todos', 'todos_archive'):
+        op.drop_column(table, 'reminded_at')
+        op.drop_column(table, 'due_at')
@@ -0,0 +1,42 @@
+"""add todo positions
+
+Revision ID: f3b8c1d92e47
+Revises: d41a7c3e8b95
+Create Date: 2026-10-19 13:02:51.117043
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8c1d92e47'
+down_revision: Union[str, None] = 'd41a7c3e8b95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('todos', sa.Column('position', sa.String(collation='C'), nullable=True))
+    # Keeps the current order (by id): zero padded hex sorts like the numbers, and the
+    # trailing 'V' means no position ends with the smallest digit, as app.ordering expects.
+    op.execute(
+        """
+        UPDATE todos SET position = ranked.position
+        FROM (
+            SELECT id, lpad(to_hex(row_number() OVER (PARTITION BY user_id ORDER BY id)), 8, '0') || 'V'
+                AS position
+            FROM todos
+        ) AS ranked
+        WHERE todos.id = ranked.id
+        """
+    )
+    op.alter_column('todos', 'position', nullable=False)
+    op.create_index('ix_todos_user_id_position', 'todos', ['user_id', 'position'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_todos_user_id_position', table_name='todos')
+    op.drop_column('todos', 'position')
@@ -7,7 +7,7 @@ from sqlalchemy.orm import Session
 from testcontainers.postgres import PostgresContainer
 
 from app.app import app
-from app.database import get_session
+from app.database import get_read_connection, get_session
 from app.models import Todo, TodoState, User, table_registry
 from app.security import get_password_hash
 
@@ -28,8 +28,10 @@ class TodoFactory(factory.Factory):
 
     title = factory.Faker('text', max_nb_chars=50)
     description = factory.Faker('text', max_nb_chars=150)
-    state = factory.fuzzy.FuzzyChoice(TodoState)
+    # Trashed todos are hidden from most routes, tests ask for them explicitly.
+    state = factory.fuzzy.FuzzyChoice([state for state in TodoState if state != TodoState.trash])
     user_id = 1
+    position = factory.Sequence(lambda n: f'{n + 1:08x}V')
 
 
 @pytest.fixture
@@ -37,8 +39,12 @@ def client(session):
     def get_session_override():
         return session
 
+    def get_read_connection_override():
+        return session.connection()
+
     with TestClient(app) as client:
         app.dependency_overrides[get_session] = get_session_override
+        app.dependency_overrides[get_read_connection] = get_read_connection_override
         yield client
 
     app.dependency_overrides.clear()
@@ -52,6 +58,8 @@ def session(engine):
         yield session
 
     table_registry.metadata.drop_all(engine)
+    # Drops pooled connections, their server-side prepared statements refer to the dropped types.
+    engine.dispose()
 
 
 @pytest.fixture(scope='session')
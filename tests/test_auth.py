@@ -56,3 +56,106 @@ def test_token_expired_after_time(client, user):
         )
         assert response.status_code == HTTPStatus.UNAUTHORIZED
         assert response.json() == {'detail': 'Could not validate credentials'}
+
+
+def login(client, user):
+    response = client.post(
+        '/auth/token',
+        data={'username': user.username, 'password': user.clean_password},
+    )
+    return response.json()
+
+
+def test_get_token_includes_refresh_token(client, user):
+    token = login(client, user)
+
+    assert token['refresh_token']
+    assert token['refresh_token'] != token['access_token']
+
+
+def test_refresh_token(client, user):
+    token = login(client, user)
+
+    response = client.post('/auth/refresh', json={'refresh_token': token['refresh_token']})
+
+    assert response.status_code == HTTPStatus.OK
+    refreshed = response.json()
+    assert refreshed['token_type'] == 'Bearer'
+    assert refreshed['refresh_token'] != token['refresh_token']
+
+    response = client.get('/todos/', headers={'Authorization': f'Bearer {refreshed["access_token"]}'})
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_refresh_token_reuse_revokes_session(client, user):
+    token = login(client, user)
+    refreshed = client.post('/auth/refresh', json={'refresh_token': token['refresh_token']}).json()
+
+    response = client.post('/auth/refresh', json={'refresh_token': token['refresh_token']})
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert response.json() == {'detail': 'Invalid refresh token'}
+
+    response = client.post('/auth/refresh', json={'refresh_token': refreshed['refresh_token']})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    response = client.get('/todos/', headers={'Authorization': f'Bearer {refreshed["access_token"]}'})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_refresh_with_access_token(client, user):
+    token = login(client, user)
+
+    response = client.post('/auth/refresh', json={'refresh_token': token['access_token']})
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert response.json() == {'detail': 'Invalid refresh token'}
+
+
+def test_refresh_token_is_not_an_access_token(client, user):
+    token = login(client, user)
+
+    response = client.get('/todos/', headers={'Authorization': f'Bearer {token["refresh_token"]}'})
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_logout(client, user):
+    token = login(client, user)
+    headers = {'Authorization': f'Bearer {token["access_token"]}'}
+
+    response = client.post('/auth/logout', headers=headers)
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'message': 'Logged out'}
+    assert client.get('/todos/', headers=headers).status_code == HTTPStatus.UNAUTHORIZED
+
+    response = client.post('/auth/refresh', json={'refresh_token': token['refresh_token']})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_logout_keeps_other_sessions(client, user):
+    first = login(client, user)
+    second = login(client, user)
+
+    client.post('/auth/logout', headers={'Authorization': f'Bearer {first["access_token"]}'})
+
+    response = client.get('/todos/', headers={'Authorization': f'Bearer {second["access_token"]}'})
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_password_change_revokes_tokens(client, user):
+    token = login(client, user)
+    headers = {'Authorization': f'Bearer {token["access_token"]}'}
+
+    response = client.put(
+        f'/users/{user.id}',
+        headers=headers,
+        json={'username': 'paulo', 'email': 'paulo@example.com', 'password': 'secret'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert client.get('/todos/', headers=headers).status_code == HTTPStatus.UNAUTHORIZED
+
+    response = client.post('/auth/refresh', json={'refresh_token': token['refresh_token']})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
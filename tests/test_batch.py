@@ -0,0 +1,125 @@
+from http import HTTPStatus
+
+from app.models import TodoState
+from app.schemas import MAX_BATCH_OPERATIONS
+from tests.conftest import TodoFactory
+
+
+def test_batch_runs_reads(session, client, user, token):
+    session.bulk_save_objects(TodoFactory.create_batch(3, user_id=user.id, state=TodoState.todo))
+    session.bulk_save_objects(TodoFactory.create_batch(2, user_id=user.id, state=TodoState.doing))
+    session.commit()
+
+    response = client.post(
+        '/batch',
+        headers={'Authorization': f'Bearer {token}'},
+        json={
+            'operations': [
+                {'method': 'GET', 'path': f'/users/{user.id}'},
+                {'method': 'GET', 'path': '/todos/?state=todo'},
+                {'method': 'GET', 'path': '/todos/?state=doing&fields=id,state'},
+            ]
+        },
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    user_result, todo_result, doing_result = response.json()['results']
+    assert user_result['status'] == HTTPStatus.OK
+    assert user_result['body']['username'] == user.username
+    assert user_result['headers']['content-type'] == 'application/json'
+    assert len(todo_result['body']['todos']) == 3  # noqa: PLR2004
+    assert doing_result['body']['todos'] == [
+        {'id': todo['id'], 'state': 'doing'} for todo in doing_result['body']['todos']
+    ]
+    assert len(doing_result['body']['todos']) == 2  # noqa: PLR2004
+
+
+def test_batch_operations_see_previous_writes(client, token):
+    response = client.post(
+        '/batch',
+        headers={'Authorization': f'Bearer {token}'},
+        json={
+            'operations': [
+                {
+                    'method': 'POST',
+                    'path': '/todos/',
+                    'body': {'title': 'Batched', 'description': 'From a batch', 'state': 'todo'},
+                },
+                {'method': 'PATCH', 'path': '/todos/1', 'body': {'state': 'done'}},
+                {'method': 'GET', 'path': '/todos/'},
+            ]
+        },
+    )
+
+    created, patched, listed = response.json()['results']
+    assert created['status'] == HTTPStatus.OK
+    assert patched['status'] == HTTPStatus.OK
+    assert [(todo['title'], todo['state']) for todo in listed['body']['todos']] == [('Batched', 'done')]
+
+
+def test_batch_failed_operations_dont_stop_the_batch(client, token):
+    response = client.post(
+        '/batch',
+        headers={'Authorization': f'Bearer {token}'},
+        json={
+            'operations': [
+                {'method': 'GET', 'path': '/unknown'},
+                {'method': 'DELETE', 'path': '/todos/'},
+                {'method': 'PATCH', 'path': '/todos/10', 'body': {'state': 'done'}},
+                {'method': 'POST', 'path': '/todos/', 'body': {'title': 'No description'}},
+                {'method': 'GET', 'path': '/todos/'},
+            ]
+        },
+    )
+
+    statuses = [result['status'] for result in response.json()['results']]
+    assert statuses == [
+        HTTPStatus.NOT_FOUND,
+        HTTPStatus.METHOD_NOT_ALLOWED,
+        HTTPStatus.NOT_FOUND,
+        HTTPStatus.UNPROCESSABLE_ENTITY,
+        HTTPStatus.OK,
+    ]
+    assert response.json()['results'][2]['body'] == {'detail': 'Task not found.'}
+
+
+def test_batch_operations_run_as_the_batch_user(client, user, other_user, token):
+    response = client.post(
+        '/batch',
+        headers={'Authorization': f'Bearer {token}'},
+        json={
+            'operations': [
+                {
+                    'method': 'DELETE',
+                    'path': f'/users/{other_user.id}',
+                    'headers': {'Authorization': 'Bearer forged'},
+                },
+            ]
+        },
+    )
+
+    (result,) = response.json()['results']
+    assert result['status'] == HTTPStatus.FORBIDDEN
+
+
+def test_batch_requires_a_token(client):
+    response = client.post('/batch', json={'operations': [{'method': 'GET', 'path': '/users/'}]})
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_batch_rejects_invalid_batches(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    operation = {'method': 'GET', 'path': '/users/'}
+
+    nested = client.post(
+        '/batch', headers=headers, json={'operations': [{'method': 'POST', 'path': '/batch'}]}
+    )
+    too_many = client.post(
+        '/batch', headers=headers, json={'operations': [operation] * (MAX_BATCH_OPERATIONS + 1)}
+    )
+    empty = client.post('/batch', headers=headers, json={'operations': []})
+
+    assert nested.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert too_many.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert empty.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
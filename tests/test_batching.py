@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.app import app
+from app.batching import TodoBatcher, get_todo_batcher
+from app.models import Todo, TodoState
+
+
+@pytest.fixture
+def batcher(engine, session):
+    return TodoBatcher(partial(Session, engine, expire_on_commit=False), window=0.2, max_size=5)
+
+
+@pytest.fixture
+def statements(engine):
+    executed = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):  # noqa: PLR0913, PLR0917
+        executed.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def todo_values(user, index):
+    return {
+        'title': f'todo {index}',
+        'description': 'batched',
+        'state': TodoState.todo,
+        'user_id': user.id,
+    }
+
+
+def test_concurrent_creations_share_one_insert(batcher, statements, user):
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        todos = list(executor.map(batcher.create, [todo_values(user, index) for index in range(5)]))
+
+    assert len([statement for statement in statements if statement.startswith('INSERT INTO todos')]) == 1
+    assert sorted(todo.title for todo in todos) == [f'todo {index}' for index in range(5)]
+    assert len({todo.id for todo in todos}) == 5  # noqa: PLR2004
+
+
+def test_batched_todos_are_appended_in_order(batcher, session, user):
+    session.add(Todo(title='first', description='', state=TodoState.todo, user_id=user.id, position='V'))
+    session.commit()
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        todos = list(executor.map(batcher.create, [todo_values(user, index) for index in range(5)]))
+
+    positions = {todo.position for todo in todos}
+    assert len(positions) == 5  # noqa: PLR2004
+    assert all(position > 'V' for position in positions)
+
+
+def test_batch_failure_is_raised_to_every_caller(batcher, user):
+    values = [todo_values(user, 0), {**todo_values(user, 1), 'user_id': user.id + 100}]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(batcher.create, value) for value in values]
+
+    for future in futures:
+        with pytest.raises(IntegrityError):
+            future.result()
+
+
+def test_create_todo_with_batcher(client, token, batcher):
+    app.dependency_overrides[get_todo_batcher] = lambda: batcher
+
+    response = client.post(
+        '/todos/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'Test todo', 'description': 'Test todo description', 'state': 'draft'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['title'] == 'Test todo'
+    assert response.json()['position']
@@ -0,0 +1,93 @@
+from http import HTTPStatus
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, etag_matches
+from tests.conftest import TodoFactory
+
+BIG_BODY = {'data': 'x' * 2048}
+
+
+def build_app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get('/big')
+    def big():
+        return BIG_BODY
+
+    @app.get('/small')
+    def small():
+        return {'data': 'x'}
+
+    return app
+
+
+def test_list_todos_is_compressed(session, client, user, token):
+    session.bulk_save_objects(TodoFactory.create_batch(30, user_id=user.id))
+    session.commit()
+
+    response = client.get(
+        '/todos/',
+        headers={'Authorization': f'Bearer {token}', 'Accept-Encoding': 'gzip'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert len(response.json()['todos']) == 30  # noqa: PLR2004
+
+
+def test_small_responses_are_not_compressed():
+    client = TestClient(build_app())
+
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.json() == {'data': 'x'}
+
+
+def test_not_compressed_without_accept_encoding():
+    client = TestClient(build_app())
+
+    response = client.get('/big', headers={'Accept-Encoding': 'identity'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.json() == BIG_BODY
+
+
+def test_compressed_body_is_cached_by_etag():
+    middleware = CompressionMiddleware(None, cache_size=1)
+    gzip_compress = middleware.compressors['gzip']
+    calls = []
+
+    def compress(body, level):
+        calls.append(body)
+        return gzip_compress(body, level)
+
+    middleware.compressors['gzip'] = compress
+
+    for _ in range(3):
+        middleware.compress(b'a' * 2048, 'gzip', 'W/"a"')
+    assert len(calls) == 1
+
+    middleware.compress(b'b' * 2048, 'gzip', 'W/"b"')
+    middleware.compress(b'a' * 2048, 'gzip', 'W/"a"')
+    assert len(calls) == 3  # noqa: PLR2004
+
+
+def test_if_none_match_returns_not_modified():
+    client = TestClient(build_app())
+
+    etag = client.get('/big').headers['ETag']
+    response = client.get('/big', headers={'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.content == b''
+
+
+def test_etag_matches():
+    assert etag_matches('"a", W/"b"', 'W/"b"')
+    assert etag_matches('*', 'W/"b"')
+    assert not etag_matches('"a"', 'W/"b"')
@@ -0,0 +1,146 @@
+import asyncio
+from http import HTTPStatus
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.concurrency import AIMDLimit, ConcurrencyLimitMiddleware, Priority, request_priority
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def limit():
+    return AIMDLimit(initial=10, minimum=2, maximum=20, latency_target=0.5, clock=FakeClock())
+
+
+@pytest.fixture
+def app_client(limit):
+    app = FastAPI()
+
+    @app.get('/users/')
+    @app.get('/health/live')
+    def ok():
+        return {'message': 'ok'}
+
+    @app.post('/todos/')
+    def fail():
+        raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    app.add_middleware(ConcurrencyLimitMiddleware, limit=limit, retry_after=2)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize(
+    ('method', 'path', 'headers', 'priority'),
+    [
+        ('POST', '/auth/token', [], Priority.critical),
+        ('PATCH', '/todos/1', [(b'authorization', b'Bearer x')], Priority.critical),
+        ('GET', '/todos/', [(b'authorization', b'Bearer x')], Priority.normal),
+        ('GET', '/users/', [(b'authorization', b'Bearer x')], Priority.normal),
+        ('GET', '/users/', [], Priority.low),
+        ('POST', '/batch', [(b'authorization', b'Bearer x')], Priority.normal),
+    ],
+)
+def test_request_priority(method, path, headers, priority):
+    assert request_priority({'method': method, 'path': path, 'headers': headers}) == priority
+
+
+def test_priorities_fill_their_share_of_the_limit(limit):
+    assert sum(limit.acquire(Priority.low) for _ in range(10)) == 5  # noqa: PLR2004
+    assert sum(limit.acquire(Priority.normal) for _ in range(10)) == 3  # noqa: PLR2004
+    assert sum(limit.acquire(Priority.critical) for _ in range(10)) == 2  # noqa: PLR2004
+    assert limit.inflight == 10  # noqa: PLR2004
+
+
+def test_slow_requests_lower_the_limit_once_per_latency_target(limit):
+    for _ in range(3):
+        limit.acquire(Priority.normal)
+        limit.release(latency=1)
+    assert limit.limit == pytest.approx(9)
+
+    limit.clock.now = 0.5
+    limit.acquire(Priority.normal)
+    limit.release(latency=0.1, failed=True)
+    assert limit.limit == pytest.approx(8.1)
+
+
+def test_fast_requests_raise_the_limit_only_when_it_is_used(limit):
+    limit.acquire(Priority.normal)
+    limit.release(latency=0.1)
+    assert limit.limit == 10  # noqa: PLR2004
+
+    for _ in range(6):
+        limit.acquire(Priority.normal)
+    limit.release(latency=0.1)
+    assert limit.limit == pytest.approx(10.1)
+
+
+def test_limit_stays_within_bounds():
+    limit = AIMDLimit(initial=2, minimum=2, maximum=2, latency_target=0.5, clock=FakeClock())
+
+    limit.acquire(Priority.critical)
+    limit.release(latency=1)
+    limit.acquire(Priority.critical)
+    limit.acquire(Priority.critical)
+    limit.release(latency=0.1)
+
+    assert limit.limit == 2  # noqa: PLR2004
+
+
+def test_requests_over_the_limit_are_shed(app_client, limit):
+    limit.inflight = 5
+
+    shed = app_client.get('/users/')
+    admitted = app_client.get('/users/', headers={'Authorization': 'Bearer x'})
+    probe = app_client.get('/health/live')
+
+    assert shed.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert shed.headers['Retry-After'] == '2'
+    assert shed.json() == {'detail': 'Service overloaded'}
+    assert admitted.status_code == HTTPStatus.OK
+    assert probe.status_code == HTTPStatus.OK
+    assert limit.inflight == 5  # noqa: PLR2004
+
+
+def test_server_errors_lower_the_limit(app_client, limit):
+    response = app_client.post('/todos/')
+
+    assert response.status_code == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert limit.inflight == 0
+    assert limit.limit == pytest.approx(9)
+
+
+def test_disconnected_requests_leave_the_limit_as_is(limit):
+    async def disconnected(scope, receive, send):
+        raise asyncio.CancelledError
+
+    middleware = ConcurrencyLimitMiddleware(disconnected, limit=limit)
+    scope = {'type': 'http', 'method': 'GET', 'path': '/todos/', 'headers': []}
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(middleware(scope, None, None))
+
+    assert limit.inflight == 0
+    assert limit.limit == 10  # noqa: PLR2004
+
+
+def test_unhandled_errors_lower_the_limit(limit):
+    async def crash(scope, receive, send):
+        raise RuntimeError('boom')
+
+    middleware = ConcurrencyLimitMiddleware(crash, limit=limit)
+    scope = {'type': 'http', 'method': 'GET', 'path': '/todos/', 'headers': []}
+
+    with pytest.raises(RuntimeError, match='boom'):
+        asyncio.run(middleware(scope, None, None))
+
+    assert limit.inflight == 0
+    assert limit.limit == pytest.approx(9)
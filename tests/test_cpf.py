@@ -0,0 +1,215 @@
+from datetime import timedelta
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import select, update
+
+from app.cpf import (
+    ChecksumCpfValidator,
+    CircuitBreaker,
+    claim_jobs,
+    get_cpf_validator,
+    retry_delay,
+    validator_from_url,
+    verify_cpfs,
+)
+from app.models import CpfStatus, CpfVerificationJob, User
+from app.settings import get_settings
+from tests.conftest import UserFactory
+
+
+class FakeValidator:
+    """
+    Answers from a fixed set of valid CPFs, or raises while `down`, and records every call.
+    """
+
+    def __init__(self, valid=(), down=False):
+        self.valid = set(valid)
+        self.down = down
+        self.calls = []
+
+    def validate(self, cpf):
+        self.calls.append(cpf)
+        if self.down:
+            raise ConnectionError('validator is down')
+        return cpf in self.valid
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def deferred(monkeypatch):
+    monkeypatch.setattr(get_settings(), 'CPF_VERIFICATION_DEFERRED', True)
+    validator = FakeValidator()
+    monkeypatch.setattr('app.routers.users.get_cpf_validator', lambda: validator)
+    return validator
+
+
+@pytest.fixture
+def _worker(monkeypatch, engine):
+    monkeypatch.setattr('app.cpf.get_engine', lambda: engine)
+
+
+def add_pending_users(session, cpfs):
+    users = [UserFactory(cpf=cpf, cpf_status=CpfStatus.pending) for cpf in cpfs]
+    session.add_all(users)
+    session.flush()
+    session.add_all([CpfVerificationJob(user_id=user.id) for user in users])
+    session.commit()
+    return users
+
+
+@pytest.mark.parametrize(
+    ('cpf', 'valid'),
+    [('01303175002', True), ('01303175003', False), ('11111111111', False), ('0130317500', False)],
+)
+def test_checksum_validator(cpf, valid):
+    assert ChecksumCpfValidator.validate(cpf) is valid
+
+
+def test_validator_from_url():
+    assert isinstance(validator_from_url('checksum:'), ChecksumCpfValidator)
+
+    with pytest.raises(ValueError, match='Unsupported CPF validator'):
+        validator_from_url('ftp://example.com')
+
+
+def test_retry_delay_is_capped():
+    assert retry_delay(1) == timedelta(seconds=2)
+    assert retry_delay(1000) == timedelta(hours=1)
+
+
+def test_circuit_breaker_opens_and_lets_one_trial_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(threshold=2, reset_after=30, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+
+    clock.now = 31
+    assert not breaker.is_open
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one trial at a time.
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now = 62
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow()
+    assert breaker.allow()
+
+
+def test_deferred_signup_does_not_call_the_validator(client, session, deferred):
+    response = client.post(
+        '/users/',
+        json={
+            'username': 'alice',
+            'email': 'alice@example.com',
+            'password': 'secret11',
+            'cpf': '01303175002',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json()['cpf_status'] == 'pending'
+    assert deferred.calls == []
+    job = session.scalar(select(CpfVerificationJob))
+    assert job.user_id == response.json()['id']
+
+
+def test_deferred_signup_still_checks_the_check_digits(client, session, deferred):
+    response = client.post(
+        '/users/',
+        json={
+            'username': 'alice',
+            'email': 'alice@example.com',
+            'password': 'secret11',
+            'cpf': '01303175003',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid CPF'}
+    assert session.scalar(select(CpfVerificationJob)) is None
+
+
+def test_claimed_jobs_are_hidden_until_the_lease_runs_out(session):
+    add_pending_users(session, ['01303175002', '52998224725'])
+
+    claimed = claim_jobs(session, batch_size=10, lease=timedelta(minutes=1))
+
+    assert sorted(job.cpf for job in claimed) == ['01303175002', '52998224725']
+    assert claim_jobs(session, batch_size=10, lease=timedelta(minutes=1)) == []
+
+    expired = CpfVerificationJob.run_at - timedelta(hours=1)
+    session.execute(update(CpfVerificationJob).values(run_at=expired))
+    session.commit()
+    assert len(claim_jobs(session, batch_size=10, lease=timedelta(minutes=1))) == 2  # noqa: PLR2004
+
+
+@pytest.mark.usefixtures('_worker')
+def test_verify_cpfs_marks_users(session):
+    verified, rejected = add_pending_users(session, ['01303175002', '52998224725'])
+    validator = FakeValidator(valid={'01303175002'})
+
+    done = verify_cpfs(validator, CircuitBreaker(threshold=5, reset_after=30))
+
+    assert done == 2  # noqa: PLR2004
+    session.expire_all()
+    assert session.get(User, verified.id).cpf_status == CpfStatus.verified
+    assert session.get(User, rejected.id).cpf_status == CpfStatus.rejected
+    assert session.scalars(select(CpfVerificationJob)).all() == []
+
+
+@pytest.mark.usefixtures('_worker')
+def test_verify_cpfs_retries_failures_and_stops_on_open_breaker(session, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'CPF_VERIFICATION_CONCURRENCY', 1)
+    monkeypatch.setattr(get_settings(), 'CPF_VERIFICATION_BATCH_SIZE', 2)
+    add_pending_users(session, ['01303175002', '52998224725', '11144477735', '39053344705'])
+    validator = FakeValidator(down=True)
+    breaker = CircuitBreaker(threshold=2, reset_after=30)
+
+    done = verify_cpfs(validator, breaker)
+
+    assert done == 0
+    assert breaker.is_open
+    assert len(validator.calls) == 2  # noqa: PLR2004
+    jobs = session.scalars(select(CpfVerificationJob).order_by(CpfVerificationJob.id)).all()
+    assert [job.attempts for job in jobs] == [1, 1, 0, 0]
+    assert jobs[0].last_error == 'validator is down'
+    assert session.scalars(select(User.cpf_status)).all() == [CpfStatus.pending] * 4
+
+
+def test_rejected_user_is_blocked(client, session, user, token):
+    refresh_token = client.post(
+        '/auth/token', data={'username': user.username, 'password': user.clean_password}
+    ).json()['refresh_token']
+    session.execute(update(User).values(cpf_status=CpfStatus.rejected))
+    session.commit()
+
+    responses = [
+        client.get('/todos/', headers={'Authorization': f'Bearer {token}'}),
+        client.post('/auth/token', data={'username': user.username, 'password': user.clean_password}),
+        client.post('/auth/refresh', json={'refresh_token': refresh_token}),
+    ]
+
+    assert [response.status_code for response in responses] == [HTTPStatus.FORBIDDEN] * 3
+    assert all(response.json() == {'detail': 'Invalid CPF'} for response in responses)
+
+
+def test_validator_is_configurable(monkeypatch):
+    monkeypatch.setattr(get_settings(), 'CPF_VALIDATOR_URL', 'checksum:')
+    get_cpf_validator.cache_clear()
+
+    assert isinstance(get_cpf_validator(), ChecksumCpfValidator)
+    get_cpf_validator.cache_clear()
@@ -1,6 +1,9 @@
-from sqlalchemy import select
+import re
 
-from app.models import User
+from sqlalchemy import insert, select, text
+
+from app.models import TODO_PARTITIONS, Todo, TodoState, User
+from app.queries import LAST_POSITION, TODO_BY_ID, list_todos_query
 
 
 def test_create_user(session):
@@ -10,3 +13,54 @@ def test_create_user(session):
     result = session.scalar(select(User).where(User.email == 'paulo@gmail.com'))
 
     assert result.id == 1
+
+
+def test_todos_are_hash_partitioned_by_user(session):
+    partitions = session.scalar(
+        text("SELECT count(*) FROM pg_inherits WHERE inhparent = 'todos'::regclass")
+    )
+
+    assert partitions == TODO_PARTITIONS
+
+
+def test_per_user_queries_scan_a_single_partition(session):
+    statements = [
+        TODO_BY_ID.params(user_id=1, todo_id=1),
+        LAST_POSITION.params(user_id=1),
+        list_todos_query(True, False, True).params(
+            user_id=1, title='a', state='todo', offset=0, limit=10
+        ),
+    ]
+
+    for statement in statements:
+        compiled = statement.compile(session.bind)
+        rows = session.connection().exec_driver_sql(f'EXPLAIN {compiled}', compiled.params)
+        plan = '\n'.join(row[0] for row in rows)
+
+        assert len(set(re.findall(r'todos_p\d+', plan))) == 1, plan
+
+
+def test_tag_filters_use_the_gin_index(session, user):
+    rows = [
+        {
+            'title': 'Todo',
+            'description': 'Todo',
+            'state': TodoState.todo,
+            'user_id': user.id,
+            'position': f'{n:08x}',
+            'tags': ['rare'] if n == 0 else ['common'],
+        }
+        for n in range(2000)
+    ]
+    session.execute(insert(Todo), rows)
+    session.execute(text('ANALYZE todos'))
+
+    for match in ('any', 'all'):
+        statement = list_todos_query(False, False, False, tags=match).params(
+            user_id=user.id, tags=['rare'], offset=0, limit=10
+        )
+        compiled = statement.compile(session.bind)
+        rows = session.connection().exec_driver_sql(f'EXPLAIN {compiled}', compiled.params)
+        plan = '\n'.join(row[0] for row in rows)
+
+        assert re.search(r'Bitmap Index Scan on todos_p\d+_tags_idx', plan), plan
@@ -0,0 +1,35 @@
+from http import HTTPStatus
+
+from app.app import app
+from app.database import warm_up_pool
+
+
+def test_liveness(client):
+    response = client.get('/health/live')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'message': 'alive'}
+
+
+def test_readiness(client):
+    response = client.get('/health/ready')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'message': 'ready'}
+
+
+def test_readiness_while_warming_up(client):
+    app.state.ready = False
+
+    response = client.get('/health/ready')
+
+    app.state.ready = True
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert response.json() == {'detail': 'Warming up'}
+
+
+def test_warm_up_pool(engine):
+    connections = 3
+
+    assert warm_up_pool(engine, connections) == connections
+    assert engine.pool.checkedin() >= connections
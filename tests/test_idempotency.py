@@ -0,0 +1,175 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.cpf import get_cpf_validator
+from app.idempotency import REPLAYED_HEADER, IdempotencyClaim, LeaseLost, claim_key
+from app.models import IdempotencyKey, Todo, User
+from app.settings import get_settings
+from app.workers import purge_expired_idempotency_keys
+from tests.conftest import TodoFactory
+
+TODO = {'title': 'Test todo', 'description': 'Test todo description', 'state': 'draft'}
+
+
+def test_retried_create_todo_is_replayed(session, client, token):
+    headers = {'Authorization': f'Bearer {token}', 'Idempotency-Key': 'create-1'}
+
+    first = client.post('/todos/', json=TODO, headers=headers)
+    second = client.post('/todos/', json=TODO, headers=headers)
+
+    assert first.status_code == second.status_code == HTTPStatus.OK
+    assert second.json() == first.json()
+    assert REPLAYED_HEADER not in first.headers
+    assert second.headers[REPLAYED_HEADER] == 'true'
+    assert session.scalar(select(func.count()).select_from(Todo)) == 1
+
+
+def test_requests_without_key_are_not_deduplicated(session, client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    client.post('/todos/', json=TODO, headers=headers)
+    client.post('/todos/', json=TODO, headers=headers)
+
+    assert session.scalar(select(func.count()).select_from(Todo)) == 2  # noqa: PLR2004
+
+
+def test_key_reused_with_different_request(client, token):
+    headers = {'Authorization': f'Bearer {token}', 'Idempotency-Key': 'create-1'}
+
+    client.post('/todos/', json=TODO, headers=headers)
+    response = client.post('/todos/', json={**TODO, 'title': 'Other'}, headers=headers)
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert response.json() == {'detail': 'Idempotency-Key was already used with a different request'}
+
+
+def test_failed_request_releases_key(session, client, token):
+    headers = {'Authorization': f'Bearer {token}', 'Idempotency-Key': 'patch-1'}
+
+    response = client.patch('/todos/10', json={}, headers=headers)
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert session.scalar(select(func.count()).select_from(IdempotencyKey)) == 0
+
+
+def test_concurrent_duplicate_gets_conflict(session, client, user, token, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'IDEMPOTENCY_WAIT_SECONDS', 0.1)
+    body = json.dumps(TODO).encode()
+    session.add(
+        IdempotencyKey(
+            scope=user.email,
+            key='in-progress',
+            fingerprint=hashlib.sha256(b'\n'.join([b'POST', b'/todos/', body])).hexdigest(),
+            expires_at=datetime(2100, 1, 1),
+            locked_until=datetime(2100, 1, 1),
+        )
+    )
+    session.commit()
+
+    response = client.post(
+        '/todos/',
+        content=body,
+        headers={
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json',
+            'Idempotency-Key': 'in-progress',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert response.json() == {'detail': 'A request with this Idempotency-Key is in progress'}
+
+
+def test_retry_takes_over_the_key_of_a_crashed_request(session, client, user, token):
+    headers = {'Authorization': f'Bearer {token}', 'Idempotency-Key': 'crashed'}
+    body = json.dumps(TODO).encode()
+    fingerprint = hashlib.sha256(b'\n'.join([b'POST', b'/todos/', body])).hexdigest()
+    # Left by a worker that died before storing the response.
+    claim_key(session, user.email, 'crashed', fingerprint, owner='crashed-worker')
+    session.execute(update(IdempotencyKey).values(locked_until=datetime(2020, 1, 1)))
+    session.commit()
+
+    response = client.post('/todos/', json=TODO, headers=headers)
+    retry = client.post('/todos/', json=TODO, headers=headers)
+
+    assert response.status_code == HTTPStatus.OK
+    assert retry.headers[REPLAYED_HEADER] == 'true'
+    assert session.scalar(select(func.count()).select_from(IdempotencyKey)) == 1
+
+
+def test_request_failing_after_commit_is_never_run_again(session, client, token, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('crashed')
+
+    # `create_todo` refreshes the todo after committing it.
+    monkeypatch.setattr(Session, 'refresh', fail)
+    headers = {'Authorization': f'Bearer {token}', 'Idempotency-Key': 'create-1'}
+
+    with pytest.raises(RuntimeError):
+        client.post('/todos/', json=TODO, headers=headers)
+    monkeypatch.undo()
+    session.execute(update(IdempotencyKey).values(locked_until=datetime(2020, 1, 1)))
+    session.commit()
+
+    retry = client.post('/todos/', json=TODO, headers=headers)
+
+    assert retry.status_code == HTTPStatus.CONFLICT
+    assert retry.json() == {'detail': 'A request with this Idempotency-Key was already applied'}
+    assert session.scalar(select(IdempotencyKey.committed_at)) is not None
+    assert session.scalar(select(func.count()).select_from(Todo)) == 1
+
+
+def test_request_whose_key_was_taken_over_cannot_commit(session, engine, user):
+    record_id = claim_key(session, user.email, 'slow', 'fingerprint', owner='slow-worker')
+    # The lease of the slow request ended and a retry took the key over.
+    session.execute(update(IdempotencyKey).values(owner='retry'))
+    session.commit()
+
+    with Session(engine) as slow_session:
+        claim = IdempotencyClaim(slow_session, record_id, 'slow-worker', 'slow')
+        claim.attach()
+        slow_session.add(TodoFactory(user_id=user.id))
+
+        with pytest.raises(LeaseLost):
+            slow_session.commit()
+
+    assert session.scalar(select(func.count()).select_from(Todo)) == 0
+
+
+def test_anonymous_keys_are_scoped_by_client_ip(client, session, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'CPF_VALIDATOR_URL', 'checksum:')
+    monkeypatch.setattr(get_settings(), 'RATE_LIMIT_TRUST_FORWARDED', True)
+    get_cpf_validator.cache_clear()
+    users = [
+        {'username': name, 'email': f'{name}@example.com', 'password': 'secret11', 'cpf': cpf}
+        for name, cpf in [('alice', '01303175002'), ('bob', '52998224725')]
+    ]
+
+    responses = [
+        client.post('/users/', json=user, headers={'Idempotency-Key': 'signup', 'X-Real-IP': ip})
+        for user, ip in zip(users, ['10.0.0.1', '10.0.0.2'])
+    ]
+    get_cpf_validator.cache_clear()
+
+    assert [response.status_code for response in responses] == [HTTPStatus.CREATED] * 2
+    assert session.scalar(select(func.count()).select_from(User)) == 2  # noqa: PLR2004
+
+
+def test_purge_expired_idempotency_keys(session):
+    session.add(
+        IdempotencyKey(
+            scope='anonymous',
+            key='old',
+            fingerprint='x',
+            expires_at=datetime(2020, 1, 1) + timedelta(days=1),
+        )
+    )
+    session.commit()
+
+    assert purge_expired_idempotency_keys(session) == 1
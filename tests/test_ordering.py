@@ -0,0 +1,61 @@
+import random
+
+import pytest
+from sqlalchemy import select
+
+from app.models import Todo
+from app.ordering import position_between, rebalance_positions, spread_positions
+from tests.conftest import TodoFactory
+
+
+def test_position_between_keeps_the_order():
+    positions = [position_between(None, None)]
+
+    for _ in range(1000):
+        index = random.randint(0, len(positions))
+        before = positions[index - 1] if index else None
+        after = positions[index] if index < len(positions) else None
+        positions.insert(index, position_between(before, after))
+
+    assert positions == sorted(positions)
+    assert len(set(positions)) == len(positions)
+    assert not any(position.endswith('0') for position in positions)
+
+
+def test_appended_positions_stay_short():
+    position = None
+    for _ in range(100):
+        position = position_between(position, None)
+
+    assert len(position) <= 5  # noqa: PLR2004
+
+
+def test_position_between_rejects_unordered_neighbors():
+    with pytest.raises(ValueError, match='does not sort before'):
+        position_between('b', 'a')
+
+
+@pytest.mark.parametrize('count', [0, 1, 2, 61, 62, 1000])
+def test_spread_positions(count):
+    positions = spread_positions(count)
+
+    assert len(set(positions)) == count
+    assert positions == sorted(positions)
+    assert not any(position.endswith('0') for position in positions)
+
+
+def test_rebalance_positions(session, user):
+    session.add_all([
+        TodoFactory(user_id=user.id, position='zzzzzzzzzzV'),
+        TodoFactory(user_id=user.id, position='V'),
+        TodoFactory(user_id=user.id, position='zzzzzzzzzzzzzzzzV'),
+    ])
+    session.commit()
+    order = session.scalars(select(Todo.id).order_by(Todo.position)).all()
+
+    assert rebalance_positions(session, user.id) == 3  # noqa: PLR2004
+    session.commit()
+
+    todos = session.execute(select(Todo.id, Todo.position).order_by(Todo.position)).all()
+    assert [todo.id for todo in todos] == order
+    assert all(len(todo.position) <= 2 for todo in todos)  # noqa: PLR2004
@@ -0,0 +1,162 @@
+import json
+
+import pytest
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.models import OutboxEvent
+from app.outbox import FileSink, HttpSink, dispatch_batch, record_event, sink_from_url
+from app.settings import get_settings
+
+
+@pytest.fixture
+def _outbox(monkeypatch):
+    monkeypatch.setattr(get_settings(), 'OUTBOX_ENABLED', True)
+
+
+class FailingSink:
+    @staticmethod
+    def send(messages):
+        raise ConnectionError('sink is down')
+
+
+class PoisonedSink(FileSink):
+    def __init__(self, path, poisoned_id):
+        super().__init__(path)
+        self.poisoned_id = poisoned_id
+
+    def send(self, messages):
+        if any(message['aggregate_id'] == self.poisoned_id for message in messages):
+            raise ValueError('sink rejected the event')
+        super().send(messages)
+
+
+def add_events(session, count):
+    for index in range(count):
+        record_event(session, 'todo.created', index, {'id': index})
+    session.commit()
+
+
+def test_record_event_is_disabled_by_default(session):
+    add_events(session, 1)
+
+    assert session.scalars(select(OutboxEvent)).all() == []
+
+
+@pytest.mark.usefixtures('_outbox')
+def test_todo_changes_record_events(client, session, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    todo = client.post(
+        '/todos/', headers=headers, json={'title': 'a', 'description': 'b', 'state': 'todo'}
+    )
+    todo_id = todo.json()['id']
+    client.patch(f'/todos/{todo_id}', headers=headers, json={'title': 'c'})
+    client.delete(f'/todos/{todo_id}', headers=headers)
+
+    events = session.scalars(select(OutboxEvent).order_by(OutboxEvent.id)).all()
+
+    assert [event.event_type for event in events] == ['todo.created', 'todo.updated', 'todo.deleted']
+    assert {event.aggregate_id for event in events} == {todo_id}
+    assert events[0].payload['title'] == 'a'
+    assert events[1].payload['changes'] == {'title': 'c'}
+
+
+@pytest.mark.usefixtures('_outbox')
+def test_rolled_back_changes_record_no_events(session):
+    record_event(session, 'todo.created', 1, {'id': 1})
+    session.rollback()
+
+    assert session.scalars(select(OutboxEvent)).all() == []
+
+
+@pytest.mark.usefixtures('_outbox')
+def test_dispatch_batch_delivers_pending_events_in_order(session, tmp_path):
+    add_events(session, 3)
+    sink = FileSink(tmp_path / 'events.jsonl')
+
+    assert dispatch_batch(session, sink, batch_size=2) == 2  # noqa: PLR2004
+    assert dispatch_batch(session, sink, batch_size=2) == 1
+    assert dispatch_batch(session, sink, batch_size=2) == 0
+
+    lines = (tmp_path / 'events.jsonl').read_text().splitlines()
+    assert [json.loads(line)['aggregate_id'] for line in lines] == [0, 1, 2]
+    assert session.scalars(select(OutboxEvent).where(OutboxEvent.dispatched_at.is_(None))).all() == []
+
+
+@pytest.mark.usefixtures('_outbox')
+def test_failed_delivery_keeps_events_pending(session):
+    add_events(session, 2)
+
+    with pytest.raises(ConnectionError, match='sink is down'):
+        dispatch_batch(session, FailingSink(), batch_size=10)
+
+    events = session.scalars(select(OutboxEvent)).all()
+    assert [(event.attempts, event.dispatched_at) for event in events] == [(1, None), (1, None)]
+
+
+@pytest.mark.usefixtures('_outbox')
+def test_failed_events_are_retried_after_a_backoff(session):
+    add_events(session, 1)
+
+    with pytest.raises(ConnectionError):
+        dispatch_batch(session, FailingSink(), batch_size=10)
+
+    assert dispatch_batch(session, FailingSink(), batch_size=10) == 0
+    event = session.scalar(select(OutboxEvent))
+    assert event.next_attempt_at > event.created_at
+    assert event.last_error == 'sink is down'
+
+
+@pytest.mark.usefixtures('_outbox')
+def test_poisoned_event_does_not_block_later_events(session, tmp_path):
+    add_events(session, 3)
+    sink = PoisonedSink(tmp_path / 'events.jsonl', poisoned_id=1)
+
+    assert dispatch_batch(session, sink, batch_size=10) == 2  # noqa: PLR2004
+
+    lines = (tmp_path / 'events.jsonl').read_text().splitlines()
+    assert [json.loads(line)['aggregate_id'] for line in lines] == [0, 2]
+    events = session.scalars(select(OutboxEvent).order_by(OutboxEvent.id)).all()
+    assert [event.dispatched_at is not None for event in events] == [True, False, True]
+    assert events[1].attempts == 1
+
+
+@pytest.mark.usefixtures('_outbox')
+def test_event_is_dead_lettered_after_max_attempts(session, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'OUTBOX_MAX_ATTEMPTS', 2)
+    add_events(session, 1)
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            dispatch_batch(session, FailingSink(), batch_size=10)
+        session.execute(update(OutboxEvent).values(next_attempt_at=func.now()))
+        session.commit()
+
+    assert dispatch_batch(session, FailingSink(), batch_size=10) == 0
+    event = session.scalar(select(OutboxEvent))
+    assert event.attempts == 2  # noqa: PLR2004
+    assert event.dead_lettered_at is not None
+
+
+@pytest.mark.usefixtures('_outbox')
+def test_dispatchers_skip_claimed_events(session, engine, tmp_path):
+    add_events(session, 3)
+
+    with Session(engine) as other:
+        other.scalars(
+            select(OutboxEvent).order_by(OutboxEvent.id).limit(2).with_for_update(skip_locked=True)
+        ).all()
+
+        sink = FileSink(tmp_path / 'events.jsonl')
+        assert dispatch_batch(session, sink, batch_size=10) == 1
+
+    lines = (tmp_path / 'events.jsonl').read_text().splitlines()
+    assert [json.loads(line)['aggregate_id'] for line in lines] == [2]
+
+
+def test_sink_from_url(tmp_path):
+    assert isinstance(sink_from_url(f'file://{tmp_path}/events.jsonl'), FileSink)
+    assert isinstance(sink_from_url('https://example.com/events'), HttpSink)
+
+    with pytest.raises(ValueError, match='Unsupported outbox sink'):
+        sink_from_url('ftp://example.com/events')
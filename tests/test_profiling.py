@@ -0,0 +1,139 @@
+import time
+from http import HTTPStatus
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.profiling import (
+    ProfileStore,
+    ProfilingMiddleware,
+    SamplingProfiler,
+    sign_profile_request,
+    verify_profile_request,
+)
+from app.routers import profiles
+
+SECRET = 'profiling-secret'
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def build_app(sample_rate=0.0):
+    app = FastAPI()
+    app.state.profiles = ProfileStore(size=2)
+    app.state.profile_secret = SECRET
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=app.state.profiles,
+        secret=SECRET,
+        sample_rate=sample_rate,
+        interval=0.001,
+    )
+    app.include_router(profiles.router)
+
+    @app.get('/slow')
+    def slow():
+        busy_loop(0.05)
+        return {'message': 'done'}
+
+    return app
+
+
+def signed_headers():
+    return {'X-Profile': sign_profile_request(SECRET, int(time.time()) + 60)}
+
+
+def test_verify_profile_request():
+    now = int(time.time())
+
+    assert verify_profile_request(SECRET, sign_profile_request(SECRET, now + 60))
+    assert not verify_profile_request(SECRET, sign_profile_request(SECRET, now - 1))
+    assert not verify_profile_request(SECRET, sign_profile_request('other', now + 60))
+    assert not verify_profile_request(SECRET, 'garbage')
+    assert not verify_profile_request(SECRET, None)
+
+
+def test_sampling_profiler_collects_collapsed_stacks():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    busy_loop(0.05)
+    profile = profiler.stop()
+
+    stack, count = profile.splitlines()[0].rsplit(' ', 1)
+    assert stack.startswith('MainThread;')
+    assert 'tests.test_profiling:busy_loop' in profile
+    assert int(count) > 0
+
+
+def test_signed_request_is_profiled():
+    app = build_app()
+    client = TestClient(app)
+
+    response = client.get('/slow', headers=signed_headers())
+
+    assert response.status_code == HTTPStatus.OK
+    assert 'tests.test_profiling:busy_loop' in app.state.profiles.get(response.headers['X-Profile-Id'])
+
+
+def test_unsigned_request_is_not_profiled():
+    client = TestClient(build_app())
+
+    response = client.get('/slow', headers={'X-Profile': '123.abc'})
+
+    assert 'X-Profile-Id' not in response.headers
+
+
+def test_profile_id_is_generated_by_the_server():
+    app = build_app(sample_rate=1.0)
+    client = TestClient(app)
+    client.get('/slow', headers={'X-Request-ID': 'req-1'})
+
+    response = client.get('/slow', headers={'X-Request-ID': 'req-1'})
+
+    profile_id = response.headers['X-Profile-Id']
+    assert profile_id != 'req-1'
+    assert app.state.profiles.get('req-1') is None
+    assert app.state.profiles.get(profile_id) is not None
+
+
+def test_profile_store_keeps_the_latest_profiles():
+    store = ProfileStore(size=2)
+
+    for profile_id in ('a', 'b', 'c'):
+        store.add(profile_id, profile_id)
+
+    assert store.get('a') is None
+    assert store.get('c') == 'c'
+
+
+def test_read_profile():
+    client = TestClient(build_app())
+    profile_id = client.get('/slow', headers=signed_headers()).headers['X-Profile-Id']
+
+    response = client.get(f'/profiles/{profile_id}', headers=signed_headers())
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['Content-Type'].startswith('text/plain')
+    assert 'tests.test_profiling:busy_loop' in response.text
+
+
+def test_read_profile_requires_signature():
+    client = TestClient(build_app())
+
+    response = client.get('/profiles/abc')
+
+    assert response.status_code == HTTPStatus.FORBIDDEN
+    assert response.json() == {'detail': 'Invalid profile signature'}
+
+
+def test_read_profile_not_found():
+    client = TestClient(build_app())
+
+    response = client.get('/profiles/missing', headers=signed_headers())
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Profile not found'}
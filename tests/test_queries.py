@@ -0,0 +1,12 @@
+from app.queries import list_todos_query
+
+
+def test_list_todos_query_is_built_once_per_filter_combination():
+    assert list_todos_query(True, False, True) is list_todos_query(True, False, True)
+    assert list_todos_query(True, False, True) is not list_todos_query(False, False, True)
+    assert list_todos_query(False, False, False, ('id', 'title')) is list_todos_query(
+        False, False, False, ('id', 'title')
+    )
+    assert list_todos_query(False, False, False, tags='any') is not list_todos_query(
+        False, False, False, tags='all'
+    )
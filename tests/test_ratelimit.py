@@ -0,0 +1,124 @@
+from http import HTTPStatus
+
+import pytest
+
+from app.app import app
+from app.ratelimit import MemoryBackend, Rate, RateLimiter, RedisBackend, refill
+
+
+class FakeRedis:
+    """
+    Local stand-in for a Redis client: answers `eval` with `refill` on an in-memory dict,
+    without running TOKEN_BUCKET_SCRIPT. The script itself is tested against fakeredis.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.hashes = {}
+
+    def eval(self, script, numkeys, key, *args):
+        capacity, per_second, cost = args
+        rate = Rate(capacity=capacity, per_second=per_second)
+        tokens, timestamp = self.hashes.get(key, (capacity, self.now))
+        tokens, wait = refill(tokens, self.now - timestamp, rate, cost)
+        self.hashes[key] = (tokens, self.now)
+        return str(wait).encode()
+
+
+def test_rate_parse():
+    rate = Rate.parse('30/minute')
+
+    assert rate.capacity == 30  # noqa: PLR2004
+    assert rate.per_second == pytest.approx(0.5)
+
+
+def test_memory_backend_refills_over_time():
+    now = [0.0]
+    backend = MemoryBackend(clock=lambda: now[0])
+    rate = Rate.parse('2/second')
+
+    assert backend.consume('key', rate) == 0
+    assert backend.consume('key', rate) == 0
+    assert backend.consume('key', rate) == pytest.approx(0.5)
+
+    now[0] = 0.5
+    assert backend.consume('key', rate) == 0
+
+
+def test_memory_backend_sweeps_refilled_buckets():
+    now = [0.0]
+    backend = MemoryBackend(clock=lambda: now[0], sweep_interval=10)
+    rate = Rate.parse('6/minute')
+
+    for username in ('alice', 'bob', 'carol'):
+        backend.consume(username, rate)
+    now[0] = 30
+    backend.consume('dave', rate)
+    assert len(backend) == 4  # noqa: PLR2004
+
+    now[0] = 61
+    backend.consume('erin', rate)
+    assert len(backend) == 2  # noqa: PLR2004
+
+
+def test_denied_ip_does_not_charge_the_user_bucket():
+    limiter = RateLimiter(MemoryBackend(), {'auth': '1/minute'}, {'auth': '1/minute'})
+
+    assert limiter.check('auth', '10.0.0.66', 'mallory') == 0
+    for _ in range(3):
+        assert limiter.check('auth', '10.0.0.66', 'alice') > 0
+
+    assert limiter.check('auth', '10.0.0.1', 'alice') == 0
+
+
+def test_redis_backend_is_shared_between_replicas():
+    redis = FakeRedis()
+    api01 = RateLimiter(RedisBackend(redis), {'todo': '2/minute'}, {})
+    api02 = RateLimiter(RedisBackend(redis), {'todo': '2/minute'}, {})
+
+    assert api01.check('todo', '10.0.0.1', None) == 0
+    assert api02.check('todo', '10.0.0.1', None) == 0
+    assert api01.check('todo', '10.0.0.1', None) == pytest.approx(30)
+    assert api02.check('todo', '10.0.0.2', None) == 0
+
+
+def test_rate_limit_returns_429_with_retry_after(client, token):
+    app.state.rate_limiter = RateLimiter(MemoryBackend(), {'todo': '1/minute'}, {})
+
+    response = client.get('/todos/', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == HTTPStatus.OK
+
+    response = client.get('/todos/', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert response.headers['Retry-After'] == '60'
+    assert response.json() == {'detail': 'Too many requests'}
+
+
+def test_login_is_throttled_per_username(client, user):
+    app.state.rate_limiter = RateLimiter(MemoryBackend(), {}, {'auth': '2/minute'})
+    form = {'username': user.username, 'password': 'wrong password'}
+
+    for _ in range(2):
+        assert client.post('/auth/token', data=form).status_code == HTTPStatus.BAD_REQUEST
+
+    response = client.post('/auth/token', data=form)
+    assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+
+    response = client.post('/auth/token', data={**form, 'username': 'someone-else'})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_token_bucket_script():
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa', reason='fakeredis needs lupa to run Lua scripts')
+    client = fakeredis.FakeRedis()
+    backend = RedisBackend(client)
+    rate = Rate.parse('2/minute')
+
+    assert backend.consume('todo:10.0.0.1', rate) == 0
+    assert backend.consume('todo:10.0.0.1', rate) == 0
+    assert backend.consume('todo:10.0.0.1', rate) == pytest.approx(30, abs=1)
+    assert backend.consume('todo:10.0.0.2', rate) == 0
+
+    assert float(client.hget('todo:10.0.0.1', 'tokens')) == pytest.approx(0, abs=0.1)
+    assert 0 < client.pttl('todo:10.0.0.1') <= 60_000  # noqa: PLR2004
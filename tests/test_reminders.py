@@ -0,0 +1,151 @@
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.orm import Session
+
+from app.models import Todo, TodoState
+from app.reminders import DUE_REMINDERS, REMINDER_LOCK_ID, remind, send_reminders
+from app.settings import get_settings
+from tests.conftest import TodoFactory
+
+LEAD = timedelta(minutes=15)
+OVERDUE = datetime(2020, 1, 1)
+FAR_AHEAD = datetime(2100, 1, 1)
+
+
+class ListSink:
+    def __init__(self):
+        self.messages = []
+
+    def send(self, messages):
+        self.messages.extend(messages)
+
+
+class FailingSink:
+    @staticmethod
+    def send(messages):
+        raise ConnectionError('sink is down')
+
+
+@pytest.fixture
+def _scheduler(monkeypatch, engine):
+    monkeypatch.setattr('app.reminders.get_engine', lambda: engine)
+
+
+def add_todos(session, user, *todos):
+    todos = [TodoFactory(user_id=user.id, **values) for values in todos]
+    session.add_all(todos)
+    session.commit()
+    return todos
+
+
+def test_send_reminders_of_due_undone_todos(session, user):
+    due, _, _, _ = add_todos(
+        session,
+        user,
+        {'due_at': OVERDUE, 'state': TodoState.todo},
+        {'due_at': OVERDUE, 'state': TodoState.done},
+        {'due_at': FAR_AHEAD, 'state': TodoState.todo},
+        {'state': TodoState.todo},
+    )
+    version = due.version
+    sink = ListSink()
+
+    assert send_reminders(session, sink, LEAD, batch_size=10) == 1
+    assert send_reminders(session, sink, LEAD, batch_size=10) == 0
+
+    assert sink.messages == [
+        {
+            'type': 'todo.due',
+            'todo_id': due.id,
+            'user_id': user.id,
+            'title': due.title,
+            'due_at': OVERDUE.isoformat(),
+        }
+    ]
+    session.refresh(due)
+    assert due.reminded_at is not None
+    assert due.version == version
+
+
+def test_rescheduled_todos_are_reminded_again(session, client, user, token):
+    (todo,) = add_todos(session, user, {'due_at': OVERDUE, 'state': TodoState.todo})
+    sink = ListSink()
+    send_reminders(session, sink, LEAD, batch_size=10)
+
+    response = client.patch(
+        f'/todos/{todo.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'due_at': '2020-01-02T00:00:00'},
+    )
+    assert response.json()['due_at'] == '2020-01-02T00:00:00'
+
+    assert send_reminders(session, sink, LEAD, batch_size=10) == 1
+    assert [message['due_at'] for message in sink.messages] == [
+        OVERDUE.isoformat(),
+        '2020-01-02T00:00:00',
+    ]
+
+
+def test_failed_send_keeps_reminders_pending(session, user):
+    add_todos(session, user, {'due_at': OVERDUE, 'state': TodoState.todo})
+
+    with pytest.raises(ConnectionError, match='sink is down'):
+        send_reminders(session, FailingSink(), LEAD, batch_size=10)
+
+    assert send_reminders(session, ListSink(), LEAD, batch_size=10) == 1
+
+
+def test_only_the_lock_holder_scans(session, engine, user):
+    add_todos(session, user, {'due_at': OVERDUE, 'state': TodoState.todo})
+    sink = ListSink()
+
+    with Session(engine) as other:
+        other.execute(select(func.pg_advisory_xact_lock(REMINDER_LOCK_ID)))
+
+        assert send_reminders(session, sink, LEAD, batch_size=10) is None
+
+    assert sink.messages == []
+    assert send_reminders(session, sink, LEAD, batch_size=10) == 1
+
+
+@pytest.mark.usefixtures('_scheduler')
+def test_remind_sends_in_batches(session, user, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'REMINDER_BATCH_SIZE', 2)
+    add_todos(
+        session, user, *({'due_at': OVERDUE + timedelta(days=day), 'state': 'todo'} for day in range(3))
+    )
+    sink = ListSink()
+
+    assert remind(sink) == 3  # noqa: PLR2004
+    assert [message['due_at'][:10] for message in sink.messages] == [
+        '2020-01-01',
+        '2020-01-02',
+        '2020-01-03',
+    ]
+
+
+def test_due_reminders_use_the_partial_index(session, user):
+    rows = [
+        {
+            'title': 'Todo',
+            'description': 'Todo',
+            'state': TodoState.todo,
+            'user_id': user.id,
+            'position': f'{n:08x}',
+            'due_at': OVERDUE if n == 0 else None,
+        }
+        for n in range(2000)
+    ]
+    session.execute(insert(Todo), rows)
+    session.execute(text('ANALYZE todos'))
+
+    compiled = DUE_REMINDERS.params(lead=LEAD, batch_size=100).compile(session.bind)
+    plan = '\n'.join(
+        row[0] for row in session.connection().exec_driver_sql(f'EXPLAIN {compiled}', compiled.params)
+    )
+
+    # The empty partitions are read with a seq scan of no pages, the user's one with the index.
+    assert re.search(r'Index Scan using todos_p\d+_due_at_idx', plan), plan
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app.models import RevokedToken
+from app.revocation import (
+    REVOCATION_CHANNEL,
+    BloomFilter,
+    RevocationCache,
+    listen_for_revocations,
+)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [f'token-{index}' for index in range(1000)]
+
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for index in range(1000):
+        bloom.add(f'token-{index}')
+
+    false_positives = sum(f'other-{index}' in bloom for index in range(10_000))
+
+    assert false_positives < 300  # noqa: PLR2004
+
+
+def test_is_revoked_only_queries_filter_hits(session):
+    session.add(RevokedToken(token_id='revoked', expires_at=datetime.now() + timedelta(minutes=5)))
+    session.commit()
+    cache = RevocationCache(capacity=100)
+
+    assert not cache.is_revoked(session, 'revoked')
+
+    cache.refresh(session)
+
+    assert cache.is_revoked(session, 'other', 'revoked')
+    assert not cache.is_revoked(session, 'other', None)
+
+
+def test_filter_hit_is_confirmed_in_the_database(session):
+    cache = RevocationCache(capacity=100)
+    cache.add('not-stored')
+
+    assert not cache.is_revoked(session, 'not-stored')
+
+
+def test_refresh_drops_expired_revocations(session):
+    session.add(RevokedToken(token_id='expired', expires_at=datetime(2020, 1, 1)))
+    session.commit()
+    cache = RevocationCache(capacity=100)
+
+    assert cache.refresh(session) == 0
+    assert 'expired' not in cache._filter
+
+
+def test_listener_adds_notified_ids(monkeypatch, engine, session):
+    cache = RevocationCache(capacity=100)
+    monkeypatch.setattr('app.revocation.get_engine', lambda: engine)
+    monkeypatch.setattr('app.revocation.get_revocations', lambda: cache)
+
+    async def notify_until_received():
+        listener = asyncio.create_task(listen_for_revocations())
+        deadline = time.monotonic() + 10
+
+        while 'revoked' not in cache._filter and time.monotonic() < deadline:
+            session.execute(select(func.pg_notify(REVOCATION_CHANNEL, 'revoked')))
+            session.commit()
+            await asyncio.sleep(0.05)
+
+        listener.cancel()
+
+    asyncio.run(notify_until_received())
+
+    assert 'revoked' in cache._filter
@@ -4,13 +4,15 @@ import pytest
 from fastapi import HTTPException
 from jwt import decode
 
-from app.security import create_access_token, get_current_user, settings
+from app.security import create_access_token, get_current_user
+from app.settings import get_settings
 
 
 def test_jwt():
     data = {'sub': 'test@test.com'}
     token = create_access_token(data=data)
 
+    settings = get_settings()
     result = decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
 
     assert result['sub'] == data['sub']
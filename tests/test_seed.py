@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import func, select
+
+from app.models import Todo, TodoState, User
+from app.security import get_password_hash, verify_password
+from app.seed import (
+    cpf,
+    foreign_key_deferred,
+    parse_states,
+    positive_int,
+    seed_todos,
+    seed_users,
+    todos_per_user,
+)
+
+
+def test_parse_states():
+    assert parse_states('todo=30, done=70') == {TodoState.todo: 30, TodoState.done: 70}
+
+
+@pytest.mark.parametrize('value', ['todo=30,late=70', 'todo=-1,done=2', 'todo=0', 'todo'])
+def test_parse_states_invalid(value):
+    with pytest.raises(ValueError):  # noqa: PT011
+        parse_states(value)
+
+
+@pytest.mark.parametrize('value', ['0', '-3', 'many'])
+def test_positive_int_invalid(value):
+    with pytest.raises(ValueError):  # noqa: PT011
+        positive_int(value)
+
+
+@pytest.mark.parametrize('distribution', ['uniform', 'zipf'])
+def test_todos_per_user_sums_to_todos(distribution):
+    counts = todos_per_user(100, 10_007, distribution)
+
+    assert len(counts) == 100  # noqa: PLR2004
+    assert sum(counts) == 10_007  # noqa: PLR2004
+
+
+def test_todos_per_user_zipf_is_skewed():
+    counts = todos_per_user(1000, 100_000, 'zipf', skew=1.1)
+
+    assert counts == sorted(counts, reverse=True)
+    assert sum(counts[:10]) > sum(counts) / 3
+
+
+def test_cpf_has_valid_check_digits():
+    assert cpf(111444777) == '11144477735'
+    assert cpf(1) == '00000000191'
+
+
+def test_seed_users_and_todos(session):
+    password_hash = get_password_hash('secret')
+    user_ids = seed_users(session.get_bind(), 5, password_hash)
+    counts = dict(zip(user_ids, todos_per_user(5, 200, 'zipf')))
+
+    with foreign_key_deferred(session.get_bind()):
+        seeded = seed_todos(session.get_bind(), counts, {TodoState.todo: 1, TodoState.done: 1}, jobs=2)
+
+    assert seeded == 200  # noqa: PLR2004
+    per_user = dict(session.execute(select(Todo.user_id, func.count()).group_by(Todo.user_id)).all())
+    assert per_user == counts
+    assert session.scalar(select(func.count(func.distinct(Todo.state)))) == 2  # noqa: PLR2004
+    assert session.scalar(select(func.count(func.distinct(Todo.position)))) == max(counts.values())
+
+    user = session.scalar(select(User).where(User.id == user_ids[0]))
+    assert verify_password('secret', user.password)
+    # The sequence was moved past the copied ids.
+    session.add(User(username='next', email='next@example.com', password='x', cpf='1'))
+    session.commit()
+
+
+def test_seed_no_users(session):
+    assert seed_users(session.get_bind(), 0, 'hash') == range(1, 1)
+    assert session.scalar(select(func.count()).select_from(User)) == 0
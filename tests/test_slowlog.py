@@ -0,0 +1,152 @@
+import time
+from http import HTTPStatus
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+
+from app.app import app
+from app.settings import get_settings
+from app.slowlog import SlowQueryLog, SlowQueryRouteMiddleware, get_slow_query_log, redact
+
+SLEEP = text('SELECT pg_sleep(:seconds)')
+
+
+@pytest.fixture
+def logged_engine(engine):
+    # A separate engine, so the listeners don't outlive the test on the shared one.
+    logged_engine = create_engine(engine.url)
+    yield logged_engine
+    logged_engine.dispose()
+
+
+def wait_for_plan(query, timeout=5):
+    deadline = time.monotonic() + timeout
+    while query.plan is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return query.plan
+
+
+def test_redact_keeps_numbers_and_hides_strings():
+    parameters = {'user_id': 1, 'limit': None, 'email': 'paulo@gmail.com', 'ids': [1, 'a']}
+
+    assert redact(parameters) == {
+        'user_id': 1,
+        'limit': None,
+        'email': '<redacted str of length 15>',
+        'ids': [1, '<redacted str of length 1>'],
+    }
+
+
+def test_slow_select_is_recorded_with_its_plan(logged_engine):
+    slow_query_log = SlowQueryLog(size=10, threshold_ms=20)
+    slow_query_log.install(logged_engine)
+
+    with logged_engine.connect() as connection:
+        connection.execute(SLEEP, {'seconds': 0.03})
+        connection.execute(text('SELECT 1'))
+
+    [query] = slow_query_log.queries()
+    assert query.duration_ms >= 20  # noqa: PLR2004
+    assert query.parameters == {'seconds': 0.03}
+    assert 'pg_sleep' in query.statement
+    assert 'actual time' in wait_for_plan(query)
+
+
+def test_plan_literals_are_redacted(logged_engine):
+    slow_query_log = SlowQueryLog(size=10, threshold_ms=20)
+    slow_query_log.install(logged_engine)
+
+    with logged_engine.connect() as connection:
+        connection.execute(
+            text('SELECT pg_sleep(0.03) FROM generate_series(1, 1) AS n WHERE n::text <> :email'),
+            {'email': 'paulo@gmail.com'},
+        )
+
+    [query] = slow_query_log.queries()
+    plan = wait_for_plan(query)
+    assert "'<redacted>'" in plan
+    assert 'paulo' not in plan
+
+
+def test_failed_query_does_not_skew_the_next_durations(logged_engine):
+    slow_query_log = SlowQueryLog(size=10, threshold_ms=20, explain_sample_rate=0)
+    slow_query_log.install(logged_engine)
+
+    with logged_engine.connect() as connection:
+        with pytest.raises(DBAPIError):
+            connection.execute(text('SELECT 1 / 0'))
+        connection.rollback()
+        time.sleep(0.03)
+        connection.execute(text('SELECT 1'))
+
+        assert connection.info['query_started_at'] == []
+
+    assert slow_query_log.queries() == []
+
+
+def test_ring_buffer_keeps_the_latest_queries(logged_engine):
+    slow_query_log = SlowQueryLog(size=2, threshold_ms=5, explain_sample_rate=0)
+    slow_query_log.install(logged_engine)
+
+    with logged_engine.connect() as connection:
+        for seconds in (0.01, 0.011, 0.012):
+            connection.execute(SLEEP, {'seconds': seconds})
+
+    queries = slow_query_log.queries()
+    assert [query.parameters['seconds'] for query in queries] == [0.012, 0.011]
+    assert all(query.plan is None for query in queries)
+
+
+def test_slow_queries_know_their_route(logged_engine):
+    slow_query_log = SlowQueryLog(size=10, threshold_ms=5, explain_sample_rate=0)
+    slow_query_log.install(logged_engine)
+    slow_app = FastAPI()
+    slow_app.add_middleware(SlowQueryRouteMiddleware)
+
+    @slow_app.get('/slow')
+    def slow():
+        with logged_engine.connect() as connection:
+            connection.execute(SLEEP, {'seconds': 0.01})
+
+    TestClient(slow_app).get('/slow')
+
+    assert [query.route for query in slow_query_log.queries()] == ['GET /slow']
+
+
+@pytest.fixture
+def admin_client(client, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'ADMIN_TOKEN', 'admin-token')
+    return client
+
+
+def test_list_slow_queries(admin_client, logged_engine):
+    slow_query_log = SlowQueryLog(size=10, threshold_ms=5, explain_sample_rate=0)
+    slow_query_log.install(logged_engine)
+    with logged_engine.connect() as connection:
+        connection.execute(SLEEP, {'seconds': 0.01})
+    app.dependency_overrides[get_slow_query_log] = lambda: slow_query_log
+
+    response = admin_client.get('/admin/slow-queries', headers={'X-Admin-Token': 'admin-token'})
+
+    assert response.status_code == HTTPStatus.OK
+    [query] = response.json()['queries']
+    assert query['parameters'] == {'seconds': 0.01}
+    assert query['plan'] is None
+
+
+def test_list_slow_queries_when_disabled(admin_client):
+    response = admin_client.get('/admin/slow-queries', headers={'X-Admin-Token': 'admin-token'})
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Slow query log is disabled'}
+
+
+@pytest.mark.parametrize('headers', [{}, {'X-Admin-Token': 'wrong'}])
+def test_list_slow_queries_requires_the_admin_token(admin_client, headers):
+    response = admin_client.get('/admin/slow-queries', headers=headers)
+
+    assert response.status_code == HTTPStatus.FORBIDDEN
+    assert response.json() == {'detail': 'Invalid admin token'}
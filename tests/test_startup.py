@@ -0,0 +1,39 @@
+import subprocess
+import sys
+from pathlib import Path
+
+# Generous on purpose: the module checks below catch regressions, the budget only catches big ones.
+IMPORT_TIME_BUDGET_SECONDS = 2.5
+LAZY_MODULES = ('requests', 'psycopg', 'argon2')
+
+
+def import_app(code=''):
+    return subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import app.app\n{code}'],
+        cwd=Path(__file__).parents[1],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def test_import_time_budget():
+    result = import_app()
+
+    last_line = result.stderr.strip().splitlines()[-1]
+    _, cumulative, module = last_line.split('|')
+    assert module.strip() == 'app.app'
+    assert int(cumulative) / 1_000_000 < IMPORT_TIME_BUDGET_SECONDS
+
+
+def test_import_is_lazy():
+    result = import_app(
+        'import sys\n'
+        'from app.settings import get_settings\n'
+        'print(get_settings.cache_info().misses)\n'
+        f'print(*[module for module in {LAZY_MODULES!r} if module in sys.modules])\n'
+    )
+
+    settings_reads, loaded = result.stdout.splitlines()
+    assert settings_reads == '1'
+    assert not loaded
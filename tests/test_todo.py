@@ -1,6 +1,13 @@
+from datetime import datetime, timedelta
 from http import HTTPStatus
 
-from app.models import TodoState
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.models import PositionRebalance, Todo, TodoState
+from app.settings import get_settings
+from app.workers import archive_todos
 from tests.conftest import TodoFactory
 
 
@@ -161,3 +168,384 @@ def test_delete_todo_error(client, token):
 
     assert response.status_code == HTTPStatus.NOT_FOUND
     assert response.json() == {'detail': 'Task not found.'}
+
+
+def test_deleted_todo_is_only_listed_from_the_trash(session, client, user, token):
+    todo = TodoFactory(user_id=user.id, state=TodoState.todo)
+    session.add(todo)
+    session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    client.delete(f'/todos/{todo.id}', headers=headers)
+
+    assert client.get('/todos/', headers=headers).json()['todos'] == []
+    assert client.get('/todos/?state=todo', headers=headers).json()['todos'] == []
+    trash = client.get('/todos/?state=trash', headers=headers).json()['todos']
+    assert [trashed['id'] for trashed in trash] == [todo.id]
+
+
+def test_deleted_todo_cannot_be_changed(session, client, user, token):
+    todo = TodoFactory(user_id=user.id, state=TodoState.trash)
+    session.add(todo)
+    session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    responses = [
+        client.patch(f'/todos/{todo.id}', json={'state': 'todo'}, headers=headers),
+        client.delete(f'/todos/{todo.id}', headers=headers),
+    ]
+
+    assert [response.status_code for response in responses] == [HTTPStatus.NOT_FOUND] * 2
+    session.refresh(todo)
+    assert todo.state == TodoState.trash
+
+
+def test_list_todos_with_fields(session, client, user, token):
+    session.bulk_save_objects(TodoFactory.create_batch(2, user_id=user.id))
+    session.commit()
+
+    response = client.get(
+        '/todos/?fields=state,id,title',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    todos = response.json()['todos']
+    assert len(todos) == 2  # noqa: PLR2004
+    assert all(todo.keys() == {'id', 'title', 'state'} for todo in todos)
+
+
+def test_list_todos_with_invalid_fields(client, token):
+    response = client.get(
+        '/todos/?fields=title,password',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid fields: password'}
+
+
+def test_list_todo_changes(session, client, user, token):
+    session.bulk_save_objects(TodoFactory.create_batch(3, user_id=user.id))
+    session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.get('/todos/changes', headers=headers)
+    changes = response.json()
+    assert response.status_code == HTTPStatus.OK
+    assert len(changes['todos']) == 3  # noqa: PLR2004
+    assert changes['deleted'] == []
+    assert changes['has_more'] is False
+
+    todo_id = changes['todos'][0]['id']
+    client.patch(f'/todos/{todo_id}', json={'title': 'changed'}, headers=headers)
+
+    response = client.get(f'/todos/changes?since={changes["version"]}', headers=headers)
+    assert [todo['title'] for todo in response.json()['todos']] == ['changed']
+
+
+def test_list_todo_changes_reports_trashed_todos_as_deleted(session, client, user, token):
+    todo = TodoFactory(user_id=user.id)
+    session.add(todo)
+    session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+    version = client.get('/todos/changes', headers=headers).json()['version']
+
+    client.delete(f'/todos/{todo.id}', headers=headers)
+
+    changes = client.get(f'/todos/changes?since={version}', headers=headers).json()
+    assert changes['todos'] == []
+    assert changes['deleted'] == [todo.id]
+
+
+@pytest.mark.parametrize('query', ['since=-1', 'limit=0', 'limit=-1', 'limit=1001'])
+def test_list_todo_changes_with_invalid_cursor(client, token, query):
+    response = client.get(f'/todos/changes?{query}', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_list_todo_changes_pagination(session, client, user, token):
+    session.bulk_save_objects(TodoFactory.create_batch(3, user_id=user.id))
+    session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    first = client.get('/todos/changes?limit=2', headers=headers).json()
+    second = client.get(f'/todos/changes?limit=2&since={first["version"]}', headers=headers).json()
+
+    assert len(first['todos']) == 2  # noqa: PLR2004
+    assert first['has_more'] is True
+    assert len(second['todos']) == 1
+    assert second['has_more'] is False
+
+
+def test_list_todo_changes_waits_for_running_transactions(session, engine, client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    with Session(engine) as writer:
+        # Takes the lower version, then commits after the other write.
+        slow = TodoFactory(user_id=user.id, title='slow')
+        writer.add(slow)
+        writer.flush()
+        session.add(TodoFactory(user_id=user.id, title='fast'))
+        session.commit()
+
+        pending = client.get('/todos/changes', headers=headers).json()
+        writer.commit()
+
+    synced = client.get(f'/todos/changes?since={pending["version"]}', headers=headers).json()
+
+    assert pending['todos'] == []
+    assert pending['has_more'] is False
+    assert [todo['title'] for todo in synced['todos']] == ['slow', 'fast']
+
+
+def create_todos(client, headers, count):
+    return [
+        client.post(
+            '/todos/',
+            headers=headers,
+            json={'title': f'todo {index}', 'description': 'description', 'state': 'todo'},
+        ).json()['id']
+        for index in range(count)
+    ]
+
+
+def list_ids(client, headers):
+    return [todo['id'] for todo in client.get('/todos/', headers=headers).json()['todos']]
+
+
+def test_new_todos_are_appended(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    ids = create_todos(client, headers, 3)
+
+    assert list_ids(client, headers) == ids
+
+
+def test_move_todo_between_two_todos(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    first, second, third = create_todos(client, headers, 3)
+
+    response = client.patch(
+        f'/todos/{third}/move', headers=headers, json={'before_id': first, 'after_id': second}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['id'] == third
+    assert list_ids(client, headers) == [first, third, second]
+
+
+def test_move_todo_with_one_neighbor(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    first, second, third = create_todos(client, headers, 3)
+
+    client.patch(f'/todos/{first}/move', headers=headers, json={'before_id': second})
+    assert list_ids(client, headers) == [second, first, third]
+
+    client.patch(f'/todos/{third}/move', headers=headers, json={'after_id': second})
+    assert list_ids(client, headers) == [third, second, first]
+
+    client.patch(f'/todos/{third}/move', headers=headers, json={'before_id': first})
+    assert list_ids(client, headers) == [second, first, third]
+
+
+def test_move_todo_updates_only_the_moved_todo(session, client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    first, _, third = create_todos(client, headers, 3)
+    positions = {todo.id: todo.position for todo in session.scalars(select(Todo))}
+
+    client.patch(f'/todos/{first}/move', headers=headers, json={'before_id': third})
+
+    session.expire_all()
+    moved = {todo.id: todo.position for todo in session.scalars(select(Todo))}
+    assert {todo_id for todo_id in moved if moved[todo_id] != positions[todo_id]} == {first}
+
+
+def test_move_todo_with_unordered_neighbors(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    first, second, third = create_todos(client, headers, 3)
+
+    response = client.patch(
+        f'/todos/{first}/move', headers=headers, json={'before_id': third, 'after_id': second}
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'The todo before must come before the todo after.'}
+
+
+def test_move_todo_next_to_itself(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    (first,) = create_todos(client, headers, 1)
+
+    response = client.patch(f'/todos/{first}/move', headers=headers, json={'before_id': first})
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'A todo cannot be its own neighbor.'}
+
+
+def test_move_todo_without_neighbors(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    (first,) = create_todos(client, headers, 1)
+
+    response = client.patch(f'/todos/{first}/move', headers=headers, json={})
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_move_todo_not_found(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    (first,) = create_todos(client, headers, 1)
+
+    response = client.patch(f'/todos/{first}/move', headers=headers, json={'before_id': 10})
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Task not found.'}
+
+
+def test_move_todo_between_tied_positions(session, client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    first, second, third = (TodoFactory(user_id=user.id, position='V') for _ in range(3))
+    session.add_all([first, second, third])
+    session.commit()
+
+    response = client.patch(
+        f'/todos/{third.id}/move', headers=headers, json={'before_id': first.id, 'after_id': second.id}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert list_ids(client, headers) == [first.id, third.id, second.id]
+
+
+def test_move_todo_queues_a_rebalance_of_long_positions(session, client, user, token, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'POSITION_MAX_LENGTH', 1)
+    headers = {'Authorization': f'Bearer {token}'}
+    first, second, third = create_todos(client, headers, 3)
+
+    client.patch(f'/todos/{first}/move', headers=headers, json={'before_id': third})
+    assert session.scalars(select(PositionRebalance.user_id)).all() == []
+
+    client.patch(f'/todos/{second}/move', headers=headers, json={'before_id': third, 'after_id': first})
+    assert session.scalars(select(PositionRebalance.user_id)).all() == [user.id]
+
+
+def test_list_todos_include_archived(session, client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    ids = create_todos(client, headers, 4)
+    session.execute(
+        update(Todo)
+        .where(Todo.id.in_(ids[1::2]))
+        .values(state=TodoState.done, updated_at=datetime(2020, 1, 1))
+    )
+    session.commit()
+    archive_todos(session, batch_size=10, age=timedelta(days=90))
+
+    assert list_ids(client, headers) == ids[::2]
+
+    response = client.get('/todos/?include_archived=true', headers=headers)
+    assert [todo['id'] for todo in response.json()['todos']] == ids
+
+    response = client.get('/todos/?include_archived=true&state=done&fields=id,state', headers=headers)
+    assert response.json()['todos'] == [{'id': id_, 'state': 'done'} for id_ in ids[1::2]]
+
+
+def test_create_todo_normalizes_tags(client, token):
+    response = client.post(
+        '/todos/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={
+            'title': 'Tagged',
+            'description': 'Tagged',
+            'state': 'todo',
+            'tags': [' Work', 'work', 'Home'],
+        },
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['tags'] == ['work', 'home']
+
+
+def test_create_todo_rejects_invalid_tags(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    todo = {'title': 'Tagged', 'description': 'Tagged', 'state': 'todo'}
+
+    with_comma = client.post('/todos/', headers=headers, json={**todo, 'tags': ['a,b']})
+    too_many = client.post(
+        '/todos/', headers=headers, json={**todo, 'tags': [str(n) for n in range(11)]}
+    )
+
+    assert with_comma.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert too_many.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_list_todos_filter_tags(session, client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    work, both, home = (
+        TodoFactory(user_id=user.id, tags=tags) for tags in (['work'], ['work', 'home'], ['home'])
+    )
+    session.add_all([work, both, home, TodoFactory(user_id=user.id)])
+    session.commit()
+
+    def listed(query):
+        return [todo['id'] for todo in client.get(f'/todos/?{query}', headers=headers).json()['todos']]
+
+    assert listed('tags=work') == [work.id, both.id]
+    assert listed('tags=WORK,home') == [work.id, both.id, home.id]
+    assert listed('tags=work,home&tags_match=all') == [both.id]
+    assert listed('tags=unknown') == []
+
+
+def test_patch_todo_tags(session, client, user, token):
+    todo = TodoFactory(user_id=user.id, tags=['work'])
+    session.add(todo)
+    session.commit()
+
+    response = client.patch(
+        f'/todos/{todo.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'tags': ['home']},
+    )
+
+    assert response.json()['tags'] == ['home']
+
+
+def test_list_tag_facets(session, client, user, other_user, token):
+    for tags in (['work'], ['work', 'home'], ['home', 'urgent'], ['work'], []):
+        session.add(TodoFactory(user_id=user.id, tags=tags, state=TodoState.todo))
+    session.add(TodoFactory(user_id=user.id, tags=['work'], state=TodoState.done))
+    session.add(TodoFactory(user_id=other_user.id, tags=['other']))
+    session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.get('/todos/tags?state=todo', headers=headers)
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'tags': [
+            {'tag': 'work', 'count': 3},
+            {'tag': 'home', 'count': 2},
+            {'tag': 'urgent', 'count': 1},
+        ]
+    }
+
+    response = client.get('/todos/tags?tags=home', headers=headers)
+    assert response.json()['tags'] == [
+        {'tag': 'home', 'count': 2},
+        {'tag': 'urgent', 'count': 1},
+        {'tag': 'work', 'count': 1},
+    ]
+
+
+def test_list_todos_due_before(session, client, user, token):
+    todos = [
+        TodoFactory(user_id=user.id, due_at=due_at)
+        for due_at in (datetime(2026, 1, 1), datetime(2027, 1, 1), None)
+    ]
+    session.add_all(todos)
+    session.commit()
+
+    response = client.get(
+        '/todos/?due_before=2026-06-01T00:00:00',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert [todo['id'] for todo in response.json()['todos']] == [todos[0].id]
+    assert response.json()['todos'][0]['due_at'] == '2026-01-01T00:00:00'
@@ -138,15 +138,25 @@ def test_update_with_no_username(client, user, token):
     assert response.json() == {'detail': 'Could not validate credentials'}
 
 
-def test_delete_user(client, user, token):
+def test_delete_user(session, client, user, token):
     response = client.delete(f'/users/{user.id}', headers={'Authorization': f'Bearer {token}'})
 
     assert response.status_code == HTTPStatus.OK
     assert response.json() == {'message': 'User deleted'}
 
+    session.refresh(user)
+    assert user.deleted_at is not None
+
 
 def test_delete_user_different_id(client, other_user, token):
     response = client.delete(f'/users/{other_user.id}', headers={'Authorization': f'Bearer {token}'})
 
     assert response.status_code == HTTPStatus.FORBIDDEN
     assert response.json() == {'detail': 'Not enough permissions'}
+
+
+def test_read_users_with_fields(client, user):
+    response = client.get('/users/?fields=id,username')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'users': [{'id': user.id, 'username': user.username}]}
@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from app.models import (
+    OutboxEvent,
+    PositionRebalance,
+    RefreshToken,
+    RevokedToken,
+    Todo,
+    TodoArchive,
+    TodoState,
+    User,
+)
+from app.ordering import queue_rebalance, rebalance_positions
+from app.workers import (
+    archive_todos,
+    purge_deleted_users,
+    purge_dispatched_events,
+    purge_expired_tokens,
+    purge_trashed_todos,
+    rebalance_queued_positions,
+)
+from tests.conftest import TodoFactory
+
+
+def test_purge_trashed_todos(session, user):
+    session.bulk_save_objects(TodoFactory.create_batch(5, user_id=user.id, state=TodoState.trash))
+    session.bulk_save_objects(TodoFactory.create_batch(3, user_id=user.id, state=TodoState.todo))
+    session.commit()
+
+    deleted = purge_trashed_todos(session, batch_size=2, retention=timedelta(0))
+
+    assert deleted == 5  # noqa: PLR2004
+    assert session.scalar(select(func.count()).select_from(Todo)) == 3  # noqa: PLR2004
+
+
+def test_purge_trashed_todos_keeps_recent_trash(session, user):
+    session.bulk_save_objects(TodoFactory.create_batch(2, user_id=user.id, state=TodoState.trash))
+    session.commit()
+
+    deleted = purge_trashed_todos(session, batch_size=10, retention=timedelta(days=30))
+
+    assert deleted == 0
+    assert session.scalar(select(func.count()).select_from(Todo)) == 2  # noqa: PLR2004
+
+
+def test_purge_deleted_users(session, user, other_user):
+    session.bulk_save_objects(TodoFactory.create_batch(5, user_id=user.id))
+    session.bulk_save_objects(TodoFactory.create_batch(2, user_id=other_user.id))
+    user.deleted_at = func.now()
+    session.commit()
+
+    assert purge_deleted_users(session, batch_size=2) == 1
+    assert session.scalars(select(User.id)).all() == [other_user.id]
+    assert session.scalar(select(func.count()).select_from(Todo)) == 2  # noqa: PLR2004
+
+
+def test_purged_todos_leave_tombstones(session, client, user, token):
+    todo = TodoFactory(user_id=user.id, state=TodoState.trash)
+    session.add(todo)
+    session.commit()
+    todo_id = todo.id
+    headers = {'Authorization': f'Bearer {token}'}
+    version = client.get('/todos/changes', headers=headers).json()['version']
+
+    purge_trashed_todos(session, batch_size=10, retention=timedelta(0))
+
+    changes = client.get(f'/todos/changes?since={version}', headers=headers).json()
+    assert changes['todos'] == []
+    assert changes['deleted'] == [todo_id]
+    assert changes['version'] > version
+
+
+def test_purge_expired_tokens(session, user):
+    expired, valid = datetime(2020, 1, 1), datetime.now() + timedelta(days=1)
+    session.add_all([
+        RefreshToken(jti='expired', session_id='expired', user_id=user.id, expires_at=expired),
+        RefreshToken(jti='valid', session_id='valid', user_id=user.id, expires_at=valid),
+        RevokedToken(token_id='expired', expires_at=expired),
+        RevokedToken(token_id='valid', expires_at=valid),
+    ])
+    session.commit()
+
+    assert purge_expired_tokens(session) == 2  # noqa: PLR2004
+    assert session.scalars(select(RefreshToken.jti)).all() == ['valid']
+    assert session.scalars(select(RevokedToken.token_id)).all() == ['valid']
+
+
+def test_purge_dispatched_events(session):
+    events = [OutboxEvent(event_type='todo.updated', aggregate_id=id_, payload={}) for id_ in range(3)]
+    session.add_all(events)
+    session.flush()
+    for event, dispatched_at in zip(events, [datetime(2020, 1, 1), datetime.now()]):
+        session.execute(
+            update(OutboxEvent).where(OutboxEvent.id == event.id).values(dispatched_at=dispatched_at)
+        )
+    session.commit()
+
+    assert purge_dispatched_events(session, retention=timedelta(days=7)) == 1
+    assert session.scalars(select(OutboxEvent.aggregate_id).order_by(OutboxEvent.id)).all() == [1, 2]
+
+
+def test_rebalance_queued_positions(session, user, other_user):
+    session.add_all([
+        TodoFactory(user_id=user.id, position='V' * 30),
+        TodoFactory(user_id=user.id, position='W'),
+        TodoFactory(user_id=other_user.id, position='V' * 30),
+    ])
+    queue_rebalance(session, user.id)
+    queue_rebalance(session, user.id)
+    session.commit()
+
+    assert rebalance_queued_positions(session) == 1
+
+    positions = session.execute(select(Todo.user_id, func.length(Todo.position))).all()
+    assert max(length for user_id, length in positions if user_id == user.id) <= 2  # noqa: PLR2004
+    assert (other_user.id, 30) in positions
+    assert session.scalars(select(PositionRebalance)).all() == []
+
+
+def add_old_todos(session, user, states):
+    session.bulk_save_objects([TodoFactory(user_id=user.id, state=state) for state in states])
+    session.execute(update(Todo).values(updated_at=datetime(2020, 1, 1)))
+    session.commit()
+
+
+def test_archive_todos(session, user):
+    add_old_todos(session, user, [TodoState.done, TodoState.trash, TodoState.todo, TodoState.done])
+    session.bulk_save_objects(TodoFactory.create_batch(1, user_id=user.id, state=TodoState.done))
+    session.commit()
+
+    assert archive_todos(session, batch_size=2, age=timedelta(days=90)) == 3  # noqa: PLR2004
+
+    hot = session.scalars(select(Todo.state).order_by(Todo.id)).all()
+    assert hot == [TodoState.todo, TodoState.done]
+    archived = session.scalars(select(TodoArchive).order_by(TodoArchive.id)).all()
+    assert [todo.state for todo in archived] == [TodoState.done, TodoState.trash, TodoState.done]
+    assert all(todo.user_id == user.id and todo.updated_at == datetime(2020, 1, 1) for todo in archived)
+
+
+def test_purge_trashed_todos_purges_archived_trash(session, user):
+    add_old_todos(session, user, [TodoState.trash, TodoState.done])
+    archive_todos(session, batch_size=10, age=timedelta(days=90))
+
+    assert purge_trashed_todos(session, batch_size=10, retention=timedelta(days=30)) == 1
+    assert session.scalars(select(TodoArchive.state)).all() == [TodoState.done]
+
+
+def test_rebalanced_trash_is_still_purged(session, user):
+    add_old_todos(session, user, [TodoState.trash, TodoState.todo])
+    versions = session.scalars(select(Todo.version).order_by(Todo.id)).all()
+
+    rebalance_positions(session, user.id)
+    session.commit()
+
+    assert session.scalars(select(Todo.version).order_by(Todo.id)).all() != versions
+    assert purge_trashed_todos(session, batch_size=10, retention=timedelta(days=30)) == 1